@@ -0,0 +1,30 @@
+"""Runs a benchmark on another revision of Magpie (e.g., the parent of an optimisation commit).
+
+usage: python -m benchmarks.baseline REVISION BENCHMARK [ARGS...]
+
+(the current benchmarks/BENCHMARK.py runs in a temporary git worktree of REVISION, from
+which relative paths in ARGS are resolved; the benchmark must only rely on APIs available
+in that revision)
+"""
+
+import pathlib
+import shutil
+import subprocess
+import sys
+import tempfile
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print(__doc__.strip())
+        sys.exit(1)
+    revision, benchmark, *args = sys.argv[1:]
+    script = pathlib.Path(__file__).parent / f'{benchmark}.py'
+    with tempfile.TemporaryDirectory() as tmp:
+        worktree = pathlib.Path(tmp) / 'magpie'
+        subprocess.run(['git', 'worktree', 'add', '--quiet', '--detach', str(worktree), revision], check=True)
+        try:
+            (worktree / 'benchmarks').mkdir(exist_ok=True)
+            shutil.copy(script, worktree / 'benchmarks')
+            subprocess.run([sys.executable, '-m', f'benchmarks.{benchmark}', *args], cwd=worktree, check=True)
+        finally:
+            subprocess.run(['git', 'worktree', 'remove', '--force', str(worktree)], check=True)
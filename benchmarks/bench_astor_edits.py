@@ -0,0 +1,62 @@
+"""Cost of applying random statement edits (deletions/replacements/insertions) to a large Python AST model, and of dumping variants.
+
+usage: python -m benchmarks.bench_astor_edits [EDITS] [FILENAME]
+
+(defaults to the standard library's argparse.py)
+
+baseline (location lists shifted on insertions): python -m benchmarks.baseline 1d60fb1^ bench_astor_edits [EDITS]
+"""
+
+import argparse
+import contextlib
+import pathlib
+import random
+import sys
+import time
+
+from magpie.models.astor import AstorModel
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    path = pathlib.Path(sys.argv[2] if len(sys.argv) > 2 else argparse.__file__)
+    model = AstorModel(path.name)
+    with contextlib.chdir(path.parent):
+        model.init_contents()
+    print(f'{path.name}: {len(model.locations["stmt"])} statements')
+
+    rng = random.Random(0)
+    edits = []
+    for _ in range(n):
+        stmt = (model.filename, 'stmt', rng.randrange(len(model.locations['stmt'])))
+        ingredient = (model.filename, 'stmt', rng.randrange(len(model.locations['stmt'])))
+        inter = (model.filename, '_inter_block', rng.randrange(len(model.locations['_inter_block'])))
+        edits.append(rng.choice([
+            ('do_delete', stmt),
+            ('do_replace', model, stmt, ingredient),
+            ('do_insert', model, inter, ingredient),
+        ]))
+
+    variant = model.fork()
+    applied = 0
+    failed = 0
+    start = time.perf_counter()
+    for name, *args in edits:
+        try:
+            applied += bool(getattr(variant, name)(*args))
+        except Exception: # e.g., stale locations
+            failed += 1
+    duration = time.perf_counter() - start
+    print(f'{n} edits ({applied} applied, {failed} failed): {1e3*duration:.0f} ms, {1e3*duration/n:.3f} ms/edit')
+
+    # single-edit variants, as in a local search
+    model.dump()
+    failed = 0
+    start = time.perf_counter()
+    for name, *args in edits[:100]:
+        variant = model.fork()
+        try:
+            getattr(variant, name)(*args)
+        except Exception:
+            failed += 1
+        variant.dump()
+    print(f'single edit + dump ({failed} failed): {1e3*(time.perf_counter()-start)/100:.2f} ms/variant')
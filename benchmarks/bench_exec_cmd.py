@@ -0,0 +1,76 @@
+"""Magpie-side CPU overhead of AbstractSoftware.exec_cmd per MB of child output.
+
+usage: python -m benchmarks.bench_exec_cmd [MB] [REPEATS] [BASELINE_MB]
+
+(the baseline is the former byte by byte reading loop, one select() call per byte,
+timed on BASELINE_MB of output since it is several orders of magnitude slower; its
+cost per MB also grows with the output size, as outputs are concatenated bytes)
+"""
+
+import select
+import subprocess
+import sys
+import time
+
+from magpie.core import AbstractSoftware
+
+
+class BenchSoftware(AbstractSoftware):
+    def __init__(self):
+        super().__init__('.', reset=False)
+        self.timestamp = '0'
+
+    def evaluate_variant(self, variant, cached_run=None, worker=0):
+        pass
+
+def baseline_exec_cmd(cmd):
+    # output reading of exec_cmd before chunked reads (without timeout and lengthout checks)
+    stdout = b''
+    stderr = b''
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as sprocess:
+        while sprocess.poll() is None:
+            a = select.select([sprocess.stdout, sprocess.stderr], [], [], 1)[0]
+            if sprocess.stdout in a:
+                for _ in range(1024):
+                    if not select.select([sprocess.stdout], [], [], 0)[0]:
+                        break
+                    stdout += sprocess.stdout.read(1)
+            if sprocess.stderr in a:
+                for _ in range(1024):
+                    if not select.select([sprocess.stderr], [], [], 0)[0]:
+                        break
+                    stderr += sprocess.stderr.read(1)
+        stdout += sprocess.stdout.read()
+        stderr += sprocess.stderr.read()
+    return len(stdout) + len(stderr)
+
+def bench(run, size, repeats):
+    cpu = []
+    wall = []
+    for _ in range(repeats):
+        start_cpu = time.process_time()
+        start_wall = time.perf_counter()
+        run()
+        cpu.append(time.process_time() - start_cpu)
+        wall.append(time.perf_counter() - start_wall)
+    return f'cpu {min(cpu)/size:.4f} s/MB, wall {min(wall)/size:.4f} s/MB'
+
+if __name__ == '__main__':
+    size = float(sys.argv[1]) if len(sys.argv) > 1 else 1
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    baseline_size = float(sys.argv[3]) if len(sys.argv) > 3 else 0.2
+    software = BenchSoftware()
+    for stream in ['stdout', 'stderr']:
+        nbytes = int(size*1e6)
+        cmd = [sys.executable, '-c', f'import sys; sys.{stream}.buffer.write(b"x"*{nbytes})']
+        def run():
+            result = software.exec_cmd(cmd, timeout=600, lengthout=2*nbytes)
+            assert result.status == 'SUCCESS', result.status
+            assert result.output_length == nbytes, result.output_length
+        print(f'{stream}: {size:g} MB, exec_cmd: {bench(run, size, repeats)}')
+        baseline_nbytes = int(baseline_size*1e6)
+        baseline_cmd = [sys.executable, '-c', f'import sys; sys.{stream}.buffer.write(b"x"*{baseline_nbytes})']
+        def run_baseline():
+            output_length = baseline_exec_cmd(baseline_cmd)
+            assert output_length == baseline_nbytes, output_length
+        print(f'{stream}: {baseline_size:g} MB, baseline: {bench(run_baseline, baseline_size, 1)}')
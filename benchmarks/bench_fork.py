@@ -0,0 +1,62 @@
+"""Variant models creation cost: deep copy of every model vs forking the edited model only.
+
+usage: python -m benchmarks.bench_fork [VARIANTS]
+
+(models are XML representations of Magpie's own Python files, as in examples/magpie)
+"""
+
+import ast
+import contextlib
+import copy
+import pathlib
+import random
+import sys
+import tempfile
+import time
+
+from magpie.models.xml import XmlModel
+from magpie.scripts.python_to_xml import unparse_xml
+
+
+def load_models(tmp):
+    models = {}
+    for path in sorted(pathlib.Path('magpie').glob('**/*.py')):
+        filename = f'{path}.xml'
+        try:
+            xml = unparse_xml(ast.parse(path.read_text()+'\n'), str(path))
+        except Exception: # unsupported syntax
+            continue
+        (pathlib.Path(tmp) / filename).parent.mkdir(parents=True, exist_ok=True)
+        (pathlib.Path(tmp) / filename).write_text(xml)
+        with contextlib.chdir(tmp):
+            models[filename] = XmlModel(filename)
+            models[filename].init_contents()
+    return models
+
+def random_deletion(rng, models):
+    filename = rng.choice([f for f in models if any(models[f].locations.values())])
+    tag = rng.choice([t for t, v in models[filename].locations.items() if v and not t.startswith('_inter_')])
+    return (filename, tag, rng.randrange(len(models[filename].locations[tag])))
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    with tempfile.TemporaryDirectory() as tmp:
+        models = load_models(tmp)
+    rng = random.Random(0)
+    targets = [random_deletion(rng, models) for _ in range(n)]
+    print(f'{len(models)} files, {sum(len(m.dump()) for m in models.values())} characters')
+
+    start = time.perf_counter()
+    for target in targets:
+        variant = copy.deepcopy(models)
+        variant[target[0]].do_delete(target)
+    duration = time.perf_counter() - start
+    print(f'deepcopy: {1e3*duration/n:.2f} ms/variant')
+
+    start = time.perf_counter()
+    for target in targets:
+        variant = dict(models)
+        variant[target[0]] = variant[target[0]].fork()
+        variant[target[0]].do_delete(target)
+    duration = time.perf_counter() - start
+    print(f'fork    : {1e3*duration/n:.2f} ms/variant')
@@ -0,0 +1,46 @@
+"""Cost of applying random line edits (mostly insertions) to a large line-based model.
+
+usage: python -m benchmarks.bench_line_edits [EDITS] [LINES]
+"""
+
+import contextlib
+import pathlib
+import random
+import sys
+import tempfile
+import time
+
+from magpie.models.line import LineModel
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    with tempfile.TemporaryDirectory() as tmp:
+        (pathlib.Path(tmp) / 'big.txt').write_text(''.join(f'line {i}\n' for i in range(size)))
+        model = LineModel('big.txt')
+        with contextlib.chdir(tmp):
+            model.init_contents()
+
+    rng = random.Random(0)
+    edits = []
+    for _ in range(n):
+        line = (model.filename, 'line', rng.randrange(size))
+        ingredient = (model.filename, 'line', rng.randrange(size))
+        inter = (model.filename, '_inter_line', rng.randrange(size+1))
+        edits.append(rng.choice([
+            ('do_delete', line),
+            ('do_replace', model, line, ingredient),
+            ('do_insert', model, inter, ingredient),
+            ('do_insert', model, inter, ingredient),
+        ]))
+
+    start = time.perf_counter()
+    variant = model.fork()
+    for name, *args in edits:
+        getattr(variant, name)(*args)
+    duration = time.perf_counter() - start
+    print(f'{size} lines, {n} edits: {1e3*duration:.0f} ms ({1e3*duration/n:.3f} ms/edit)')
+
+    start = time.perf_counter()
+    variant.dump()
+    print(f'dump: {1e3*(time.perf_counter()-start):.1f} ms')
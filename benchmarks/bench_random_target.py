@@ -0,0 +1,25 @@
+"""Cost of sampling weighted targets (e.g., profile-guided weights) in a large line-based model.
+
+usage: python -m benchmarks.bench_random_target [SAMPLES] [LINES]
+"""
+
+import random
+import sys
+import time
+
+from magpie.models.line import LineModel
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    model = LineModel('big.txt')
+    model.locations = {'line': list(range(size))}
+    rng = random.Random(0)
+    model.weights = {'line': [rng.choice([0, 0, 1, 10, 1000]) for _ in range(size)]}
+
+    random.seed(0)
+    start = time.perf_counter()
+    for _ in range(n):
+        model.random_target('line')
+    duration = time.perf_counter() - start
+    print(f'{size} locations, {n} samples: {1e3*duration:.0f} ms ({1e6*duration/n:.1f} us/sample)')
@@ -0,0 +1,35 @@
+"""Run result cache policies ("[search] cache_policy") under a skewed workload.
+
+usage: python -m benchmarks.bench_run_cache [MAXSIZE] [OPERATIONS]
+
+("hits" is the historical policy, i.e., sort by hit count and reset on overflow)
+"""
+
+import random
+import sys
+import time
+
+from magpie.core.run_cache import cache_policies
+
+if __name__ == '__main__':
+    maxsize = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+    rng = random.Random(0)
+    # mostly fresh variants, otherwise re-evaluations (skewed towards a few popular variants)
+    keys = []
+    for i in range(operations):
+        if rng.random() < 0.65:
+            keys.append(f'diff{i}')
+        else:
+            keys.append(f'diff{min(i, int(rng.paretovariate(0.3)))}')
+    for name, policy in cache_policies.items():
+        cache = policy(maxsize, [''])
+        worst = 0
+        start = time.perf_counter()
+        for key in keys:
+            if cache.get(key) is None:
+                tmp = time.perf_counter()
+                cache.set(key, key)
+                worst = max(worst, time.perf_counter() - tmp)
+        duration = time.perf_counter() - start
+        print(f'{name:<4}: maxsize {maxsize}, {1e6*duration/operations:.2f} us/op (worst {1e3*worst:.2f} ms), hit ratio {cache.hits/operations:.2%}, {cache.evictions} evictions')
@@ -0,0 +1,29 @@
+"""Start-up cost of SrcmlModel (parsing, tree preprocessing, and locations) on a large srcML file.
+
+usage: python -m benchmarks.bench_srcml_init [REPEATS] [FILENAME]
+
+(defaults to examples/minisat/_magpie/Solver.cc.xml, with the default "[srcml]" configuration)
+
+baseline (one traversal per transform): python -m benchmarks.baseline 6fd85a8^ bench_srcml_init [REPEATS]
+"""
+
+import contextlib
+import pathlib
+import sys
+import time
+
+from magpie.models.xml import SrcmlModel
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    path = pathlib.Path(sys.argv[2] if len(sys.argv) > 2 else 'examples/minisat/_magpie/Solver.cc.xml')
+    with contextlib.chdir(path.parent):
+        for focus in [None, set()]:
+            model = SrcmlModel(path.name)
+            if focus is not None:
+                model.config['tag_focus'] = focus
+            start = time.perf_counter()
+            for _ in range(n):
+                model.init_contents()
+            duration = time.perf_counter() - start
+            print(f'{path.name} (focus: {"none" if focus is not None else "default"}): {len(model.locations["stmt"])} statements, {1e3*duration/n:.1f} ms/init')
@@ -0,0 +1,60 @@
+"""Throughput of generational vs steady-state genetic programming with parallel workers and variable evaluation times.
+
+usage: python -m benchmarks.bench_steady_state [STEPS] [MEAN_DURATION]
+
+(evaluations only sleep, for an exponentially distributed duration)
+"""
+
+import configparser
+import logging
+import random
+import sys
+import time
+import types
+
+from magpie.algos import GeneticProgramming1Point, GeneticProgrammingSteadyState1Point
+from magpie.core import AbstractSoftware, RunResult, Variant, default_scenario
+
+
+class SleepySoftware(AbstractSoftware):
+    def __init__(self, mean):
+        super().__init__('tests/examples', reset=False)
+        self.target_files = ['triangle.py']
+        self.model_rules = [('*', 'LineModel')]
+        self.model_config = []
+        self.config = {}
+        self.fitness = [types.SimpleNamespace(maximize=False)]
+        self.logger = logging.getLogger('magpie.benchmarks')
+        self.noop_variant = Variant(self)
+        self.mean = mean
+
+    def evaluate_variant(self, variant, cached_run=None, worker=0):
+        time.sleep(random.expovariate(1/self.mean))
+        run = RunResult(variant, 'SUCCESS')
+        run.fitness = len(variant.models['triangle.py'].dump())
+        run.updated = True
+        return run
+
+def measure(klass, steps, mean, workers):
+    config = configparser.ConfigParser()
+    config.read_dict(default_scenario)
+    config['search']['possible_edits'] = 'LineDeletion LineReplacement LineInsertion'
+    config['search']['warmup'] = '1'
+    config['search']['max_steps'] = str(steps)
+    config['search']['parallel_workers'] = str(workers)
+    config['search']['cache_maxsize'] = '0' # every evaluation sleeps
+    random.seed(0)
+    algo = klass()
+    algo.software = SleepySoftware(mean)
+    algo.setup(config)
+    algo.run()
+    algo.software.shutdown_workers()
+    return algo.stats['steps']/algo.stats['wallclock_total']
+
+if __name__ == '__main__':
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    mean = float(sys.argv[2]) if len(sys.argv) > 2 else 0.02
+    for workers in [1, 2, 4, 8]:
+        generational = measure(GeneticProgramming1Point, steps, mean, workers)
+        steady = measure(GeneticProgrammingSteadyState1Point, steps, mean, workers)
+        print(f'{workers} worker(s): generational {generational:6.1f} eval/s, steady-state {steady:6.1f} eval/s')
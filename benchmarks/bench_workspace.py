@@ -0,0 +1,64 @@
+"""Workspace materialisation cost per "[magpie] workspace_strategy" on a synthetic tree.
+
+usage: python -m benchmarks.bench_workspace [FILES] [FILE_SIZE] [TMP_DIR]
+
+(use e.g. TMP_DIR=/dev/shm to measure the effect of "[magpie] workspace_tmpfs")
+"""
+
+import os
+import pathlib
+import shutil
+import sys
+import tempfile
+import time
+
+import magpie.settings
+from magpie.core import AbstractSoftware
+
+
+class BenchSoftware(AbstractSoftware):
+    def __init__(self):
+        super().__init__('.', reset=False)
+
+    def evaluate_variant(self, variant, cached_run=None, worker=0):
+        pass
+
+def make_tree(root, files, file_size):
+    per_dir = 100
+    content = b'x' * file_size
+    for i in range(files):
+        directory = root / f'dir{i // per_dir // per_dir}' / f'sub{i // per_dir % per_dir}'
+        if i % per_dir == 0:
+            directory.mkdir(parents=True)
+        (directory / f'file{i % per_dir}.c').write_bytes(content)
+
+def timed(f, *args):
+    start = time.perf_counter()
+    f(*args)
+    return time.perf_counter() - start
+
+if __name__ == '__main__':
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    file_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    tmp_dir = sys.argv[3] if len(sys.argv) > 3 else None
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        original = pathlib.Path(tmp) / 'original'
+        make_tree(original, files, file_size)
+        target = original / 'dir0' / 'sub0' / 'file0.c'
+        for strategy in ['copy', 'hardlink', 'reflink']:
+            magpie.settings.workspace_strategy = strategy
+            software = BenchSoftware()
+            software.path = original
+            work = pathlib.Path(tmp) / f'work_{strategy}'
+            work_target = work / target.relative_to(original)
+            initial = timed(software.restore_folder, work)
+            timings = {}
+            for name, f in [('sync_folder', lambda: software.sync_folder(work, original)),
+                            ('restore_folder', lambda: software.restore_folder(work))]:
+                software.break_link(work_target)
+                work_target.write_bytes(b'variant')
+                os.utime(work_target, (time.time()+1, time.time()+1))
+                timings[name] = timed(f)
+                assert work_target.read_bytes() == target.read_bytes()
+            print(f'{strategy:<8}: {files} files, initial {initial:.2f}s, resync (sync_folder) {timings["sync_folder"]:.3f}s, resync (restore_folder) {timings["restore_folder"]:.3f}s')
+            shutil.rmtree(work)
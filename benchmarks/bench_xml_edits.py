@@ -0,0 +1,49 @@
+"""Cost of applying random SrcML statement edits (deletions/replacements/insertions) to a large XML model.
+
+usage: python -m benchmarks.bench_xml_edits [EDITS] [FILENAME]
+
+(defaults to examples/minisat/_magpie/Solver.cc.xml; every SrcML node is kept, i.e., no "[srcml] focus")
+
+baseline (xpath-based locations): python -m benchmarks.baseline d12cae8^ bench_xml_edits [EDITS]
+"""
+
+import contextlib
+import pathlib
+import random
+import sys
+import time
+
+from magpie.models.xml import SrcmlModel
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    path = pathlib.Path(sys.argv[2] if len(sys.argv) > 2 else 'examples/minisat/_magpie/Solver.cc.xml')
+    model = SrcmlModel(path.name)
+    model.config['tag_focus'] = set()
+    with contextlib.chdir(path.parent):
+        model.init_contents()
+    print(f'{path.name}: {sum(1 for _ in model.contents.iter())} nodes, {len(model.locations["stmt"])} statements')
+
+    rng = random.Random(0)
+    edits = []
+    for _ in range(n):
+        stmt = (model.filename, 'stmt', rng.randrange(len(model.locations['stmt'])))
+        ingredient = (model.filename, 'stmt', rng.randrange(len(model.locations['stmt'])))
+        inter = (model.filename, '_inter_block', rng.randrange(len(model.locations['_inter_block'])))
+        edits.append(rng.choice([
+            ('do_delete', stmt),
+            ('do_replace', model, stmt, ingredient),
+            ('do_insert', model, inter, ingredient),
+        ]))
+
+    variant = model.fork()
+    applied = 0
+    failed = 0
+    start = time.perf_counter()
+    for name, *args in edits:
+        try:
+            applied += bool(getattr(variant, name)(*args))
+        except Exception: # e.g., stale locations
+            failed += 1
+    duration = time.perf_counter() - start
+    print(f'{n} edits ({applied} applied, {failed} failed): {1e3*duration:.0f} ms, {1e3*duration/n:.3f} ms/edit')
@@ -4,9 +4,15 @@ from .genetic_programming import (
     GeneticProgramming1Point,
     GeneticProgramming2Point,
     GeneticProgrammingConcat,
+    GeneticProgrammingSteadyState,
+    GeneticProgrammingSteadyState1Point,
+    GeneticProgrammingSteadyState2Point,
+    GeneticProgrammingSteadyStateUniformConcat,
+    GeneticProgrammingSteadyStateUniformInter,
     GeneticProgrammingUniformConcat,
     GeneticProgrammingUniformInter,
 )
+from .islands import GeneticProgrammingIslands
 from .local_search import (
     BestImprovement,
     DebugSearch,
@@ -34,11 +34,13 @@ class AblationAnalysis(ValidSearch):
         while rebuild.edits:
             ranking = []
             ref_fit = [(-float('inf') if f.maximize else float('inf')) for f in self.software.fitness]
+            variants = []
             for k, _ in enumerate(rebuild.edits):
                 patch = copy.deepcopy(rebuild)
                 del patch.edits[k]
-                tmp = magpie.core.Variant(self.software, patch)
-                run = self.evaluate_variant(tmp)
+                variants.append(magpie.core.Variant(self.software, patch))
+            runs = self.evaluate_variants(variants)
+            for k, (tmp, run) in enumerate(zip(variants, runs)):
                 self.hook_evaluation(tmp, run)
                 ranking.append((k, run.fitness))
             ranking.sort(key=lambda c: c[1] or ref_fit)
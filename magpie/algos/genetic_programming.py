@@ -1,3 +1,4 @@
+import concurrent.futures
 import copy
 import math
 import random
@@ -7,6 +8,8 @@ import magpie.utils
 
 
 class GeneticProgramming(magpie.core.BasicAlgorithm):
+    surrogate_screening = True
+
     def __init__(self):
         super().__init__()
         self.name = 'Genetic Programming'
@@ -16,6 +19,7 @@ class GeneticProgramming(magpie.core.BasicAlgorithm):
         self.config['offspring_crossover'] = 0.5
         self.config['offspring_mutation'] = 0.4
         self.config['batch_reset'] = True
+        self.island = None # see GeneticProgrammingIslands
 
     def reset(self):
         super().reset()
@@ -51,19 +55,8 @@ class GeneticProgramming(magpie.core.BasicAlgorithm):
 
             # initial grow first to avoid wasting warmup
             # should be in setup
-            offsprings = []
-            tries = magpie.settings.edit_retries
-            expected = self.config['pop_size']
-            while tries and len(offsprings) < expected:
-                sol = magpie.core.Patch()
-                self.mutate(sol)
-                if sol in offsprings:
-                    tries -= 1
-                    continue
-                offsprings.append(sol)
-            got = len(offsprings)
-            if got < expected:
-                self.report['stop'] = f'unable to fill initial population ({got} unique edits generated < {expected})'
+            offsprings = self.initial_population()
+            if offsprings is None:
                 return
 
             # actual warmup
@@ -78,23 +71,7 @@ class GeneticProgramming(magpie.core.BasicAlgorithm):
 
             # initial pop
             #this could be in hook_start
-            pop = {}
-            local_best_fitness = None
-            for sol in offsprings:
-                variant = magpie.core.Variant(self.software, sol)
-                run = self.evaluate_variant(variant)
-                accept = best = False
-                if run.status == 'SUCCESS':
-                    if self.dominates(run.fitness, local_best_fitness):
-                        local_best_fitness = run.fitness
-                        accept = True
-                        if self.dominates(run.fitness, self.report['best_fitness']):
-                            self.report['best_fitness'] = run.fitness
-                            self.report['best_patch'] = sol
-                            best = True
-                self.hook_evaluation(variant, run, accept, best)
-                pop[sol] = run
-                self.stats['steps'] += 1
+            pop = self.replace(offsprings, check_stop=False)
 
             # main loop
             while not self.stopping_condition():
@@ -131,25 +108,10 @@ class GeneticProgramming(magpie.core.BasicAlgorithm):
                         continue # guaranteed to terminate (valid initial population)
                     offsprings.append(sol)
                 # replace
-                pop.clear()
-                local_best_fitness = None
-                for sol in offsprings:
-                    if self.stopping_condition():
-                        break
-                    variant = magpie.core.Variant(self.software, sol)
-                    run = self.evaluate_variant(variant)
-                    accept = best = False
-                    if run.status == 'SUCCESS':
-                        if self.dominates(run.fitness, local_best_fitness):
-                            local_best_fitness = run.fitness
-                            accept = True
-                            if self.dominates(run.fitness, self.report['best_fitness']):
-                                self.report['best_fitness'] = run.fitness
-                                self.report['best_patch'] = sol
-                                best = True
-                    self.hook_evaluation(variant, run, accept, best)
-                    pop[sol] = run
-                    self.stats['steps'] += 1
+                pop = self.replace(offsprings)
+                # migration (island model only)
+                if immigrants := self.migrate(pop):
+                    pop.update(self.replace(immigrants))
 
         except KeyboardInterrupt:
             self.report['stop'] = 'keyboard interrupt'
@@ -158,6 +120,53 @@ class GeneticProgramming(magpie.core.BasicAlgorithm):
             # the end
             self.hook_end()
 
+    def initial_population(self):
+        # unique single-edit patches (None if not enough can be generated)
+        offsprings = []
+        tries = magpie.settings.edit_retries
+        expected = self.config['pop_size']
+        while tries and len(offsprings) < expected:
+            sol = magpie.core.Patch()
+            self.mutate(sol)
+            if sol in offsprings:
+                tries -= 1
+                continue
+            offsprings.append(sol)
+        got = len(offsprings)
+        if got < expected:
+            self.report['stop'] = f'unable to fill initial population ({got} unique edits generated < {expected})'
+            return None
+        return offsprings
+
+    def replace(self, offsprings, check_stop=True):
+        # evaluates offsprings (in parallel if possible) and returns the new population
+        pop = {}
+        local_best_fitness = None
+        for chunk in self.evaluation_chunks(offsprings, check_stop):
+            variants = [self.make_variant(sol) for sol in chunk]
+            runs = self.evaluate_variants(variants)
+            for sol, variant, run in zip(chunk, variants, runs):
+                accept = best = False
+                if run.status == 'SUCCESS':
+                    if self.dominates(run.fitness, local_best_fitness):
+                        local_best_fitness = run.fitness
+                        accept = True
+                        if self.dominates(run.fitness, self.report['best_fitness']):
+                            self.report['best_fitness'] = run.fitness
+                            self.report['best_patch'] = sol
+                            best = True
+                self.hook_evaluation(variant, run, accept, best)
+                pop[sol] = run
+                self.stats['steps'] += 1
+        return pop
+
+    def migrate(self, pop):
+        # island model only: every "[search.islands] migration_interval" generations,
+        # sends the best patches of the population away and returns the patches received since the last migration
+        if self.island is None or self.stats['gen'] % self.island.interval:
+            return []
+        return self.island.exchange(self.select(pop))
+
     def mutate(self, patch):
         if patch.edits and random.random() < self.config['delete_prob']:
             del patch.edits[random.randrange(0, len(patch.edits))]
@@ -171,11 +180,13 @@ class GeneticProgramming(magpie.core.BasicAlgorithm):
         return c
 
     def filter(self, pop):
-        return {sol for sol in pop if pop[sol].status == 'SUCCESS'}
+        return [sol for sol, run in pop.items() if run.status == 'SUCCESS']
 
     def select(self, pop):
         """ returns possible parents ordered by fitness """
-        return sorted(self.filter(pop), key=lambda sol: pop[sol].fitness)
+        # patches are not hashed again (hashing a patch formats all its edits)
+        ranked = sorted((item for item in pop.items() if item[1].status == 'SUCCESS'), key=lambda item: item[1].fitness)
+        return [sol for sol, _ in ranked]
 
     def hook_main_loop(self):
         if self.config['batch_reset']:
@@ -220,7 +231,7 @@ class GeneticProgrammingConcat(GeneticProgramming):
             c.edits.append(edit)
         return c
 
-magpie.utils.known_algos['genetic_programming'].append(GeneticProgrammingConcat())
+magpie.utils.known_algos['genetic_programming'].append(GeneticProgrammingConcat)
 
 
 class GeneticProgramming1Point(GeneticProgramming):
@@ -286,3 +297,161 @@ class GeneticProgrammingUniformInter(GeneticProgramming):
         return c
 
 magpie.utils.known_algos['local_search'].append(GeneticProgrammingUniformInter)
+
+
+class GeneticProgrammingSteadyState(GeneticProgramming):
+    """ asynchronous steady-state variant: "[search] parallel_workers" evaluations are always in flight,
+    each completed evaluation immediately enters the population (evicting its worst individual),
+    and a new offspring is bred and submitted in its place """
+    def __init__(self):
+        super().__init__()
+        self.name = 'Steady-State Genetic Programming'
+
+    def run(self):
+        try:
+            # warmup
+            self.hook_warmup()
+
+            # initial grow first to avoid wasting warmup
+            offsprings = self.initial_population()
+            if offsprings is None:
+                return
+
+            # actual warmup
+            self.warmup()
+
+            # early stop if something went wrong during warmup
+            if self.report['stop']:
+                return
+
+            # start!
+            self.hook_start()
+
+            # main loop
+            self.steady_state(offsprings)
+
+        except KeyboardInterrupt:
+            self.report['stop'] = 'keyboard interrupt'
+
+        finally:
+            # the end
+            self.hook_end()
+
+    def steady_state(self, offsprings):
+        pop = parents = {}
+        pending = {} # future -> (sol, variant), in submission order
+        # when batch_reset draws different instances, fitness values are only comparable within a generation
+        # generations are then evaluated one after the other, and bred from the previous one
+        bins = self.config['batch_bins']
+        resample = self.config['batch_reset'] and sum(len(b) for b in bins) > self.config['batch_sample_size']
+        limit = self.config['pop_size']
+        try:
+            while True:
+                # keeps every worker busy
+                while len(pending) < self.config['parallel_workers'] and not self.stopping_condition():
+                    submitted = self.stats['steps'] + len(pending)
+                    if self.stop['steps'] is not None and submitted >= self.stop['steps']:
+                        break
+                    if resample and submitted >= limit:
+                        break
+                    sol = offsprings.pop(0) if offsprings else self.breed(parents, pending)
+                    variant = self.make_variant(sol)
+                    pending[self.submit_variant(variant)] = (sol, variant)
+                if not pending:
+                    if not resample or self.stopping_condition():
+                        break
+                    # new generation
+                    self.hook_main_loop()
+                    parents, pop = pop, {}
+                    k = int(self.config['pop_size']*self.config['offspring_elitism'])
+                    offsprings = copy.deepcopy(self.select(parents)[:k]) + offsprings
+                    limit += self.config['pop_size']
+                    continue
+                # processes completed evaluations as soon as possible
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in [future for future in pending if future in done]:
+                    sol, variant = pending.pop(future)
+                    run = self.collect_variant(variant, future)
+                    self.insert(pop, sol, variant, run)
+                    if self.stats['steps'] % self.config['pop_size'] == 0:
+                        offsprings.extend(self.migrate(pop))
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def breed(self, pop, pending):
+        # a new offspring, preferably not already being evaluated
+        parents = self.select(pop)
+        tries = magpie.settings.edit_retries
+        while True:
+            r = random.random()
+            if parents and r < self.config['offspring_crossover']:
+                k = max(1, int(self.config['pop_size']*self.config['offspring_crossover']))
+                parent = random.choice(parents[:k])
+                sol = random.choice(parents)
+                if random.random() > 0.5:
+                    sol = self.crossover(parent, sol)
+                else:
+                    sol = self.crossover(sol, parent)
+            elif parents and r < self.config['offspring_crossover'] + self.config['offspring_mutation']:
+                k = max(1, int(self.config['pop_size']*self.config['offspring_mutation']))
+                sol = copy.deepcopy(random.choice(parents[:k]))
+                self.mutate(sol)
+            else:
+                sol = magpie.core.Patch()
+                self.mutate(sol)
+            if tries and any(sol == other for other, _ in pending.values()):
+                tries -= 1
+                continue
+            return sol
+
+    def insert(self, pop, sol, variant, run):
+        accept = best = False
+        if run.status == 'SUCCESS':
+            ranked = self.select(pop)
+            if not ranked or self.dominates(run.fitness, pop[ranked[0]].fitness):
+                accept = True
+                if self.dominates(run.fitness, self.report['best_fitness']):
+                    self.report['best_fitness'] = run.fitness
+                    self.report['best_patch'] = sol
+                    best = True
+        self.hook_evaluation(variant, run, accept, best)
+        pop[sol] = run
+        # evicts the worst individual (failed ones first)
+        if len(pop) > self.config['pop_size']:
+            failed = [other for other in pop if pop[other].status != 'SUCCESS']
+            del pop[failed[0] if failed else self.select(pop)[-1]]
+        self.stats['steps'] += 1
+        self.stats['gen'] = self.stats['steps'] // self.config['pop_size']
+
+
+class GeneticProgrammingSteadyState1Point(GeneticProgrammingSteadyState, GeneticProgramming1Point):
+    def __init__(self):
+        super().__init__()
+        self.name = 'Steady-State Genetic Programming (1-point)'
+
+magpie.utils.known_algos['genetic_programming'].append(GeneticProgrammingSteadyState1Point)
+
+
+class GeneticProgrammingSteadyState2Point(GeneticProgrammingSteadyState, GeneticProgramming2Point):
+    def __init__(self):
+        super().__init__()
+        self.name = 'Steady-State Genetic Programming (2-point)'
+
+magpie.utils.known_algos['genetic_programming'].append(GeneticProgrammingSteadyState2Point)
+
+
+class GeneticProgrammingSteadyStateUniformConcat(GeneticProgrammingSteadyState, GeneticProgrammingUniformConcat):
+    def __init__(self):
+        super().__init__()
+        self.name = 'Steady-State Genetic Programming (uniform+concatenation)'
+
+magpie.utils.known_algos['genetic_programming'].append(GeneticProgrammingSteadyStateUniformConcat)
+
+
+class GeneticProgrammingSteadyStateUniformInter(GeneticProgrammingSteadyState, GeneticProgrammingUniformInter):
+    def __init__(self):
+        super().__init__()
+        self.name = 'Steady-State Genetic Programming (uniform+interleaved)'
+
+magpie.utils.known_algos['genetic_programming'].append(GeneticProgrammingSteadyStateUniformInter)
@@ -0,0 +1,199 @@
+import configparser
+import logging
+import multiprocessing
+import queue
+import traceback
+
+import magpie.core
+import magpie.utils
+
+from .genetic_programming import GeneticProgramming
+
+
+class Island:
+    # migration channel of an island process (see GeneticProgramming.migrate)
+    def __init__(self, index, inbox, outbox, interval, size):
+        self.index = index
+        self.inbox = inbox
+        self.outbox = outbox
+        self.interval = interval
+        self.size = size
+        self.received = 0
+
+    def exchange(self, ranked):
+        # sends the best patches to the next island, and returns the patches received so far (never waits)
+        if self.size > 0:
+            self.outbox.put([str(sol) for sol in ranked[:self.size]])
+        immigrants = []
+        while True:
+            try:
+                blobs = self.inbox.get_nowait()
+            except queue.Empty:
+                break
+            immigrants.extend(magpie.core.Patch.from_string(blob) for blob in blobs)
+        self.received += len(immigrants)
+        return immigrants
+
+
+def run_island(index, sections, inbox, outbox, results):
+    # runs a complete search in its own process, with its own work directory and log file
+    try:
+        config = configparser.ConfigParser()
+        config.read_dict(sections)
+        if seed := config['magpie']['seed']:
+            config['magpie']['seed'] = str(int(seed) + index)
+        magpie.core.pre_setup(config)
+        magpie.core.setup(config)
+        sec = config['search.islands']
+        protocol = magpie.utils.element_from_string(config['search']['protocol'], magpie.utils.known_protocols)()
+        protocol.search = magpie.utils.element_from_string(sec['algorithm'], magpie.utils.known_algos['genetic_programming'])()
+        protocol.search.software = magpie.utils.element_from_string(config['software']['software'], magpie.utils.known_software)(config)
+        protocol.search.island = Island(index, inbox, outbox, int(sec['migration_interval']), int(sec['migration_size']))
+        # file logs only (the terminal is left to the main process)
+        logger = protocol.search.software.logger
+        log_file = None
+        for handler in list(logger.handlers):
+            if type(handler) is logging.StreamHandler:
+                logger.removeHandler(handler)
+            elif isinstance(handler, logging.FileHandler):
+                log_file = handler.baseFilename
+        protocol.run(config)
+        report = protocol.search.report
+        results.put({
+            'index': index,
+            'stop': report['stop'],
+            'best_patch': str(report['best_patch']) if report['best_patch'] else '',
+            'best_fitness': report['best_fitness'],
+            'steps': protocol.search.stats['steps'],
+            'received': protocol.search.island.received,
+            'log_file': log_file,
+        })
+    except BaseException: # also KeyboardInterrupt outside of the search itself
+        results.put({'index': index, 'error': traceback.format_exc()})
+    finally:
+        outbox.cancel_join_thread() # the next island may not read anymore
+
+
+class GeneticProgrammingIslands(magpie.core.BasicAlgorithm):
+    def __init__(self):
+        super().__init__()
+        self.name = 'Genetic Programming (island model)'
+        self.config['islands'] = 4
+        self.config['algorithm'] = 'GeneticProgrammingUniformConcat'
+        self.config['migration_interval'] = 5
+        self.config['migration_size'] = 1
+        self.sections = None
+
+    def setup(self, config):
+        super().setup(config)
+        sec = config['search.islands']
+        self.config['islands'] = int(sec['islands'])
+        if self.config['islands'] < 1:
+            msg = '[search.islands] islands should be a positive integer'
+            raise magpie.core.ScenarioError(msg)
+        try:
+            klass = magpie.utils.element_from_string(sec['algorithm'], magpie.utils.known_algos['genetic_programming'])
+        except RuntimeError:
+            klass = None
+        if klass is None or not issubclass(klass, GeneticProgramming):
+            msg = f'[search.islands] algorithm should be a genetic programming algorithm (got "{sec["algorithm"]}")'
+            raise magpie.core.ScenarioError(msg)
+        self.config['algorithm'] = sec['algorithm']
+        self.config['migration_interval'] = int(sec['migration_interval'])
+        if self.config['migration_interval'] < 1:
+            msg = '[search.islands] migration_interval should be a positive integer'
+            raise magpie.core.ScenarioError(msg)
+        self.config['migration_size'] = int(sec['migration_size'])
+        if self.config['migration_size'] < 0:
+            msg = '[search.islands] migration_size should be a non-negative integer'
+            raise magpie.core.ScenarioError(msg)
+        # islands start from the same scenario
+        self.sections = {name: dict(config.items(name, raw=True)) for name in config.sections()}
+
+    def run(self):
+        try:
+            # warmup (also checks the software before starting every island)
+            self.hook_warmup()
+            self.warmup()
+
+            # early stop if something went wrong during warmup
+            if self.report['stop']:
+                return
+
+            # start!
+            self.hook_start()
+            reports = self.run_islands()
+
+            # final re-evaluation
+            self.merge(reports)
+
+        except KeyboardInterrupt:
+            self.report['stop'] = 'keyboard interrupt'
+
+        finally:
+            # the end
+            self.hook_end()
+
+    def run_islands(self):
+        # island i sends its best patches to island i+1 (ring)
+        n = self.config['islands']
+        context = multiprocessing.get_context('spawn') # islands never inherit threads nor open files
+        inboxes = [context.Queue() for _ in range(n)]
+        results = context.Queue()
+        processes = [context.Process(target=run_island, args=(i, self.sections, inboxes[i], inboxes[(i+1) % n], results)) for i in range(n)]
+        for process in processes:
+            process.start()
+        self.software.logger.info('Started %d islands (%s)', n, self.config['algorithm'])
+        reports = {}
+        try:
+            while len(reports) < n:
+                try:
+                    report = results.get(timeout=1)
+                except queue.Empty:
+                    for i, process in enumerate(processes):
+                        if i not in reports and process.exitcode not in [None, 0]:
+                            msg = f'Island {i} exited unexpectedly (exit code {process.exitcode})'
+                            raise RuntimeError(msg) from None
+                    continue
+                except KeyboardInterrupt:
+                    # islands are interrupted as well, and report their best patch so far
+                    self.report['stop'] = 'keyboard interrupt'
+                    continue
+                if 'error' in report:
+                    msg = f'Island {report["index"]} failed:\n{report["error"]}'
+                    raise RuntimeError(msg)
+                reports[report['index']] = report
+                self.software.logger.info('Island %d: %s after %d steps (%d immigrants), log file: %s',
+                                          report['index'], report['stop'], report['steps'], report['received'], report['log_file'])
+        finally:
+            for process in processes:
+                process.join(timeout=10)
+                if process.is_alive():
+                    process.terminate()
+            for inbox in inboxes:
+                inbox.cancel_join_thread()
+        return [reports[i] for i in range(n)]
+
+    def merge(self, reports):
+        # fitness values are not comparable across islands (different processes, noise, and batches)
+        # so the best patch of every island is evaluated again
+        self.stats['steps'] = sum(report['steps'] for report in reports)
+        self.stats['immigrants'] = sum(report['received'] for report in reports)
+        if self.report['stop'] is None:
+            self.report['stop'] = ', '.join(sorted({report['stop'] for report in reports if report['stop']}))
+        candidates = []
+        for report in reports:
+            patch = magpie.core.Patch.from_string(report['best_patch'])
+            if patch.edits and patch not in [sol for _, sol in candidates]:
+                candidates.append((report['index'], patch))
+        variants = [self.make_variant(patch) for _, patch in candidates]
+        runs = self.evaluate_variants(variants, force=True)
+        for (i, patch), run in zip(candidates, runs):
+            best = False
+            if run.status == 'SUCCESS' and self.dominates(run.fitness, self.report['best_fitness']):
+                self.report['best_fitness'] = run.fitness
+                self.report['best_patch'] = patch
+                best = True
+            self.hook_batch_evaluation(f'ISL{i}', patch, run, best)
+
+magpie.utils.known_algos['genetic_programming'].append(GeneticProgrammingIslands)
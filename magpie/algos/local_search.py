@@ -7,6 +7,8 @@ import magpie.utils
 
 
 class LocalSearch(magpie.core.BasicAlgorithm):
+    surrogate_screening = True
+
     def __init__(self):
         super().__init__()
         self.name = 'Local Search'
@@ -22,7 +24,7 @@ class LocalSearch(magpie.core.BasicAlgorithm):
         super().setup(config)
         sec = config['search.ls']
         self.config['delete_prob'] = float(sec['delete_prob'])
-        self.config['max_neighbours'] = int(val) if (val := sec['max_neighbours']) else None
+        self.config['max_neighbours'] = int(val) if (val := sec['max_neighbours']) else self.config['max_neighbours']
         self.config['when_trapped'] = sec['when_trapped']
 
     def run(self):
@@ -68,6 +70,22 @@ class LocalSearch(magpie.core.BasicAlgorithm):
         else:
             patch.edits.append(self.create_edit(self.software.noop_variant))
 
+    def sample_neighbours(self, current_patch, k, tabu):
+        # k distinct neighbours of current_patch not in tabu (at least one, fewer if not enough can be generated)
+        patches = []
+        tries = magpie.settings.edit_retries
+        while len(patches) < k and tries:
+            patch = copy.deepcopy(current_patch)
+            self.mutate(patch)
+            if patch in tabu or patch in patches:
+                if patches:
+                    tries -= 1
+                continue
+            patches.append(patch)
+            if self.report['stop']:
+                break
+        return patches
+
     def check_if_trapped(self):
         if self.config['max_neighbours'] is None:
             return
@@ -86,6 +104,9 @@ class FirstImprovement(LocalSearch):
         self.local_tabu = set()
 
     def explore(self, current_patch, current_fitness):
+        if self.config['parallel_workers'] > 1:
+            return self.explore_parallel(current_patch, current_fitness)
+
         # move
         while True:
             patch = copy.deepcopy(current_patch)
@@ -94,7 +115,7 @@ class FirstImprovement(LocalSearch):
                 break
 
         # compare
-        variant = magpie.core.Variant(self.software, patch)
+        variant = self.make_variant(patch)
         run = self.evaluate_variant(variant)
         accept = best = False
         if run.status == 'SUCCESS':
@@ -124,6 +145,46 @@ class FirstImprovement(LocalSearch):
         self.stats['steps'] += 1
         return current_patch, current_fitness
 
+    def explore_parallel(self, current_patch, current_fitness):
+        # speculatively evaluates "[search] parallel_workers" distinct neighbours at once
+        # neighbours are considered in generation order, so the earliest improving one is accepted
+        # (later ones are evaluated in vain, but still logged and counted as steps)
+        patches = self.sample_neighbours(current_patch, self.config['parallel_workers'], self.local_tabu)
+        moved = False
+        for chunk in self.evaluation_chunks(patches):
+            variants = [self.make_variant(patch) for patch in chunk]
+            runs = self.evaluate_variants(variants)
+            for patch, variant, run in zip(chunk, variants, runs):
+                # compare
+                accept = best = False
+                if run.status == 'SUCCESS' and not moved:
+                    if not self.dominates(current_fitness, run.fitness):
+                        accept = True
+                        if self.dominates(run.fitness, self.report['best_fitness']):
+                            self.report['best_fitness'] = run.fitness
+                            self.report['best_patch'] = patch
+                            best = True
+
+                # accept
+                if accept:
+                    current_patch = patch
+                    current_fitness = run.fitness
+                    self.local_tabu.clear()
+                    self.stats['neighbours'] = 0
+                    moved = True
+                elif not moved:
+                    if len(patch.edits) < len(current_patch.edits):
+                        self.local_tabu.add(patch)
+                    self.stats['neighbours'] += 1
+                    self.check_if_trapped()
+
+                # hook
+                self.hook_evaluation(variant, run, accept, best)
+
+                # next
+                self.stats['steps'] += 1
+        return current_patch, current_fitness
+
 magpie.utils.known_algos['local_search'].append(FirstImprovement)
 
 class DummySearch(LocalSearch):
@@ -161,7 +222,7 @@ class DebugSearch(LocalSearch):
                     best = True
 
             # hook
-            self.hook_evaluation(patch, run, accept, best)
+            self.hook_evaluation(variant, run, accept, best)
 
             # next
             self.stats['steps'] += 1
@@ -219,7 +280,7 @@ class RandomWalk(LocalSearch):
         self.mutate(patch)
 
         # compare
-        variant = magpie.core.Variant(self.software, patch)
+        variant = self.make_variant(patch)
         run = self.evaluate_variant(variant)
         accept = self.config['accept_fail']
         best = False
@@ -241,7 +302,7 @@ class RandomWalk(LocalSearch):
             self.check_if_trapped()
 
         # hook
-        self.hook_evaluation(patch, run, accept, best)
+        self.hook_evaluation(variant, run, accept, best)
 
         # next
         self.stats['steps'] += 1
@@ -259,6 +320,9 @@ class BestImprovement(LocalSearch):
         self.local_tabu = set()
 
     def explore(self, current_patch, current_fitness):
+        if self.config['parallel_workers'] > 1:
+            return self.explore_parallel(current_patch, current_fitness)
+
         # move
         while True:
             patch = copy.deepcopy(current_patch)
@@ -267,7 +331,7 @@ class BestImprovement(LocalSearch):
                 break
 
         # compare
-        variant = magpie.core.Variant(self.software, patch)
+        variant = self.make_variant(patch)
         run = self.evaluate_variant(variant)
         accept = best = False
         if run.status == 'SUCCESS':
@@ -299,12 +363,58 @@ class BestImprovement(LocalSearch):
             self.check_if_trapped()
 
         # hook
-        self.hook_evaluation(patch, run, accept, best)
+        self.hook_evaluation(variant, run, accept, best)
 
         # next
         self.stats['steps'] += 1
         return current_patch, current_fitness
 
+    def explore_parallel(self, current_patch, current_fitness):
+        # the neighbours remaining before acceptance are generated at once (at least "[search] parallel_workers")
+        # and evaluated "[search] parallel_workers" at a time; the best one is accepted after the last evaluation
+        k = max(self.config['max_neighbours'] - self.stats['neighbours'], self.config['parallel_workers'])
+        patches = self.sample_neighbours(current_patch, k, self.local_tabu)
+        for chunk in self.evaluation_chunks(patches):
+            variants = [self.make_variant(patch) for patch in chunk]
+            runs = self.evaluate_variants(variants)
+            for patch, variant, run in zip(chunk, variants, runs):
+                # compare
+                best = False
+                if run.status == 'SUCCESS':
+                    if not self.dominates(current_fitness, run.fitness):
+                        if not self.dominates(self.local_best_fitness, run.fitness):
+                            self.local_best_patch = patch
+                            self.local_best_fitness = run.fitness
+                            if self.dominates(run.fitness, self.report['best_fitness']):
+                                self.report['best_fitness'] = run.fitness
+                                self.report['best_patch'] = patch
+                                best = True
+
+                # accept
+                accept = patch is patches[-1]
+                if accept:
+                    if self.local_best_patch is not None:
+                        current_patch = self.local_best_patch
+                        current_fitness = self.local_best_fitness
+                        self.local_best_patch = None
+                        self.local_best_fitness = None
+                        self.local_tabu.clear()
+                        self.stats['neighbours'] = 0
+                    else:
+                        self.check_if_trapped()
+                else:
+                    if len(patch.edits) < len(current_patch.edits):
+                        self.local_tabu.add(patch)
+                    self.stats['neighbours'] += 1
+                    self.check_if_trapped()
+
+                # hook
+                self.hook_evaluation(variant, run, accept, best)
+
+                # next
+                self.stats['steps'] += 1
+        return current_patch, current_fitness
+
 magpie.utils.known_algos['local_search'].append(BestImprovement)
 
 
@@ -326,7 +436,7 @@ class WorstImprovement(LocalSearch):
                 break
 
         # compare
-        variant = magpie.core.Variant(self.software, patch)
+        variant = self.make_variant(patch)
         run = self.evaluate_variant(variant)
         accept = best = False
         if run.status == 'SUCCESS':
@@ -358,7 +468,7 @@ class WorstImprovement(LocalSearch):
             self.check_if_trapped()
 
         # hook
-        self.hook_evaluation(patch, run, accept, best)
+        self.hook_evaluation(variant, run, accept, best)
 
         # next
         self.stats['steps'] += 1
@@ -389,7 +499,7 @@ class TabuSearch(BestImprovement):
                 break
 
         # compare
-        variant = magpie.core.Variant(self.software, patch)
+        variant = self.make_variant(patch)
         run = self.evaluate_variant(variant)
         accept = best = False
         if run.status == 'SUCCESS':
@@ -423,7 +533,7 @@ class TabuSearch(BestImprovement):
             self.check_if_trapped()
 
         # hook
-        self.hook_evaluation(patch, run, accept, best)
+        self.hook_evaluation(variant, run, accept, best)
 
         # next
         self.stats['steps'] += 1
@@ -7,6 +7,8 @@ from .local_search import LocalSearch
 
 
 class ValidSearch(LocalSearch):
+    surrogate_screening = False # patches under validation are always evaluated
+
     def __init__(self):
         super().__init__()
         self.debug_patch = None
@@ -42,7 +44,7 @@ class ValidSearch(LocalSearch):
             patch = copy.deepcopy(cleaned.patch)
             del patch.edits[k]
             tmp = magpie.core.Variant(self.software, patch)
-            if tmp.diff == variant.diff:
+            if tmp.digest == variant.digest:
                 self.software.logger.info('removed %s', cleaned.patch.edits[k])
                 cleaned = tmp
         s1, s2 = len(cleaned.patch.edits), len(variant.patch.edits)
@@ -138,10 +140,9 @@ class ValidMinify(ValidSearch):
             self.software.logger.info('---- ranking ----')
             ranking = []
             ref_fit = [(-float('inf') if f.maximize else float('inf')) for f in self.software.fitness]
-            for edit in variant.patch.edits:
-                patch = magpie.core.Patch([edit])
-                tmp = magpie.core.Variant(self.software, patch)
-                run = self.evaluate_variant(tmp)
+            variants = [magpie.core.Variant(self.software, magpie.core.Patch([edit])) for edit in variant.patch.edits]
+            runs = self.evaluate_variants(variants)
+            for edit, tmp, run in zip(variant.patch.edits, variants, runs):
                 self.hook_evaluation(tmp, run)
                 ranking.append((edit, run.fitness))
             ranking.sort(key=lambda c: c[1] or ref_fit)
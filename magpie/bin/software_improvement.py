@@ -24,10 +24,11 @@ if __name__ == '__main__':
 
     # select GP algorithm
     if args.algo is not None:
-        algo = magpie.utils.algo_from_string(args.algo)
-        if not magpie.utils.known_algos[search_type].contains(algo) :
-            msg = f'Invalid genetic programming algorithm "{algo.__name__}"'
-            raise RuntimeError(msg)
+        try:
+            algo = magpie.utils.element_from_string(args.algo, magpie.utils.known_algos[search_type])
+        except RuntimeError:
+            msg = f'Invalid {search_type.replace("_", " ")} algorithm "{args.algo}"'
+            raise RuntimeError(msg) from None
         config['search']['algorithm'] = args.algo
     else:
         algo = magpie.utils.known_algos[search_type][0]
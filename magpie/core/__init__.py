@@ -3,6 +3,7 @@ from .abstract_edit import AbstractEdit
 from .abstract_fitness import AbstractFitness
 from .abstract_model import AbstractModel
 from .abstract_software import AbstractSoftware
+from .async_software import AsyncSoftware
 from .basic_algorithm import BasicAlgorithm
 from .basic_fitness import BasicFitness
 from .basic_protocol import BasicProtocol
@@ -10,6 +11,7 @@ from .basic_software import BasicSoftware
 from .errors import ScenarioError
 from .execresult import ExecResult
 from .patch import Patch
+from .persistent_cache import PersistentCache
 from .runresult import RunResult
 from .scenario import default_scenario
 from .setup import pre_setup, setup
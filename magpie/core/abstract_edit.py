@@ -1,4 +1,5 @@
 import abc
+import functools
 import re
 
 
@@ -27,8 +28,12 @@ class AbstractEdit:
         return hash(str(self))
 
     def __str__(self):
-        base = re.sub(r'Edit(<.*>)?$', '\\1', self.__class__.__name__)
+        base = _base_name(self.__class__.__name__)
         if self.data:
             tmp = ', '.join([repr(d) for d in self.data])
             return f'{base}({self.target!r}, {tmp})'
         return f'{base}({self.target!r})'
+
+@functools.cache
+def _base_name(name):
+    return re.sub(r'Edit(<.*>)?$', '\\1', name)
@@ -1,10 +1,17 @@
 import abc
 
 class AbstractFitness(abc.ABC):
+    # whether fitness values are read from the work directory (e.g., source files)
+    reads_work_dir = False
+
     def __init__(self, software):
         self.software = software
         self.maximize = False
 
+    def artifact_compatible(self):
+        # whether fitness values only depend on test_cmd and run_cmd (see "[software] artifacts")
+        return not self.reads_work_dir
+
     @abc.abstractmethod
     def process_init_exec(self, run_result, exec_result):
         pass
@@ -1,9 +1,15 @@
 import abc
+import bisect
+import copy
+import itertools
 import pathlib
 import random
 
 import magpie.settings
 
+from .errors import ScenarioError
+from .profile import match_file, profile_format, read_profile
+
 
 class AbstractModel(abc.ABC):
     def __init__(self, filename):
@@ -14,24 +20,89 @@ class AbstractModel(abc.ABC):
         self.locations_names = {} # for indirection
         self.indirect_locations = True
         self.weights = {}
+        self.cumulative_weights = {} # target type -> accumulated weights (see random_target)
+        self.profile = [] # profile files (see init_weights)
+        self.profile_format = 'auto'
+        self.profile_floor = 0.0
         self.trust_local = magpie.settings.trust_local_filesystem
-        self.cached_dump = None
+        self.cached_dump = None # dump of the original file
+        self.latest_dump = None
+        self.dirty = True # whether contents changed since latest_dump (set by edits)
+
+    def setup(self, config, section_name):
+        config_section = config[section_name]
+        if 'profile' in config_section:
+            self.profile = config_section['profile'].split()
+            for path in self.profile:
+                if not pathlib.Path(path).is_file():
+                    msg = f'Invalid config file: "[{section_name}] profile" file "{path}" not found'
+                    raise ScenarioError(msg)
+        if 'profile_format' in config_section:
+            self.profile_format = config_section['profile_format']
+        for path in self.profile:
+            profile_format(path, self.profile_format) # early check
+        if 'profile_floor' in config_section:
+            self.profile_floor = float(config_section['profile_floor'])
+            if not 0 <= self.profile_floor <= 1:
+                msg = f'Invalid config file: "[{section_name}] profile_floor" should be in [0, 1]'
+                raise ScenarioError(msg)
 
     @abc.abstractmethod
     def init_contents(self):
         pass
 
+    def location_lines(self, target_type):
+        # (first, last) lines of the original file spanned by every location, or None if unsupported
+        return None
+
+    def init_weights(self):
+        # profile-guided weights: locations are weighted by their hottest line
+        if not self.profile:
+            return
+        lines = {}
+        for path in self.profile:
+            for lineno, weight in match_file(read_profile(path, self.profile_format), self.renamed_filename).items():
+                lines[lineno] = lines.get(lineno, 0) + weight
+        if not lines:
+            return # no data about this file
+        for target_type in self.locations:
+            if (spans := self.location_lines(target_type)) is None:
+                continue
+            weights = [max([lines.get(i, 0) for i in range(first, last+1)], default=0) for first, last in spans]
+            if (top := max(weights, default=0)) > 0:
+                floor = self.profile_floor * top
+                self.weights[target_type] = [max(w, floor) for w in weights]
+        self.cumulative_weights = {}
+
     @abc.abstractmethod
-    def dump(self):
+    def serialize(self):
         pass
 
+    def dump(self):
+        # serialisation is memoised until the next modification
+        if self.dirty:
+            self.latest_dump = self.serialize()
+            self.dirty = False
+        return self.latest_dump
+
+    def fork(self):
+        # returns a copy of the model that edits can modify without affecting this one
+        # unmodified data may be shared, hence the original model must not be modified afterwards
+        clone = copy.copy(self)
+        clone.contents = copy.deepcopy(self.contents)
+        clone.locations = copy.deepcopy(self.locations)
+        if not self.indirect_locations:
+            clone.locations_names = clone.locations
+        return clone
+
     def show_location(self, target_type, target_loc):
         msg = '(unsupported)'
         if magpie.settings.color_output:
             return f'\033[31m{msg}\033[0m'
         return msg
 
-    def write_to_file(self):
+    def write_to_file(self, work_path='.'):
+        path = pathlib.Path(work_path) / self.renamed_filename
         # compute dump
         dump = self.dump()
         # skip writing if file is (or should be) untouched
@@ -40,25 +111,25 @@ class AbstractModel(abc.ABC):
         if dump == self.cached_dump:
             if self.trust_local:
                 return
-            with pathlib.Path(self.renamed_filename).open('r') as tmp_file:
+            with path.open('r') as tmp_file:
                 if tmp_file.read() == dump:
                     return
             self.trust_local = True
         # write only if file _really_ changed
-        with pathlib.Path(self.renamed_filename).open('w') as tmp_file:
+        with path.open('w') as tmp_file:
             tmp_file.write(dump)
 
     def random_target(self, target_type=None):
         if target_type is None:
             target_type = random.choice(list(self.locations.keys()))
         if target_type in self.weights:
-            total_weight = sum(self.weights[target_type])
-            r = random.uniform(0, total_weight)
-            for loc, w in enumerate(self.weights[target_type]):
-                if r < w:
-                    return (self.filename, target_type, loc)
-                r -= w
-            raise RuntimeError
+            # weights are fixed once the model is initialised
+            if (cumulative := self.cumulative_weights.get(target_type)) is None:
+                cumulative = self.cumulative_weights[target_type] = list(itertools.accumulate(self.weights[target_type]))
+            loc = bisect.bisect_right(cumulative, random.uniform(0, cumulative[-1]))
+            if loc == len(cumulative):
+                raise RuntimeError
+            return (self.filename, target_type, loc)
         if target_type in self.locations_names:
             if tmp := self.locations_names[target_type]:
                 loc = random.choice(tmp)
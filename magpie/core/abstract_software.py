@@ -1,12 +1,16 @@
 import abc
+import concurrent.futures
 import contextlib
 import errno
+import hashlib
 import logging
+import math
 import os
 import pathlib
 import platform
+import queue
 import re
-import select
+import selectors
 import shutil
 import signal
 import subprocess
@@ -17,6 +21,14 @@ import magpie.settings
 from .execresult import ExecResult
 from .variant import Variant
 
+try:
+    import fcntl
+except ImportError: # non-POSIX
+    fcntl = None
+
+READ_CHUNK_SIZE = 1 << 16
+FICLONE = 0x40049409 # Linux ioctl (copy-on-write clone)
+
 
 class AbstractSoftware(abc.ABC):
     def __init__(self, path, reset=True):
@@ -25,7 +37,13 @@ class AbstractSoftware(abc.ABC):
         self.basename = self.path.name
         self.target_files = []
         self.noop_variant = None
+        self.model_cache = False
         self.work_dir = None
+        self.executor = None
+        self.executor_workers = 0
+        self.free_workers = None
+        self.reflink_supported = True
+        self.manifests = {}
 
         if reset:
             self.reset_timestamp()
@@ -33,6 +51,16 @@ class AbstractSoftware(abc.ABC):
             self.reset_workdir()
             self.reset_contents()
 
+    def fingerprint(self):
+        # identifies the software for the purpose of the persistent cache
+        # (returned as a hashlib object so that subclasses can extend it)
+        fingerprint = hashlib.blake2b(digest_size=16)
+        fingerprint.update(self.__class__.__name__.encode())
+        for filename in self.target_files:
+            fingerprint.update(filename.encode())
+            fingerprint.update((self.path / filename).read_bytes())
+        return fingerprint
+
     def reset_timestamp(self):
         # ensures a unique timestamp unique
         self.timestamp = str(int(time.time()))
@@ -87,6 +115,7 @@ class AbstractSoftware(abc.ABC):
 
     def reset_workdir(self):
         # creates or move current work_dir
+        self.manifests = {}
         new_work_dir = pathlib.Path(magpie.settings.work_dir).resolve() / self.run_label
         if self.work_dir and self.work_dir.exists():
             self.work_dir = pathlib.Path(shutil.move(self.work_dir, new_work_dir))
@@ -110,24 +139,66 @@ class AbstractSoftware(abc.ABC):
         self.noop_variant = Variant(self)
 
     @abc.abstractmethod
-    def evaluate_variant(self, variant, cached_run=None):
+    def evaluate_variant(self, variant, cached_run=None, worker=0):
         pass
 
-    def write_variant(self, variant):
+    def evaluate_variants(self, variants, cached_runs=None, workers=1):
+        # evaluates independent variants, each in its own work directory
+        cached_runs = cached_runs or [None for _ in variants]
+        if workers <= 1 or len(variants) <= 1:
+            return [self.evaluate_variant(variant, cached_run) for variant, cached_run in zip(variants, cached_runs)]
+        futures = [self.submit_variant(variant, cached_run, workers) for variant, cached_run in zip(variants, cached_runs)]
+        return [future.result() for future in futures]
+
+    def submit_variant(self, variant, cached_run=None, workers=1):
+        # asynchronous evaluation, returns a concurrent.futures.Future
+        if self.executor is None or self.executor_workers != workers:
+            self.shutdown_workers()
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+            self.executor_workers = workers
+            self.free_workers = queue.SimpleQueue()
+            for worker in range(workers):
+                self.free_workers.put(worker)
+        return self.executor.submit(self._evaluate_on_free_worker, variant, cached_run)
+
+    def _evaluate_on_free_worker(self, variant, cached_run):
+        worker = self.free_workers.get()
+        try:
+            return self.evaluate_variant(variant, cached_run, worker)
+        finally:
+            self.free_workers.put(worker)
+
+    def shutdown_workers(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+            self.executor_workers = 0
+            self.free_workers = None
+
+    def work_path(self, worker=0):
+        # worker 0 always uses the historical location
+        if worker == 0:
+            return self.work_dir / self.basename
+        return self.work_dir / f'__worker{worker}__' / self.basename
+
+    def write_variant(self, variant, worker=0):
         # reset work directory
-        work_path = self.work_dir / self.basename
-        self.sync_folder(work_path, self.path)
+        work_path = self.work_path(worker)
+        self.restore_folder(work_path)
 
         # process modified files
-        with contextlib.chdir(work_path):
-            for filename in self.target_files:
-                variant.models[filename].write_to_file()
+        for filename in self.target_files:
+            model = variant.models[filename]
+            if magpie.settings.workspace_strategy == 'hardlink':
+                # never write through a link shared with the original software
+                self.break_link(work_path / model.renamed_filename)
+            model.write_to_file(work_path)
 
     def sync_folder(self, target, original):
         try:
             contents_target = os.listdir(target)
         except FileNotFoundError:
-            shutil.copytree(original, target)
+            shutil.copytree(original, target, copy_function=self.copy_file)
             return
         contents_original = os.listdir(original)
         for entry in contents_target:
@@ -144,8 +215,8 @@ class AbstractSoftware(abc.ABC):
                 original_entry = original / entry
                 if original_entry.stat().st_mtime < target_entry.stat().st_mtime:
                     # modified file
-                    shutil.copyfile(original_entry, target_entry)
-                    shutil.copystat(original_entry, target_entry)
+                    target_entry.unlink()
+                    self.copy_file(original_entry, target_entry)
             # else: unmodified file
         for entry in contents_original:
             target_entry = target / entry
@@ -156,56 +227,148 @@ class AbstractSoftware(abc.ABC):
                     self.sync_folder(target_entry, original_entry)
                 else:
                     # deleted directory (?)
-                    shutil.copytree(original_entry, target_entry)
+                    shutil.copytree(original_entry, target_entry, copy_function=self.copy_file)
             elif entry not in contents_target:
                 # deleted file
-                shutil.copyfile(original_entry, target_entry)
+                self.copy_file(original_entry, target_entry)
             # else: appears in both (already handled)
 
-    def exec_cmd(self, cmd, timeout=15, env=None, shell=False, lengthout=1e6):
-        # 1e6 bytes is 1Mb
-        sprocess = None
-        stdout = b''
-        stderr = b''
-        start = time.time()
-        sprocess = None
+    def restore_folder(self, work_path):
+        # restores a work directory to the original software
+        # the first time with a full sync, and then incrementally using the manifest of the work directory
+        manifest = self.manifests.get(work_path)
+        if manifest is None:
+            self.sync_folder(work_path, self.path)
+            self.manifests[work_path] = self.scan_manifest(work_path)
+            return
+
+        # single pass on the work directory (the original software is never listed)
+        seen = set()
+        stack = ['']
+        while stack:
+            rel_path = stack.pop()
+            with os.scandir(work_path / rel_path) as entries:
+                for entry in entries:
+                    rel_entry = os.path.join(rel_path, entry.name)
+                    if entry.is_dir(follow_symlinks=False):
+                        if rel_entry in manifest and manifest[rel_entry] is None:
+                            # common directory
+                            seen.add(rel_entry)
+                            stack.append(rel_entry)
+                        else:
+                            # new directory
+                            shutil.rmtree(entry.path)
+                    elif manifest.get(rel_entry) is None:
+                        # new file
+                        os.unlink(entry.path)
+                    else:
+                        seen.add(rel_entry)
+                        stat = entry.stat(follow_symlinks=False)
+                        if (stat.st_size, stat.st_mtime_ns, stat.st_ino) != manifest[rel_entry]:
+                            # modified file
+                            os.unlink(entry.path)
+                            manifest[rel_entry] = self.restore_file(work_path, rel_entry)
+
+        # deleted files and directories
+        if len(seen) < len(manifest):
+            restored = set()
+            for rel_entry in [rel_entry for rel_entry in manifest if rel_entry not in seen]:
+                restored.add(rel_entry)
+                if os.path.dirname(rel_entry) in restored:
+                    continue # already restored with its parent directory
+                if manifest[rel_entry] is None:
+                    shutil.copytree(self.path / rel_entry, work_path / rel_entry, copy_function=self.copy_file)
+                    for rel_sub, value in self.scan_manifest(work_path / rel_entry).items():
+                        manifest[os.path.join(rel_entry, rel_sub)] = value
+                else:
+                    manifest[rel_entry] = self.restore_file(work_path, rel_entry)
+
+    def restore_file(self, work_path, rel_path):
+        target = work_path / rel_path
+        self.copy_file(self.path / rel_path, target)
+        stat = os.stat(target, follow_symlinks=False)
+        return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+    @staticmethod
+    def scan_manifest(path):
+        # relative path --> (size, mtime_ns, inode) for files, None for directories
+        # (parent directories always appear before their contents)
+        manifest = {}
+        stack = ['']
+        while stack:
+            rel_path = stack.pop()
+            with os.scandir(path / rel_path) as entries:
+                for entry in entries:
+                    rel_entry = os.path.join(rel_path, entry.name)
+                    if entry.is_dir(follow_symlinks=False):
+                        manifest[rel_entry] = None
+                        stack.append(rel_entry)
+                    else:
+                        stat = entry.stat(follow_symlinks=False)
+                        manifest[rel_entry] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        return manifest
+
+    def copy_file(self, original, target):
+        # materialises a single file according to "[magpie] workspace_strategy"
+        strategy = magpie.settings.workspace_strategy
+        if strategy == 'hardlink':
+            try:
+                os.link(original, target)
+                return target
+            except OSError:
+                pass # e.g., cross-device link
+        elif strategy == 'reflink' and fcntl is not None and self.reflink_supported:
+            try:
+                with open(original, 'rb') as src, open(target, 'wb') as dst:
+                    fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                shutil.copystat(original, target)
+                return target
+            except OSError:
+                self.reflink_supported = False # no further attempt
+        return shutil.copy2(original, target)
+
+    @staticmethod
+    def break_link(path):
+        # replaces a hard link by a private copy
+        with contextlib.suppress(FileNotFoundError):
+            if path.stat().st_nlink > 1:
+                tmp_path = path.with_name(f'.{path.name}.magpie_tmp')
+                shutil.copy2(path, tmp_path)
+                os.replace(tmp_path, path)
+
+    def exec_env(self, env=None):
         env = env or os.environ.copy()
         env['MAGPIE_ROOT'] = magpie.settings.magpie_root
         env['MAGPIE_LOG_DIR'] = magpie.settings.log_dir
         env['MAGPIE_WORK_DIR'] = magpie.settings.work_dir
         env['MAGPIE_BASENAME'] = self.basename
         env['MAGPIE_TIMESTAMP'] = self.timestamp
+        return env
+
+    def exec_cmd(self, cmd, timeout=15, env=None, shell=False, lengthout=1e6, cwd=None):
+        # 1e6 bytes is 1Mb
+        sprocess = None
+        stdout = b''
+        stderr = b''
+        start = time.time()
+        sprocess = None
+        env = self.exec_env(env)
         try:
             is_posix = os.name == 'posix'
-            with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=shell, env=env, start_new_session=is_posix) as sprocess:
+            with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=shell, env=env, cwd=cwd, start_new_session=is_posix) as sprocess:
                 if lengthout > 0:
-                    stdout_size = 0
-                    stderr_size = 0
-                    while sprocess.poll() is None:
+                    status, stdout, stderr, output_length = self._read_outputs(sprocess, start, timeout, lengthout)
+                    end = time.time()
+                    if status != 'SUCCESS':
+                        _kill_proc_with_children(sprocess)
+                        return ExecResult(cmd, status, sprocess.returncode, stdout, stderr, end-start, output_length, cwd)
+                    try:
+                        sprocess.wait(timeout=max(0, timeout-(end-start)))
+                    except subprocess.TimeoutExpired:
+                        _kill_proc_with_children(sprocess)
                         end = time.time()
-                        if end-start > timeout:
-                            _kill_proc_with_children(sprocess)
-                            return ExecResult(cmd, 'TIMEOUT', sprocess.returncode, stdout, stderr, end-start, stdout_size+stderr_size)
-                        a = select.select([sprocess.stdout, sprocess.stderr], [], [], 1)[0]
-                        if sprocess.stdout in a:
-                            for _ in range(1024):
-                                if not select.select([sprocess.stdout], [], [], 0)[0]:
-                                    break
-                                stdout += sprocess.stdout.read(1)
-                                stdout_size += 1
-                        if sprocess.stderr in a:
-                            for _ in range(1024):
-                                if not select.select([sprocess.stderr], [], [], 0)[0]:
-                                    break
-                                stderr += sprocess.stderr.read(1)
-                                stderr_size += 1
-                        if stdout_size+stderr_size >= lengthout:
-                            _kill_proc_with_children(sprocess)
-                            _, _ = sprocess.communicate()
-                            return ExecResult(cmd, 'LENGTHOUT', sprocess.returncode, stdout, stderr, end-start, stdout_size+stderr_size)
+                        return ExecResult(cmd, 'TIMEOUT', sprocess.returncode, stdout, stderr, end-start, output_length, cwd)
                     end = time.time()
-                    stdout += sprocess.stdout.read()
-                    stderr += sprocess.stderr.read()
                 else:
                     try:
                         stdout, stderr = sprocess.communicate(timeout=timeout)
@@ -213,13 +376,39 @@ class AbstractSoftware(abc.ABC):
                         _kill_proc_with_children(sprocess)
                         stdout, stderr = sprocess.communicate()
                         end = time.time()
-                        return ExecResult(cmd, 'TIMEOUT', sprocess.returncode, stdout, stderr, end-start, len(stdout)+len(stderr))
+                        return ExecResult(cmd, 'TIMEOUT', sprocess.returncode, stdout, stderr, end-start, len(stdout)+len(stderr), cwd)
                     end = time.time()
-                return ExecResult(cmd, 'SUCCESS', sprocess.returncode, stdout, stderr, end-start, len(stdout)+len(stderr))
+                return ExecResult(cmd, 'SUCCESS', sprocess.returncode, stdout, stderr, end-start, len(stdout)+len(stderr), cwd)
         except FileNotFoundError:
-            return ExecResult(cmd, 'CLI_ERROR', -1, b'', b'', 0, 0)
+            return ExecResult(cmd, 'CLI_ERROR', -1, b'', b'', 0, 0, cwd)
+
+    @staticmethod
+    def _read_outputs(sprocess, start, timeout, lengthout):
+        # reads both pipes in large chunks until EOF, TIMEOUT, or LENGTHOUT
+        lengthout = math.ceil(lengthout)
+        stdout = bytearray()
+        stderr = bytearray()
+        output_length = 0
+        with selectors.DefaultSelector() as selector:
+            selector.register(sprocess.stdout, selectors.EVENT_READ, stdout)
+            selector.register(sprocess.stderr, selectors.EVENT_READ, stderr)
+            while selector.get_map():
+                remaining = timeout - (time.time() - start)
+                if remaining <= 0:
+                    return 'TIMEOUT', bytes(stdout), bytes(stderr), output_length
+                for key, _ in selector.select(remaining):
+                    chunk = os.read(key.fd, min(READ_CHUNK_SIZE, lengthout - output_length))
+                    if not chunk:
+                        selector.unregister(key.fileobj)
+                        continue
+                    key.data.extend(chunk)
+                    output_length += len(chunk)
+                    if output_length >= lengthout:
+                        return 'LENGTHOUT', bytes(stdout), bytes(stderr), output_length
+        return 'SUCCESS', bytes(stdout), bytes(stderr), output_length
 
     def clean_work_dir(self):
+        self.shutdown_workers()
         with contextlib.suppress(FileNotFoundError):
             shutil.rmtree(self.work_dir)
         with contextlib.suppress(FileNotFoundError):
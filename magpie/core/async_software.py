@@ -0,0 +1,157 @@
+import asyncio
+import contextlib
+import math
+import os
+import signal
+import threading
+import time
+
+import magpie.utils
+
+from .abstract_software import READ_CHUNK_SIZE, _kill_proc_with_children
+from .basic_software import BasicSoftware
+from .execresult import ExecResult
+
+KILL_GRACE = 1 # seconds to collect the outputs of killed processes
+
+
+class AsyncSoftware(BasicSoftware):
+    """Variant of BasicSoftware running the compile/test/run pipeline with asyncio subprocesses.
+
+    All evaluations share a single event loop (running in a background thread) so that many
+    variants can be evaluated concurrently without one thread per worker.
+    """
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.loop = None
+        self.loop_thread = None
+        self.async_free_workers = None
+        self.async_workers = 0
+        self.async_busy_workers = set()
+
+    async def evaluate_variant_async(self, variant, cached_run=None, worker=0):
+        # the synchronous parts of the pipeline (writing the variant, hashing artifacts, ...)
+        # run in the default executor so as not to stall the other evaluations
+        steps = self.evaluation_steps(variant, cached_run, worker)
+        done, request = await asyncio.to_thread(_advance_steps, steps, None)
+        while not done:
+            result = await self.exec_requests_async(request)
+            done, request = await asyncio.to_thread(_advance_steps, steps, result)
+        return request
+
+    async def exec_requests_async(self, request):
+        if isinstance(request, list):
+            return await asyncio.gather(*(self.exec_cmd_async(**r) for r in request))
+        return await self.exec_cmd_async(**request)
+
+    def evaluate_variant(self, variant, cached_run=None, worker=0):
+        coroutine = self.evaluate_variant_async(variant, cached_run, worker)
+        return asyncio.run_coroutine_threadsafe(coroutine, self.event_loop()).result()
+
+    def submit_variant(self, variant, cached_run=None, workers=1):
+        coroutine = self._evaluate_on_free_worker_async(variant, cached_run, workers)
+        return asyncio.run_coroutine_threadsafe(coroutine, self.event_loop())
+
+    async def _evaluate_on_free_worker_async(self, variant, cached_run, workers):
+        # only ever accessed from the event loop thread
+        if self.async_free_workers is None:
+            self.async_free_workers = asyncio.Condition()
+        free_workers = self.async_free_workers
+        async with free_workers:
+            if self.async_workers != workers:
+                # workers still busy with earlier evaluations are only reused once they complete
+                self.async_workers = workers
+                free_workers.notify_all()
+            worker = min(await free_workers.wait_for(lambda: set(range(self.async_workers)) - self.async_busy_workers))
+            self.async_busy_workers.add(worker)
+        try:
+            return await self.evaluate_variant_async(variant, cached_run, worker)
+        finally:
+            async with free_workers:
+                self.async_busy_workers.discard(worker)
+                free_workers.notify_all()
+
+    def event_loop(self):
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            self.loop_thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+            self.loop_thread.start()
+        return self.loop
+
+    def shutdown_workers(self):
+        super().shutdown_workers()
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.loop_thread.join()
+            self.loop.close()
+            self.loop = None
+            self.loop_thread = None
+            self.async_free_workers = None
+            self.async_workers = 0
+            self.async_busy_workers = set()
+
+    async def exec_cmd_async(self, cmd, timeout=15, env=None, shell=False, lengthout=1e6, cwd=None):
+        # 1e6 bytes is 1Mb
+        start = time.time()
+        env = self.exec_env(env)
+        is_posix = os.name == 'posix'
+        try:
+            if shell:
+                sprocess = await asyncio.create_subprocess_shell(cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, env=env, cwd=cwd, start_new_session=is_posix)
+            else:
+                sprocess = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, env=env, cwd=cwd, start_new_session=is_posix)
+        except FileNotFoundError:
+            return ExecResult(cmd, 'CLI_ERROR', -1, b'', b'', 0, 0, cwd)
+
+        limit = math.ceil(lengthout) if lengthout > 0 else None
+        stdout = bytearray()
+        stderr = bytearray()
+        output_length = 0
+        status = 'SUCCESS'
+
+        async def read_pipe(stream, buffer):
+            nonlocal output_length, status
+            while chunk := await stream.read(READ_CHUNK_SIZE):
+                if status != 'SUCCESS':
+                    continue # drain (and discard) until EOF
+                if limit is not None:
+                    chunk = chunk[:limit-output_length]
+                buffer.extend(chunk)
+                output_length += len(chunk)
+                if limit is not None and output_length >= limit:
+                    status = 'LENGTHOUT'
+                    _kill_async_proc(sprocess)
+
+        try:
+            async with asyncio.timeout(timeout):
+                await asyncio.gather(read_pipe(sprocess.stdout, stdout),
+                                     read_pipe(sprocess.stderr, stderr),
+                                     sprocess.wait())
+        except TimeoutError:
+            status = 'TIMEOUT'
+            _kill_async_proc(sprocess)
+            # processes escaping the process group might keep the pipes open
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(sprocess.communicate(), KILL_GRACE)
+        end = time.time()
+        return ExecResult(cmd, status, sprocess.returncode, bytes(stdout), bytes(stderr), end-start, output_length, cwd)
+
+def _advance_steps(steps, value):
+    # StopIteration cannot be raised into a Future
+    try:
+        return False, steps.send(value)
+    except StopIteration as stop:
+        return True, stop.value
+
+def _kill_async_proc(sprocess):
+    # the process might already have been reaped by the event loop (but not its children)
+    with contextlib.suppress(ProcessLookupError):
+        if os.name == 'posix':
+            # started with start_new_session, so its pid is also its process group id
+            os.killpg(sprocess.pid, signal.SIGKILL)
+        else:
+            _kill_proc_with_children(sprocess)
+
+
+magpie.utils.known_software.append(AsyncSoftware)
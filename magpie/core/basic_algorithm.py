@@ -1,3 +1,4 @@
+import concurrent.futures
 import math
 import pathlib
 import random
@@ -9,23 +10,47 @@ import magpie.utils
 from .abstract_algorithm import AbstractAlgorithm
 from .errors import ScenarioError
 from .patch import Patch
+from .persistent_cache import PersistentCache
+from .run_cache import LRURunCache, cache_policies
+from .runresult import RunResult
+from .surrogate import Surrogate
 from .variant import Variant
 
 #This class is not related to the search algorithm itself, more to the general process of automatic software improvement
 #The inheritance
 class BasicAlgorithm(AbstractAlgorithm):
+    # whether "[search.surrogate]" applies (i.e., the algorithm explores new patches)
+    surrogate_screening = False
+
     def __init__(self):
         super().__init__()
         self.config['warmup'] = 3
         self.config['warmup_strategy'] = 'last'
         self.config['cache_maxsize'] = 40
         self.config['cache_keep'] = 0.2
+        self.config['cache_policy'] = 'hits'
+        self.config['cache_pin_reference'] = True
+        self.config['variant_memo_size'] = 10
+        self.config['parallel_workers'] = 1
+        self.config['persistent_cache'] = False
+        self.config['surrogate'] = False
+        self.config['surrogate_min_samples'] = 20
+        self.config['surrogate_threshold'] = 0.1
+        self.config['surrogate_exploration_rate'] = 0.1
 
     def reset(self):
         super().reset()
         self.stats['cache_hits'] = 0
         self.stats['cache_misses'] = 0
+        self.stats['cache_evictions'] = 0
+        self.stats['persistent_cache_hits'] = 0
+        self.stats['surrogate_skipped'] = 0
+        self.stats['surrogate_predictions'] = 0
+        self.stats['surrogate_correct'] = 0
         self.cache_reset()
+        self.persistent_cache = None
+        self.surrogate = None
+        self.surrogate_predictions = {}
 
     #some of it should go in algortihm, some in protocol, some in software
     def setup(self, config):
@@ -37,6 +62,33 @@ class BasicAlgorithm(AbstractAlgorithm):
         self.stop['fitness'] = [float(s) for s in val.split('s')] if (val := sec['target_fitness']) else None
         self.config['cache_maxsize'] = int(val) if (val := sec['cache_maxsize']) else 0
         self.config['cache_keep'] = float(sec['cache_keep'])
+        self.config['cache_policy'] = sec['cache_policy']
+        if self.config['cache_policy'] not in cache_policies:
+            tmp = '/'.join(cache_policies)
+            msg = f'[search] cache_policy should be {tmp}'
+            raise ScenarioError(msg)
+        tmp = sec['cache_pin_reference'].lower()
+        if tmp in ['true', 't', '1']:
+            self.config['cache_pin_reference'] = True
+        elif tmp in ['false', 'f', '0']:
+            self.config['cache_pin_reference'] = False
+        else:
+            msg = '[search] cache_pin_reference should be Boolean'
+            raise ScenarioError(msg)
+        self.config['variant_memo_size'] = int(val) if (val := sec['variant_memo_size']) else 0
+        self.cache_reset()
+        self.config['parallel_workers'] = int(sec['parallel_workers'])
+        if self.config['parallel_workers'] < 1:
+            msg = '[search] parallel_workers should be a positive integer'
+            raise ScenarioError(msg)
+        tmp = sec['persistent_cache'].lower()
+        if tmp in ['true', 't', '1']:
+            self.config['persistent_cache'] = True
+        elif tmp in ['false', 'f', '0']:
+            self.config['persistent_cache'] = False
+        else:
+            msg = '[search] persistent_cache should be Boolean'
+            raise ScenarioError(msg)
 
         self.config['possible_edits'] = []
         try:
@@ -87,6 +139,28 @@ class BasicAlgorithm(AbstractAlgorithm):
         self.config['batch_bins'] = bins
         self.config['batch_sample_size'] = int(sec['batch_sample_size'])
 
+        sec = config['search.surrogate']
+        tmp = sec['enabled'].lower()
+        if tmp in ['true', 't', '1']:
+            self.config['surrogate'] = True
+        elif tmp in ['false', 'f', '0']:
+            self.config['surrogate'] = False
+        else:
+            msg = '[search.surrogate] enabled should be Boolean'
+            raise ScenarioError(msg)
+        self.config['surrogate_min_samples'] = int(sec['min_samples'])
+        self.config['surrogate_threshold'] = float(sec['threshold'])
+        if not 0 <= self.config['surrogate_threshold'] <= 1:
+            msg = '[search.surrogate] threshold should be in [0, 1]'
+            raise ScenarioError(msg)
+        self.config['surrogate_exploration_rate'] = float(sec['exploration_rate'])
+        if not 0 <= self.config['surrogate_exploration_rate'] <= 1:
+            msg = '[search.surrogate] exploration_rate should be in [0, 1]'
+            raise ScenarioError(msg)
+        self.surrogate = None
+        if self.config['surrogate'] and self.surrogate_screening:
+            self.surrogate = Surrogate(self.config['surrogate_min_samples'])
+
     #should go in protocol
     def hook_reset_batch(self):
         # resample instances
@@ -206,11 +280,12 @@ class BasicAlgorithm(AbstractAlgorithm):
         data['diffifbest'] = magpie.settings.log_format_diffif.format(diff=data['diff']) if best else ''
         data['size'] = f'{len(patch.edits) if patch else 0} edit(s)'
         data['cached'] = ''
-        if run.cached:
-            if run.updated:
-                data['cached'] = '[part.cached]'
-            else:
-                data['cached'] = '[cached]'
+        if run.cached and not run.updated:
+            data['cached'] = '[cached]'
+        elif run.artifact_cached:
+            data['cached'] = '[artifact-cached]'
+        elif run.cached:
+            data['cached'] = '[part.cached]'
         return data
 
     def aux_log_print(self, data, run, accept, best):
@@ -243,6 +318,7 @@ class BasicAlgorithm(AbstractAlgorithm):
         if self.report['best_patch']:
             variant = Variant(self.software, self.report['best_patch'])
             self.report['diff'] = variant.diff
+        self.persistent_cache_close()
         msg = '~~~~ END ~~~~'
         if magpie.settings.color_output:
             msg = f'\033[1m{msg}\033[0m'
@@ -283,7 +359,7 @@ class BasicAlgorithm(AbstractAlgorithm):
             msg = 'Unknown warmup strategy'
             raise ValueError(msg)
         run.fitness = current_fitness
-        self.cache_set(variant.diff, run)
+        self.cache_set(variant.digest, run)
         self.hook_warmup_evaluation('REF', patch, run)
         self.report['reference_fitness'] = current_fitness
         if self.report['best_patch'] is None:
@@ -304,47 +380,187 @@ class BasicAlgorithm(AbstractAlgorithm):
     #puts run results data in cache and returns it
     def evaluate_variant(self, variant, force=False):
         cached_run = None
+        if force and hasattr(self.software, 'artifact_reset'):
+            self.software.artifact_reset() # forced evaluations must execute test_cmd/run_cmd
         if self.config['cache_maxsize'] > 0 and not force:
-            cached_run = self.cache_get(variant.diff) # potentially partial
+            cached_run = self.cache_get(variant.digest, variant) # potentially partial
+        if not force and (run := self.surrogate_screen(variant, cached_run)):
+            return run
         run = self.software.evaluate_variant(variant, cached_run)
         if self.config['cache_maxsize'] > 0:
-            self.cache_set(variant.diff, run)
+            self.cache_set(variant.digest, run)
         self.stats['budget'] += getattr(run, 'budget', 0) or 0
+        self.surrogate_learn(variant, run)
         return run
 
-    #Regular cache methods for run results cache
-    #Variant diffs(their differences with the original software) are keys
-    #The values are evaluation pipeline's run results for those variants
-    def cache_get(self, diff):
-        try:
-            run = self.cache[diff]
-        except KeyError:
-            self.stats['cache_misses'] += 1
-            return None
-        else:
-            self.stats['cache_hits'] += 1
+    #same as evaluate_variant, but evaluates several variants at once using "[search] parallel_workers"
+    #run results are returned in the same order as the variants
+    def evaluate_variants(self, variants, force=False):
+        runs = [None for _ in variants]
+        if force and hasattr(self.software, 'artifact_reset'):
+            self.software.artifact_reset()
+        todo = []
+        duplicates = []
+        seen = set()
+        for i, variant in enumerate(variants):
+            if variant.digest in seen:
+                # evaluated once, then (usually) retrieved from cache
+                duplicates.append(i)
+                continue
+            seen.add(variant.digest)
+            cached_run = None
+            if self.config['cache_maxsize'] > 0 and not force:
+                cached_run = self.cache_get(variant.digest, variant) # potentially partial
+            if not force and (run := self.surrogate_screen(variant, cached_run)):
+                runs[i] = run
+                continue
+            todo.append((i, cached_run))
+        tmp = self.software.evaluate_variants([variants[i] for i, _ in todo],
+                                              [cached_run for _, cached_run in todo],
+                                              self.config['parallel_workers'])
+        for (i, _), run in zip(todo, tmp):
             if self.config['cache_maxsize'] > 0:
-                self.cache_hits[diff] += 1
-            run.cached = True
-            run.updated = False
+                self.cache_set(variants[i].digest, run)
+            self.stats['budget'] += getattr(run, 'budget', 0) or 0
+            self.surrogate_learn(variants[i], run)
+            runs[i] = run
+        for i in duplicates:
+            runs[i] = self.evaluate_variant(variants[i], force)
+        return runs
+
+    #asynchronous counterpart of evaluate_variant, returns a concurrent.futures.Future
+    #at most "[search] parallel_workers" variants are evaluated at once, the others wait for a free worker
+    #completed futures must be passed to collect_variant (the cache is only ever accessed by the calling thread)
+    def submit_variant(self, variant):
+        cached_run = None
+        if self.config['cache_maxsize'] > 0:
+            cached_run = self.cache_get(variant.digest, variant) # potentially partial
+        if run := self.surrogate_screen(variant, cached_run):
+            future = concurrent.futures.Future()
+            future.set_result(run)
+            return future
+        return self.software.submit_variant(variant, cached_run, self.config['parallel_workers'])
+
+    def collect_variant(self, variant, future):
+        run = future.result()
+        if run.status == 'SURROGATE_SKIP':
             return run
+        if self.config['cache_maxsize'] > 0:
+            self.cache_set(variant.digest, run)
+        self.stats['budget'] += getattr(run, 'budget', 0) or 0
+        self.surrogate_learn(variant, run)
+        return run
+
+    #"[search.surrogate]": variants predicted to fail are not evaluated (unless explored)
+    #returns a placeholder run result for skipped variants, None otherwise
+    def surrogate_screen(self, variant, cached_run=None):
+        if self.surrogate is None or cached_run is not None or not variant.patch.edits:
+            return None
+        probability = self.surrogate.probability(variant.patch)
+        if probability is None:
+            return None
+        if probability < self.config['surrogate_threshold'] and random.random() >= self.config['surrogate_exploration_rate']:
+            self.stats['surrogate_skipped'] += 1
+            run = RunResult(variant, 'SURROGATE_SKIP')
+            run.log = f'p={round(probability, 2)}'
+            return run
+        self.surrogate_predictions[variant.digest] = probability >= 0.5 # for accuracy only
+        return None
+
+    #learns from actual evaluations only (cached results were already learnt)
+    def surrogate_learn(self, variant, run):
+        if self.surrogate is None or not variant.patch.edits or (run.cached and not run.updated):
+            return
+        success = run.status == 'SUCCESS'
+        if (prediction := self.surrogate_predictions.pop(variant.digest, None)) is not None:
+            self.stats['surrogate_predictions'] += 1
+            self.stats['surrogate_correct'] += prediction == success
+        self.surrogate.learn(variant.patch, success)
 
-    def cache_set(self, diff, run):
-        msize = self.config['cache_maxsize']
-        if 0 < msize < len(self.cache_hits):
-            keep = self.config['cache_keep']
-            hits = sorted(self.cache.keys(), key=lambda k: 999 if len(k) == 0 else self.cache_hits[k])
-            for k in hits[:int(msize*(1-keep))]:
-                del self.cache[k]
-            self.cache_hits = dict.fromkeys(self.cache, 0)
-        if diff not in self.cache:
-            self.cache_hits[diff] = 0
-        self.cache[diff] = run
+    #splits a list of items into chunks of at most "[search] parallel_workers" items
+    #stops early when a stopping condition is met, and never exceeds the step budget
+    def evaluation_chunks(self, items, check_stop=True):
+        items = list(items)
+        while items:
+            if check_stop and self.stopping_condition():
+                return
+            k = self.config['parallel_workers']
+            if check_stop and self.stop['steps'] is not None:
+                k = min(k, max(1, self.stop['steps'] - self.stats['steps']))
+            chunk, items = items[:k], items[k:]
+            yield chunk
+
+    #Builds the variant of a patch, incrementally from the variant of its longest memoised prefix
+    #(e.g., the current patch in local search, or the parent patch in GP)
+    def make_variant(self, patch):
+        edits = tuple(patch.edits)
+        parent = None
+        for k in range(len(edits), 0, -1):
+            if (parent := self.variant_memo.get(edits[:k])) is not None:
+                break
+        if parent is not None and len(parent.patch.edits) == len(edits):
+            return parent
+        variant = Variant(self.software, patch, parent)
+        self.variant_memo.set(edits, variant)
+        return variant
+
+    #Regular cache methods for run results cache
+    #Variant digests(hashes of their contents, see Variant.digest) are keys
+    #The values are evaluation pipeline's run results for those variants
+    #With "[search] persistent_cache", misses fall back to the on-disk cache
+    def cache_get(self, key, variant=None):
+        run = self.cache.get(key)
+        if run is None:
+            run = self.persistent_cache_get(key, variant)
+            if run is None:
+                self.stats['cache_misses'] += 1
+                return None
+            self.stats['persistent_cache_hits'] += 1
+            self.cache_set(key, run)
+        self.stats['cache_hits'] += 1
+        run.cached = True
+        run.updated = False
+        return run
+
+    def cache_set(self, key, run):
+        if self.config['cache_pin_reference'] and self.software.noop_variant and key == self.software.noop_variant.digest:
+            self.cache.pin(key)
+        self.stats['cache_evictions'] += self.cache.set(key, run)
+        if run.updated and self.config['persistent_cache']:
+            self.persistent_cache_set(key, run)
 
     def cache_copy(self, algo):
         self.cache = algo.cache
-        self.cache_hits = algo.cache_hits
+        self.persistent_cache = algo.persistent_cache
 
     def cache_reset(self):
-        self.cache = {}
-        self.cache_hits = {}
+        # "[search] cache_policy" (see magpie.core.run_cache)
+        policy = cache_policies[self.config.get('cache_policy', 'hits')]
+        # the reference entry is pinned on insertion (see cache_set)
+        maxsize = self.config.get('cache_maxsize', 40)
+        if policy is cache_policies['hits']:
+            self.cache = policy(maxsize, keep=self.config.get('cache_keep', 0.2))
+        else:
+            self.cache = policy(maxsize)
+        # memoised variants hold (possibly copied) models, hence a separate bound
+        self.variant_memo = LRURunCache(self.config.get('variant_memo_size', 10))
+
+    def persistent_cache_get(self, key, variant=None):
+        if not self.config['persistent_cache']:
+            return None
+        return self.persistent_cache_open().get(key, variant)
+
+    def persistent_cache_set(self, key, run):
+        self.persistent_cache_open().set(key, run)
+
+    def persistent_cache_open(self):
+        # opened lazily as the fingerprint depends on the software
+        if self.persistent_cache is None:
+            path = pathlib.Path(magpie.settings.cache_dir) / 'evaluations.sqlite'
+            self.persistent_cache = PersistentCache(path, self.software.fingerprint().hexdigest())
+        return self.persistent_cache
+
+    def persistent_cache_close(self):
+        # checkpoints the database at the end of the search (reopened on demand)
+        if self.persistent_cache is not None:
+            self.persistent_cache.close()
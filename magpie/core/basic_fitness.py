@@ -2,6 +2,13 @@ from .abstract_fitness import AbstractFitness
 
 
 class BasicFitness(AbstractFitness):
+    def artifact_compatible(self):
+        # setup_cmd and compile_cmd results would be copied over from another variant
+        klass = self.__class__
+        return (super().artifact_compatible()
+                and klass.process_setup_exec is BasicFitness.process_setup_exec
+                and klass.process_compile_exec is BasicFitness.process_compile_exec)
+
     def process_init_exec(self, run_result, exec_result):
         # "[software] init_cmd" must yield nonzero return code
         if exec_result.return_code != 0:
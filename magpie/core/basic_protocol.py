@@ -48,6 +48,13 @@ class BasicProtocol:
             msg = f'\033[1m{msg}\033[0m'
         logger.info(msg)
         logger.info('Termination: %s', result['stop'])
+        if 'cache_hits' in self.search.stats:
+            stats = self.search.stats
+            logger.info('Cache: %d hits (%d persistent), %d misses, %d evictions', stats['cache_hits'], stats['persistent_cache_hits'], stats['cache_misses'], stats['cache_evictions'])
+        if getattr(self.search, 'surrogate', None):
+            stats = self.search.stats
+            accuracy = stats['surrogate_correct'] / stats['surrogate_predictions'] if stats['surrogate_predictions'] else 0
+            logger.info('Surrogate: %d evaluations saved, %.1f%% accuracy (%d predictions)', stats['surrogate_skipped'], 100*accuracy, stats['surrogate_predictions'])
         for handler in logger.handlers:
             if handler.__class__.__name__ == 'FileHandler':
                 logger.info('Log file: %s', handler.baseFilename)
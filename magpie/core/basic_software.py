@@ -1,4 +1,6 @@
+import concurrent.futures
 import contextlib
+import hashlib
 import pathlib
 import shlex
 
@@ -7,6 +9,7 @@ import magpie.settings
 from .abstract_software import AbstractSoftware
 from .command import Command
 from .errors import ScenarioError
+from .run_cache import cache_policies
 from .runresult import RunResult
 
 
@@ -129,6 +132,30 @@ class BasicSoftware(AbstractSoftware):
                 self.batch_lengthout = None
             else:
                 self.batch_lengthout = int(config['software']['batch_lengthout'])
+        self.run_parallelism = 1
+        if 'run_parallelism' in config['software']:
+            self.run_parallelism = int(config['software']['run_parallelism'])
+            if self.run_parallelism < 1:
+                msg = 'Invalid config file: "[software] run_parallelism" should be a positive integer'
+                raise ScenarioError(msg)
+        self.artifacts = []
+        if 'artifacts' in config['software']:
+            self.artifacts = config['software']['artifacts'].split()
+        if self.artifacts:
+            for fit in self.fitness:
+                if not fit.artifact_compatible():
+                    msg = f'Invalid config file: "[software] artifacts" cannot be used with {fit.__class__.__name__} (fitness values do not only depend on test_cmd and run_cmd)'
+                    raise ScenarioError(msg)
+        self.artifact_reset()
+        if 'model_cache' in config['software']:
+            tmp = str(config['software']['model_cache']).lower()
+            if tmp in ['true', 't', '1']:
+                self.model_cache = True
+            elif tmp in ['false', 'f', '0']:
+                self.model_cache = False
+            else:
+                msg = 'Invalid config file: "[software] model_cache" should be Boolean'
+                raise ScenarioError(msg)
 
         # reset everything
         self.reset_timestamp()
@@ -156,7 +183,10 @@ class BasicSoftware(AbstractSoftware):
             else:
                 command.lengthout = int(config['software'][lengthout])
 
-    def setup_and_execute(self, command, variant):
+    def setup_and_execute(self, command, variant, cwd=None):
+        return self.exec_cmd(**self.prepare_cmd(command, variant, cwd))
+
+    def prepare_cmd(self, command, variant, cwd=None):
         cli = self.compute_local_cli(variant, command.name)
         cmd = command.cmd.strip()
         if '{PARAMS}' in command.cmd:
@@ -165,10 +195,26 @@ class BasicSoftware(AbstractSoftware):
             cmd = f'{cmd} {cli}'
         timeout = command.timeout or magpie.settings.default_timeout
         lengthout = command.lengthout or magpie.settings.default_lengthout
-        exec_result = self.exec_cmd(shlex.split(cmd),
-                                    timeout=timeout,
-                                    lengthout=lengthout)
-        return exec_result
+        return {'cmd': shlex.split(cmd), 'timeout': timeout, 'lengthout': lengthout, 'cwd': cwd}
+
+    def prepare_run_cmd(self, inst, cli, timeout, lengthout, cwd=None):
+        run_cmd = self.run.cmd.strip()
+        if '{INST}' in self.run.cmd:
+            run_cmd = run_cmd.replace('{INST}', inst)
+        else:
+            run_cmd = f'{run_cmd} {inst}'
+        if '{PARAMS}' in self.run.cmd:
+            run_cmd = run_cmd.replace('{PARAMS}', cli)
+        else:
+            run_cmd = f'{run_cmd} {cli}'
+        return {'cmd': shlex.split(run_cmd), 'timeout': timeout, 'lengthout': lengthout, 'cwd': cwd}
+
+    def exec_requests(self, request):
+        # a list of requests (instances of a same wave) is executed concurrently
+        if isinstance(request, list):
+            with concurrent.futures.ThreadPoolExecutor(len(request)) as executor:
+                return list(executor.map(lambda r: self.exec_cmd(**r), request))
+        return self.exec_cmd(**request)
 
     def reset_contents(self):
         if not self.init.performed:
@@ -192,11 +238,31 @@ class BasicSoftware(AbstractSoftware):
                         raise RuntimeError(msg)
         super().reset_contents()
 
-    def evaluate_variant(self, variant, cached_run=None):
+    def evaluate_variants(self, variants, cached_runs=None, workers=1):
+        # one-time setup must happen before fanning out to other workers
+        if not self.setup.performed and variants:
+            cached_runs = cached_runs or [None for _ in variants]
+            first = self.evaluate_variant(variants[0], cached_runs[0])
+            return [first, *super().evaluate_variants(variants[1:], cached_runs[1:], workers)]
+        return super().evaluate_variants(variants, cached_runs, workers)
+
+    def evaluate_variant(self, variant, cached_run=None, worker=0):
+        steps = self.evaluation_steps(variant, cached_run, worker)
+        try:
+            request = next(steps)
+            while True:
+                request = steps.send(self.exec_requests(request))
+        except StopIteration as stop:
+            return stop.value
+
+    def evaluation_steps(self, variant, cached_run=None, worker=0):
+        # generator yielding exec_cmd arguments and receiving the corresponding ExecResult
+        # (or a list of exec_cmd arguments, receiving the list of corresponding ExecResults)
+        # the final RunResult is returned (as StopIteration value)
         # check batch sync
         if cached_run is None:
             # new variant
-            self.write_variant(variant)
+            self.write_variant(variant, worker)
         elif not cached_run.cache.keys():
             # cached (failed) --> early exit
             return cached_run
@@ -206,98 +272,102 @@ class BasicSoftware(AbstractSoftware):
             return cached_run
         else:
             # partially cached
-            self.write_variant(variant)
+            self.write_variant(variant, worker)
 
         # evaluate
-        work_path = self.work_dir / self.basename
+        work_path = self.work_path(worker)
         run_result = cached_run or RunResult(variant, 'UNKNOWN_ERROR')
         run_result.updated = True
+        run_result.artifact_cached = False
 
-        with contextlib.chdir(work_path):
-            # serves as base before run_cmd
-            default_variant_fitness = [None for _ in self.fitness]
+        # serves as base before run_cmd
+        default_variant_fitness = [None for _ in self.fitness]
 
-            # one-time setup
-            if not self.setup.performed:
-                self.setup.performed = True
+        # one-time setup
+        if not self.setup.performed:
+            self.setup.performed = True
 
-                # make sure this is the unmodified software
-                for filename in self.target_files:
-                    model = variant.models[filename]
-                    if model.dump() != model.cached_dump:
-                        raise AssertionError
+            # make sure this is the unmodified software
+            for filename in self.target_files:
+                model = variant.models[filename]
+                if model.dump() != model.cached_dump:
+                    raise AssertionError
 
-                # run "[software] setup_cmd" if provided
-                if self.setup.cmd:
-                    run_result.last_exec = self.setup_and_execute(self.setup, variant)
-                    run_result.status = run_result.last_exec.status
-                    if run_result.status == 'SUCCESS':
-                        for fit in self.fitness:
-                            fit.process_setup_exec(run_result, run_result.last_exec)
-                    if run_result.status != 'SUCCESS':
-                        run_result.status = f'SETUP_{run_result.status}'
-                        run_result.fitness = None
-                        return run_result
-
-                # sync work directory
-                self.sync_folder(self.path, work_path)
-
-            # run "[software] compile_cmd" if provided
-            if self.compile.cmd:
-                run_result.last_exec = self.setup_and_execute(self.compile, variant)
+            # run "[software] setup_cmd" if provided
+            if self.setup.cmd:
+                run_result.last_exec = yield self.prepare_cmd(self.setup, variant, work_path)
                 run_result.status = run_result.last_exec.status
                 if run_result.status == 'SUCCESS':
-                    for i, fit in enumerate(self.fitness):
-                        run_result.fitness = None
-                        fit.process_compile_exec(run_result, run_result.last_exec)
-                        if run_result.fitness is not None:
-                            default_variant_fitness[i] = run_result.fitness
+                    for fit in self.fitness:
+                        fit.process_setup_exec(run_result, run_result.last_exec)
                 if run_result.status != 'SUCCESS':
-                    run_result.status = f'COMPILE_{run_result.status}'
+                    run_result.status = f'SETUP_{run_result.status}'
                     run_result.fitness = None
                     return run_result
 
-            # run "[software] test_cmd" if provided
-            if self.test.cmd:
-                run_result.last_exec = self.setup_and_execute(self.test, variant)
-                run_result.status = run_result.last_exec.status
-                if run_result.status == 'SUCCESS':
-                    for i, fit in enumerate(self.fitness):
-                        run_result.fitness = None
-                        fit.process_test_exec(run_result, run_result.last_exec)
-                        if run_result.fitness is not None:
-                            default_variant_fitness[i] = run_result.fitness
-                if run_result.status == 'SUCCESS':
-                    run_result.fitness = default_variant_fitness
-                else:
-                    run_result.status = f'TEST_{run_result.status}'
-                    run_result.fitness = None
-                    return run_result
+            # sync work directory
+            self.sync_folder(self.path, work_path)
+            self.manifests.clear() # the original software might have changed
 
-            # run "[software] run_cmd" if provided
-            if self.run.cmd:
-                cli = self.compute_local_cli(variant, 'run')
-                timeout = self.run.timeout or magpie.settings.default_timeout
-                lengthout = self.run.lengthout or magpie.settings.default_lengthout
-                batch_timeout = self.batch_timeout
-                batch_lengthout = self.batch_lengthout
-                insts = [inst for b in self.batch for inst in b]
-                for inst in insts:
+        # run "[software] compile_cmd" if provided
+        if self.compile.cmd:
+            run_result.last_exec = yield self.prepare_cmd(self.compile, variant, work_path)
+            run_result.status = run_result.last_exec.status
+            if run_result.status == 'SUCCESS':
+                for i, fit in enumerate(self.fitness):
+                    run_result.fitness = None
+                    fit.process_compile_exec(run_result, run_result.last_exec)
+                    if run_result.fitness is not None:
+                        default_variant_fitness[i] = run_result.fitness
+            if run_result.status != 'SUCCESS':
+                run_result.status = f'COMPILE_{run_result.status}'
+                run_result.fitness = None
+                return run_result
+
+        # reuse test/run results of previous variants with identical "[software] artifacts"
+        artifact_key = None
+        if self.artifacts:
+            artifact_key = self.artifact_digest(work_path)
+            artifact_run = self.artifact_runs.get(artifact_key)
+            if artifact_run is not None and self.artifact_reuse(run_result, artifact_run):
+                return run_result
+
+        # run "[software] test_cmd" if provided
+        if self.test.cmd:
+            run_result.last_exec = yield self.prepare_cmd(self.test, variant, work_path)
+            run_result.status = run_result.last_exec.status
+            if run_result.status == 'SUCCESS':
+                for i, fit in enumerate(self.fitness):
+                    run_result.fitness = None
+                    fit.process_test_exec(run_result, run_result.last_exec)
+                    if run_result.fitness is not None:
+                        default_variant_fitness[i] = run_result.fitness
+            if run_result.status == 'SUCCESS':
+                run_result.fitness = default_variant_fitness
+            else:
+                run_result.status = f'TEST_{run_result.status}'
+                run_result.fitness = None
+                self.artifact_store(artifact_key, run_result)
+                return run_result
+
+        # run "[software] run_cmd" if provided
+        if self.run.cmd:
+            cli = self.compute_local_cli(variant, 'run')
+            timeout = self.run.timeout or magpie.settings.default_timeout
+            lengthout = self.run.lengthout or magpie.settings.default_lengthout
+            batch_timeout = self.batch_timeout
+            batch_lengthout = self.batch_lengthout
+            insts = list(dict.fromkeys(inst for b in self.batch for inst in b if inst not in run_result.cache))
+            for k in range(0, len(insts), self.run_parallelism):
+                # instances of a wave run concurrently but are processed in order
+                wave = insts[k:k+self.run_parallelism]
+                requests = [self.prepare_run_cmd(inst, cli, timeout, lengthout, work_path) for inst in wave]
+                if len(requests) == 1:
+                    exec_results = [(yield requests[0])]
+                else:
+                    exec_results = yield requests
+                for inst, exec_result in zip(wave, exec_results):
                     variant_fitness = default_variant_fitness[:]
-                    if inst in run_result.cache:
-                        continue
-                    run_cmd = self.run.cmd.strip()
-                    if '{INST}' in self.run.cmd:
-                        run_cmd = run_cmd.replace('{INST}', inst)
-                    else:
-                        run_cmd = f'{run_cmd} {inst}'
-                    if '{PARAMS}' in self.run.cmd:
-                        run_cmd = run_cmd.replace('{PARAMS}', cli)
-                    else:
-                        run_cmd = f'{run_cmd} {cli}'
-                    exec_result = self.exec_cmd(shlex.split(run_cmd),
-                                                timeout=timeout,
-                                                lengthout=lengthout)
                     run_result.status = exec_result.status
                     run_result.last_exec = exec_result
                     if run_result.status == 'SUCCESS':
@@ -320,11 +390,87 @@ class BasicSoftware(AbstractSoftware):
                         if batch_lengthout < 0:
                             run_result.status = 'BATCH_LENGTHOUT'
                             break
-                self.process_batch_final(run_result)
+                else:
+                    continue
+                # discard the remaining results of the wave
+                break
+            self.process_batch_final(run_result)
 
         # final process
+        self.artifact_store(artifact_key, run_result)
         return run_result
 
+    def artifact_reset(self):
+        # artifacts digest -> RunResult (test/run outcome only)
+        # bounded like the run results cache ("[search] cache_maxsize" and "[search] cache_policy")
+        sec = self.config['search']
+        maxsize = int(val) if (val := sec['cache_maxsize']) else 0
+        try:
+            policy = cache_policies[sec['cache_policy']]
+        except KeyError:
+            tmp = '/'.join(cache_policies)
+            msg = f'[search] cache_policy should be {tmp}'
+            raise ScenarioError(msg) from None
+        if policy is cache_policies['hits']:
+            self.artifact_runs = policy(maxsize, keep=float(sec['cache_keep']))
+        else:
+            self.artifact_runs = policy(maxsize)
+
+    def artifact_digest(self, work_path):
+        # hash of "[software] artifacts" (files or folders, relatively to the work directory)
+        h = hashlib.blake2b(digest_size=16)
+        for artifact in self.artifacts:
+            path = pathlib.Path(work_path) / artifact
+            files = sorted(p for p in path.rglob('*') if p.is_file()) if path.is_dir() else [path]
+            for p in files:
+                h.update(f'{p.relative_to(work_path)}\n'.encode())
+                try:
+                    with p.open('rb') as f:
+                        h.update(hashlib.file_digest(f, 'blake2b').digest())
+                except FileNotFoundError:
+                    h.update(b'missing\n')
+        return h.hexdigest()
+
+    def artifact_store(self, key, run_result):
+        if key is None:
+            return
+        run = RunResult(None, run_result.status)
+        run.fitness = run_result.fitness
+        run.cache = dict(run_result.cache)
+        self.artifact_runs.set(key, run)
+
+    def artifact_reuse(self, run_result, artifact_run):
+        # returns whether the previous results fully determine the outcome on the current batch
+        if not artifact_run.cache:
+            # failed test_cmd (or no run_cmd)
+            run_result.status = artifact_run.status
+            run_result.fitness = artifact_run.fitness
+            run_result.artifact_cached = True
+            return True
+        status = 'SUCCESS'
+        insts = list(dict.fromkeys(inst for b in self.batch for inst in b))
+        for inst in insts:
+            if inst not in artifact_run.cache:
+                return False
+            if artifact_run.cache[inst][0] != 'SUCCESS':
+                status = f'RUN_{artifact_run.cache[inst][0]}'
+                break
+        for inst in insts:
+            if inst in artifact_run.cache:
+                run_result.cache[inst] = artifact_run.cache[inst]
+        run_result.status = status
+        run_result.artifact_cached = True
+        self.process_batch_final(run_result)
+        return True
+
+    def fingerprint(self):
+        # the evaluation pipeline (commands, fitness, batch strategies, ...) also matters
+        fingerprint = super().fingerprint()
+        for key, val in sorted(self.config['software'].items()):
+            fingerprint.update(f'{key}={val}\n'.encode())
+        fingerprint.update(f'{magpie.settings.default_timeout} {magpie.settings.default_lengthout}'.encode())
+        return fingerprint
+
     def compute_local_cli(self, variant, step):
         cli = ''
         for target in self.target_files:
@@ -342,6 +488,10 @@ class BasicSoftware(AbstractSoftware):
         for b in self.batch:
             bin_fitness = []
             for inst in b:
+                if inst not in run_result.cache:
+                    # interrupted batch (e.g., BATCH_TIMEOUT)
+                    run_result.fitness = None
+                    return
                 status, fitness = run_result.cache[inst]
                 if status != 'SUCCESS':
                     # TODO: penalised fitness
@@ -426,7 +576,7 @@ class BasicSoftware(AbstractSoftware):
         self.self_diagnostic(run)
         self.logger.info('!*'*40)
         if run.last_exec is not None:
-            self.logger.info('CWD: %s', pathlib.Path(self.work_dir) / self.basename)
+            self.logger.info('CWD: %s', run.last_exec.cwd or self.work_path())
             self.logger.info('CMD: %s', run.last_exec.cmd)
             self.logger.info('STATUS: %s', run.last_exec.status)
             self.logger.info('RETURN_CODE: %s', run.last_exec.return_code)
@@ -2,7 +2,7 @@ import types
 
 
 class ExecResult(types.SimpleNamespace):
-    def __init__(self, cmd, status, return_code, stdout, stderr, runtime, output_length):
+    def __init__(self, cmd, status, return_code, stdout, stderr, runtime, output_length, cwd=None):
         self.cmd = cmd
         self.status = status
         self.return_code = return_code
@@ -10,3 +10,4 @@ class ExecResult(types.SimpleNamespace):
         self.stderr = stderr
         self.runtime = runtime
         self.output_length = output_length
+        self.cwd = cwd
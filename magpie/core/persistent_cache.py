@@ -0,0 +1,65 @@
+import json
+import pathlib
+import sqlite3
+import threading
+
+from .runresult import RunResult
+
+
+class PersistentCache:
+    """On-disk evaluation cache shared across runs (and processes).
+
+    Entries are keyed by a fingerprint of the software and of its evaluation pipeline (see
+    AbstractSoftware.fingerprint) and by the variant digest (see Variant.digest). For every variant both the
+    overall status/fitness and the per-instance status/fitness (i.e., RunResult.cache) are stored.
+    """
+
+    def __init__(self, path, fingerprint):
+        self.path = pathlib.Path(path)
+        self.fingerprint = fingerprint
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = None
+        self.lock = threading.Lock()
+        with self.lock:
+            self.connect()
+
+    def connect(self):
+        # (re)opens the database, e.g., after close (the lock must be held)
+        if self.connection is None:
+            # several Magpie processes may use the same file concurrently
+            self.connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            with self.connection:
+                self.connection.execute('PRAGMA journal_mode=WAL')
+                self.connection.execute('PRAGMA synchronous=NORMAL')
+                self.connection.execute('CREATE TABLE IF NOT EXISTS variants (fingerprint TEXT, digest TEXT, status TEXT, fitness TEXT, PRIMARY KEY (fingerprint, digest))')
+                self.connection.execute('CREATE TABLE IF NOT EXISTS instances (fingerprint TEXT, digest TEXT, instance TEXT, status TEXT, fitness TEXT, PRIMARY KEY (fingerprint, digest, instance))')
+        return self.connection
+
+    def get(self, digest, variant=None):
+        with self.lock:
+            self.connect()
+            row = self.connection.execute('SELECT status, fitness FROM variants WHERE fingerprint = ? AND digest = ?',
+                                          (self.fingerprint, digest)).fetchone()
+            if row is None:
+                return None
+            rows = self.connection.execute('SELECT instance, status, fitness FROM instances WHERE fingerprint = ? AND digest = ?',
+                                           (self.fingerprint, digest)).fetchall()
+        run = RunResult(variant, row[0])
+        run.fitness = json.loads(row[1])
+        for inst, status, fitness in rows:
+            run.cache[inst] = (status, json.loads(fitness))
+        return run
+
+    def set(self, digest, run):
+        with self.lock, self.connect():
+            self.connection.execute('INSERT OR REPLACE INTO variants VALUES (?, ?, ?, ?)',
+                                    (self.fingerprint, digest, run.status, json.dumps(run.fitness)))
+            self.connection.executemany('INSERT OR REPLACE INTO instances VALUES (?, ?, ?, ?, ?)',
+                                        [(self.fingerprint, digest, inst, status, json.dumps(fitness)) for inst, (status, fitness) in run.cache.items()])
+
+    def close(self):
+        # the last connection to close checkpoints the WAL and removes the -wal and -shm files
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
@@ -0,0 +1,181 @@
+import ast
+import collections
+import json
+import pathlib
+import pstats
+import re
+
+from .errors import ScenarioError
+
+# Profile readers return {source file: {line number: weight}}
+# (file names are as recorded by the tool, see match_file)
+
+
+def read_gcov(path):
+    # gcov text output ("gcov foo.c" produces "foo.c.gcov")
+    counts = {}
+    source = path.name.removesuffix('.gcov')
+    with path.open('r') as profile_file:
+        for line in profile_file:
+            parts = line.split(':', 2)
+            if len(parts) < 3:
+                continue
+            count, lineno, text = parts[0].strip().rstrip('*'), parts[1].strip(), parts[2]
+            if not lineno.isdigit():
+                continue
+            if int(lineno) == 0:
+                if text.startswith('Source:'):
+                    source = text[7:].strip()
+                continue
+            if count in ['-', '']:
+                continue # not executable
+            counts.setdefault(source, {})[int(lineno)] = 0 if count in ['#####', '====='] else _human_number(count)
+    return counts
+
+def read_lcov(path):
+    # lcov/geninfo tracefile ("SF:" and "DA:" records)
+    counts = {}
+    source = None
+    with path.open('r') as profile_file:
+        for line in profile_file:
+            line = line.strip()
+            if line.startswith('SF:'):
+                source = line[3:]
+                counts.setdefault(source, {})
+            elif line.startswith('DA:') and source is not None:
+                lineno, count, *_ = line[3:].split(',')
+                counts[source][int(lineno)] = counts[source].get(int(lineno), 0) + int(count)
+            elif line == 'end_of_record':
+                source = None
+    return counts
+
+def read_perf(path):
+    # "perf report --stdio --sort srcline" (percentages of samples, possibly with other sort keys)
+    counts = collections.defaultdict(dict)
+    regex = re.compile(r'^\s*([\d.]+)%\s.*?(\S+):(\d+)\s*$')
+    with path.open('r') as profile_file:
+        for line in profile_file:
+            if line.startswith('#') or not (m := regex.match(line)):
+                continue
+            lines = counts[m.group(2)]
+            lines[int(m.group(3))] = lines.get(int(m.group(3)), 0) + float(m.group(1))
+    return dict(counts)
+
+def read_cprofile(path):
+    # "python -m cProfile -o FILE": the internal time of every function is spread over its lines
+    functions = collections.defaultdict(list)
+    for (source, lineno, _), (_, _, tottime, _, _) in pstats.Stats(str(path)).stats.items():
+        if source.startswith(('<', '~')):
+            continue # built-in functions
+        functions[source].append((lineno, tottime))
+    counts = {}
+    for source, items in functions.items():
+        counts[source] = lines = {}
+        spans = _function_spans(source)
+        # innermost functions last
+        for lineno, tottime in sorted(items, key=lambda item: -len(spans.get(item[0], ()))):
+            for i in spans.get(lineno, [lineno]):
+                lines[i] = tottime
+    return counts
+
+def read_trace(path):
+    # "python -m trace --count --coverdir DIR": "DIR/pkg.mod.cover" annotates "pkg/mod.py"
+    source = path.stem.replace('.', '/') + '.py'
+    lines = {}
+    with path.open('r') as profile_file:
+        for lineno, line in enumerate(profile_file, start=1):
+            prefix = line[:7]
+            if prefix.startswith('>>>>>>'):
+                lines[lineno] = 0
+            elif (tmp := prefix.strip().rstrip(':')).isdigit():
+                lines[lineno] = int(tmp)
+    return {source: lines}
+
+def read_coverage(path):
+    # "coverage json" (coverage.py only records whether lines were executed)
+    with path.open('r') as profile_file:
+        data = json.load(profile_file)
+    counts = {}
+    for source, info in data.get('files', {}).items():
+        counts[source] = lines = {}
+        for lineno in info.get('missing_lines', []):
+            lines[lineno] = 0
+        for lineno in info.get('executed_lines', []):
+            lines[lineno] = 1
+    return counts
+
+profile_formats = {
+    'gcov': read_gcov,
+    'lcov': read_lcov,
+    'perf': read_perf,
+    'cprofile': read_cprofile,
+    'trace': read_trace,
+    'coverage': read_coverage,
+}
+
+profile_suffixes = {
+    '.gcov': 'gcov',
+    '.info': 'lcov',
+    '.perf': 'perf',
+    '.prof': 'cprofile',
+    '.pstats': 'cprofile',
+    '.cover': 'trace',
+    '.json': 'coverage',
+}
+
+def profile_format(path, fmt='auto'):
+    if fmt == 'auto':
+        try:
+            return profile_suffixes[pathlib.Path(path).suffix]
+        except KeyError:
+            msg = f'Unknown profile format for "{path}" (see profile_format)'
+            raise ScenarioError(msg) from None
+    if fmt not in profile_formats:
+        tmp = '/'.join(['auto', *profile_formats])
+        msg = f'Invalid profile format "{fmt}" (should be {tmp})'
+        raise ScenarioError(msg)
+    return fmt
+
+def read_profile(path, fmt='auto'):
+    path = pathlib.Path(path)
+    return profile_formats[profile_format(path, fmt)](path)
+
+def match_file(profile, filename):
+    # line weights of filename, whose recorded path may be absolute or relative to another directory
+    # (the longest common suffix of path components wins, and weights of equally matching files add up)
+    parts = pathlib.PurePath(filename).parts
+    best, matches = 0, []
+    for source, lines in profile.items():
+        tmp = pathlib.PurePath(source).parts
+        k = 0
+        while k < min(len(parts), len(tmp)) and parts[-k-1] == tmp[-k-1]:
+            k += 1
+        if k > best:
+            best, matches = k, [lines]
+        elif k == best and k > 0:
+            matches.append(lines)
+    out = {}
+    for lines in matches:
+        for lineno, weight in lines.items():
+            out[lineno] = out.get(lineno, 0) + weight
+    return out
+
+def _function_spans(source):
+    # function first line (including decorators, as in code objects) -> lines of the function
+    try:
+        root = ast.parse(pathlib.Path(source).read_text())
+    except (OSError, SyntaxError, ValueError):
+        return {}
+    spans = {}
+    for node in ast.walk(root):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            start = min([node.lineno, *(d.lineno for d in node.decorator_list)])
+            spans[start] = range(start, node.end_lineno+1)
+    return spans
+
+def _human_number(count):
+    # gcov --human-readable (e.g., "1.2k")
+    units = {'k': 1e3, 'M': 1e6, 'G': 1e9, 'T': 1e12}
+    if count[-1] in units:
+        return float(count[:-1]) * units[count[-1]]
+    return int(count)
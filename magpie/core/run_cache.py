@@ -0,0 +1,290 @@
+import abc
+import collections
+
+
+class AbstractRunCache(abc.ABC):
+    """Bounded run result cache (keys are variant digests).
+
+    Pinned keys (e.g., the reference variant) are never evicted and do not count towards
+    `maxsize`. Subclasses implement the eviction policy using _get/_set/_discard/_len.
+    """
+
+    def __init__(self, maxsize, pinned=()):
+        self.maxsize = maxsize
+        self.pinned_keys = set(pinned)
+        self.pinned = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        if key in self.pinned:
+            value = self.pinned[key]
+        else:
+            value = self._get(key)
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        # returns the number of evicted entries
+        if key in self.pinned_keys:
+            self.pinned[key] = value
+            return 0
+        if self.maxsize <= 0:
+            return 0 # disabled cache
+        before = self.evictions
+        self._set(key, value)
+        return self.evictions - before
+
+    def pin(self, key):
+        if key not in self.pinned_keys:
+            self.pinned_keys.add(key)
+            value = self._discard(key)
+            if value is not None:
+                self.pinned[key] = value
+
+    def __contains__(self, key):
+        return key in self.pinned or self._contains(key)
+
+    def __len__(self):
+        return len(self.pinned) + self._len()
+
+    @abc.abstractmethod
+    def _get(self, key):
+        pass
+
+    @abc.abstractmethod
+    def _set(self, key, value):
+        pass
+
+    @abc.abstractmethod
+    def _discard(self, key):
+        # removes an entry (without counting an eviction) and returns its value, if any
+        pass
+
+    @abc.abstractmethod
+    def _contains(self, key):
+        pass
+
+    @abc.abstractmethod
+    def _len(self):
+        pass
+
+
+class LRURunCache(AbstractRunCache):
+    """Evicts the least recently used entry."""
+
+    def __init__(self, maxsize, pinned=()):
+        super().__init__(maxsize, pinned)
+        self.data = collections.OrderedDict()
+
+    def _get(self, key):
+        try:
+            self.data.move_to_end(key)
+        except KeyError:
+            return None
+        return self.data[key]
+
+    def _set(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+    def _discard(self, key):
+        return self.data.pop(key, None)
+
+    def _contains(self, key):
+        return key in self.data
+
+    def _len(self):
+        return len(self.data)
+
+
+class LFURunCache(AbstractRunCache):
+    """Evicts the least frequently used entry (least recently used among them)."""
+
+    def __init__(self, maxsize, pinned=()):
+        super().__init__(maxsize, pinned)
+        self.data = {} # key -> [value, frequency]
+        self.buckets = collections.defaultdict(collections.OrderedDict) # frequency -> keys
+        self.min_frequency = 0
+
+    def _get(self, key):
+        try:
+            entry = self.data[key]
+        except KeyError:
+            return None
+        frequency = entry[1]
+        bucket = self.buckets[frequency]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[frequency]
+            if self.min_frequency == frequency:
+                self.min_frequency = frequency + 1
+        entry[1] = frequency + 1
+        self.buckets[frequency + 1][key] = None
+        return entry[0]
+
+    def _set(self, key, value):
+        if key in self.data:
+            self.data[key][0] = value
+            return
+        if len(self.data) >= self.maxsize:
+            bucket = self.buckets[self.min_frequency]
+            evicted, _ = bucket.popitem(last=False)
+            if not bucket:
+                del self.buckets[self.min_frequency]
+            del self.data[evicted]
+            self.evictions += 1
+        self.data[key] = [value, 0]
+        self.buckets[0][key] = None
+        self.min_frequency = 0
+
+    def _discard(self, key):
+        try:
+            value, frequency = self.data.pop(key)
+        except KeyError:
+            return None
+        bucket = self.buckets[frequency]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[frequency]
+            if self.min_frequency == frequency:
+                self.min_frequency = min(self.buckets, default=0)
+        return value
+
+    def _contains(self, key):
+        return key in self.data
+
+    def _len(self):
+        return len(self.data)
+
+
+class ARCRunCache(AbstractRunCache):
+    """Adaptive Replacement Cache (Megiddo and Modha, 2003).
+
+    Balances recency (t1) and frequency (t2) using ghost lists of recently evicted keys (b1, b2).
+    """
+
+    def __init__(self, maxsize, pinned=()):
+        super().__init__(maxsize, pinned)
+        self.t1 = collections.OrderedDict()
+        self.t2 = collections.OrderedDict()
+        self.b1 = collections.OrderedDict()
+        self.b2 = collections.OrderedDict()
+        self.p = 0
+
+    def _get(self, key):
+        if key in self.t1:
+            value = self.t1.pop(key)
+            self.t2[key] = value
+            return value
+        if key in self.t2:
+            self.t2.move_to_end(key)
+            return self.t2[key]
+        return None
+
+    def _set(self, key, value):
+        c = self.maxsize
+        if key in self.t1 or key in self.t2:
+            (self.t1 if key in self.t1 else self.t2)[key] = value
+            return
+        if key in self.b1:
+            self.p = min(c, self.p + max(len(self.b2) // len(self.b1), 1))
+            self._replace(key)
+            del self.b1[key]
+            self.t2[key] = value
+            return
+        if key in self.b2:
+            self.p = max(0, self.p - max(len(self.b1) // len(self.b2), 1))
+            self._replace(key)
+            del self.b2[key]
+            self.t2[key] = value
+            return
+        l1 = len(self.t1) + len(self.b1)
+        if l1 >= c:
+            if len(self.t1) < c:
+                self.b1.popitem(last=False)
+                self._replace(key)
+            else:
+                self.t1.popitem(last=False)
+                self.evictions += 1
+        elif l1 + len(self.t2) + len(self.b2) >= c:
+            if l1 + len(self.t2) + len(self.b2) >= 2*c:
+                self.b2.popitem(last=False)
+            self._replace(key)
+        self.t1[key] = value
+
+    def _replace(self, key):
+        if not self.t1 and not self.t2:
+            return
+        if self.t1 and (len(self.t1) > self.p or (key in self.b2 and len(self.t1) == self.p)):
+            evicted, _ = self.t1.popitem(last=False)
+            self.b1[evicted] = None
+        else:
+            evicted, _ = self.t2.popitem(last=False)
+            self.b2[evicted] = None
+        self.evictions += 1
+
+    def _discard(self, key):
+        if key in self.t1:
+            return self.t1.pop(key)
+        return self.t2.pop(key, None)
+
+    def _contains(self, key):
+        return key in self.t1 or key in self.t2
+
+    def _len(self):
+        return len(self.t1) + len(self.t2)
+
+
+class HitsRunCache(AbstractRunCache):
+    """Historical policy: when full, only keeps the `keep` most hit entries and resets hit counts."""
+
+    def __init__(self, maxsize, pinned=(), keep=0.2):
+        super().__init__(maxsize, pinned)
+        self.keep = keep
+        self.data = {}
+        self.data_hits = {}
+
+    def _get(self, key):
+        try:
+            value = self.data[key]
+        except KeyError:
+            return None
+        self.data_hits[key] += 1
+        return value
+
+    def _set(self, key, value):
+        if self.maxsize < len(self.data):
+            hits = sorted(self.data, key=lambda k: self.data_hits[k])
+            for k in hits[:int(self.maxsize*(1-self.keep))]:
+                del self.data[k]
+                self.evictions += 1
+            self.data_hits = dict.fromkeys(self.data, 0)
+        if key not in self.data:
+            self.data_hits[key] = 0
+        self.data[key] = value
+
+    def _discard(self, key):
+        self.data_hits.pop(key, None)
+        return self.data.pop(key, None)
+
+    def _contains(self, key):
+        return key in self.data
+
+    def _len(self):
+        return len(self.data)
+
+
+cache_policies = {
+    'lru': LRURunCache,
+    'lfu': LFURunCache,
+    'arc': ARCRunCache,
+    'hits': HitsRunCache,
+}
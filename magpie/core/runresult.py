@@ -11,3 +11,4 @@ class RunResult(types.SimpleNamespace):
         self.last_exec = None
         self.cached = False
         self.updated = False
+        self.artifact_cached = False
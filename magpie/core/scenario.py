@@ -5,6 +5,9 @@ default_scenario = {
         'seed': '',
         'log_dir': '_magpie_logs',
         'work_dir': '_magpie_work',
+        'cache_dir': '_magpie_cache',
+        'workspace_strategy': 'copy', # copy ; hardlink ; reflink
+        'workspace_tmpfs': False,
         'local_original_copy': False,
         'local_original_name': '__original__',
         'output_encoding': 'ascii',
@@ -57,6 +60,9 @@ default_scenario = {
         'batch_lengthout': '',
         'batch_bin_fitness_strategy': 'aggregate', # aggregate ; sum ; average ; median ; q10 ; q25 ; q75 ; q90
         'batch_fitness_strategy': 'sum', # sum ; average ; median
+        'run_parallelism': 1,
+        'artifacts': '',
+        'model_cache': False,
     },
 
     # [srcml] section
@@ -96,6 +102,11 @@ number: literal_number""",
         'target_fitness': '',
         'cache_maxsize': 100,
         'cache_keep': 0.2,
+        'cache_policy': 'hits', # lru ; lfu ; arc ; hits
+        'cache_pin_reference': True,
+        'variant_memo_size': 10,
+        'parallel_workers': 1,
+        'persistent_cache': False,
         'batch_instances': '', # separated by "|" see also "file:"
         'batch_shuffle': True,
         'batch_bin_shuffle': False,
@@ -122,6 +133,22 @@ number: literal_number""",
         'batch_reset': True,
     },
 
+    # [search.islands] section
+    'search.islands': {
+        'islands': 4,
+        'algorithm': 'GeneticProgrammingUniformConcat',
+        'migration_interval': 5,
+        'migration_size': 1,
+    },
+
+    # [search.surrogate] section
+    'search.surrogate': {
+        'enabled': False,
+        'min_samples': 20,
+        'threshold': 0.1,
+        'exploration_rate': 0.1,
+    },
+
     # [search.minify] section
     'search.minify': {
         'do_cleanup': True,
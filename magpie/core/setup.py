@@ -29,6 +29,21 @@ def setup(config):
     sec = config['magpie']
     magpie.settings.log_dir = sec['log_dir']
     magpie.settings.work_dir = sec['work_dir']
+    magpie.settings.cache_dir = sec['cache_dir']
+    val = sec['workspace_strategy']
+    if val not in ['copy', 'hardlink', 'reflink']:
+        msg = '[magpie] workspace_strategy should be copy, hardlink, or reflink'
+        raise ScenarioError(msg)
+    magpie.settings.workspace_strategy = val
+    val = sec['workspace_tmpfs'].lower()
+    if val in ['true', 't', '1']:
+        if not pathlib.Path('/dev/shm').is_dir():
+            msg = '[magpie] workspace_tmpfs requires /dev/shm'
+            raise ScenarioError(msg)
+        magpie.settings.work_dir = str(pathlib.Path('/dev/shm') / pathlib.Path(sec['work_dir']).name)
+    elif val not in ['false', 'f', '0']:
+        msg = '[magpie] workspace_tmpfs should be Boolean'
+        raise ScenarioError(msg)
 
     tmp = sec['local_original_copy'].lower()
     if tmp in ['true', 't', '1']:
@@ -0,0 +1,71 @@
+import collections
+import math
+
+
+class Surrogate:
+    """Online naive Bayes classifier predicting whether a patch evaluates successfully.
+
+    Predictions are made edit by edit: edits of successful patches are known to be
+    harmless, and failures are blamed on the other edits of the failing patch (e.g., the
+    last edit of a local search neighbour). Edits are bags of features (edit type, node
+    tag, and location of both targets and ingredients), so that the outcomes of past
+    evaluations at the same location weigh on new edits touching it.
+    """
+
+    def __init__(self, min_samples=20):
+        self.min_samples = min_samples
+        self.harmless = set()
+        self.samples = {True: 0, False: 0}
+        self.counts = {True: collections.Counter(), False: collections.Counter()}
+
+    @staticmethod
+    def features(edit):
+        out = set()
+        name = edit.__class__.__name__
+        out.add(('edit', name))
+        for role, loc in [('target', edit.target), *(('ingredient', d) for d in edit.data)]:
+            if not (isinstance(loc, tuple) and len(loc) == 3):
+                continue # e.g., parameter values
+            filename, tag, index = loc
+            out.add((role, name, tag))
+            out.add((role, filename, tag, index)) # regardless of the edit type
+            out.add((role, name, filename, tag, index))
+        return out
+
+    def learn(self, patch, success):
+        edits = [edit for edit in patch.edits if str(edit) not in self.harmless]
+        if success:
+            for edit in edits:
+                self.harmless.add(str(edit))
+                self.observe(edit, True, 1)
+        else:
+            for edit in edits:
+                self.observe(edit, False, 1/len(edits))
+
+    def observe(self, edit, success, weight):
+        self.samples[success] += weight
+        for feature in self.features(edit):
+            self.counts[success][feature] += weight
+
+    def probability(self, patch):
+        # probability of success, or None until both outcomes were observed often enough
+        if min(self.samples.values()) == 0 or sum(self.samples.values()) < self.min_samples:
+            return None
+        probability = 1.0
+        for edit in patch.edits:
+            if str(edit) not in self.harmless:
+                probability *= self.edit_probability(edit)
+        return probability
+
+    def edit_probability(self, edit):
+        # unseen features carry no information
+        features = [f for f in self.features(edit) if f in self.counts[True] or f in self.counts[False]]
+        score = {}
+        for c in [True, False]:
+            # occurrences of features in edits (with Laplace smoothing), absent features are ignored
+            score[c] = math.log(self.samples[c]) - len(features) * math.log(self.samples[c] + 2)
+            score[c] += sum(math.log(self.counts[c][feature] + 1) for feature in features)
+        delta = score[False] - score[True]
+        if delta > 700:
+            return 0.0
+        return 1 / (1 + math.exp(delta))
@@ -1,28 +1,78 @@
 import contextlib
-import copy
 import difflib
+import functools
+import hashlib
+import os
+import pathlib
+import pickle
 import random
+import re
+import sys
 
 import magpie.settings
 import magpie.utils
 
 
 class Variant:
-    def __init__(self, software, patch=None):
+    def __init__(self, software, patch=None, parent=None):
+        # with a parent variant (whose patch is a prefix of patch), only the remaining edits are applied
+        base = parent or software.noop_variant
         self.models = {}
-        if software.noop_variant:
-            self.models = copy.deepcopy(software.noop_variant.models)
+        if base:
+            self.models = dict(base.models) # models are forked on first edit
         else:
             if patch is not None:
                 raise AssertionError
+            snapshots = None
+            if software.model_cache:
+                snapshots = pathlib.Path(magpie.settings.cache_dir).resolve() / 'models'
             with contextlib.chdir(software.path):
                 for filename in software.target_files:
-                    self.models[filename] = self._init_model(software, filename)
+                    self.models[filename] = self._init_model(software, filename, snapshots)
         self.patch = patch
+        done = 0
+        if parent and parent.patch:
+            done = len(parent.patch.edits)
+            if patch is None or patch.edits[:done] != parent.patch.edits:
+                msg = 'The patch of the parent variant should be a prefix of the patch'
+                raise ValueError(msg)
         if patch:
-            for edit in patch.edits:
+            forked = set()
+            for edit in patch.edits[done:]:
+                # edits only modify the model of their target file
+                if (filename := edit.target[0]) not in forked:
+                    self.models[filename] = self.models[filename].fork()
+                    forked.add(filename)
                 edit.apply(software.noop_variant, self)
-        self.diff = self._diff(software.noop_variant or self, magpie.settings.diff_method)
+        self.reference = software.noop_variant or self
+        # unmodified models are shared with the base variant, so are their digests
+        self.base_digests = {}
+        if base:
+            self.base_digests = {f: d for f, d in base.file_digests.items() if self.models[f] is base.models[f]}
+
+    @functools.cached_property
+    def diff(self):
+        return self._diff(self.reference, magpie.settings.diff_method)
+
+    @functools.cached_property
+    def digest(self):
+        # constant-size key identifying the variant contents (used by the run result caches)
+        h = hashlib.blake2b(digest_size=16)
+        for filename, file_digest in self.file_digests.items():
+            h.update(len(filename).to_bytes(8, 'little'))
+            h.update(filename.encode())
+            h.update(file_digest)
+        return h.hexdigest()
+
+    @functools.cached_property
+    def file_digests(self):
+        digests = {}
+        for filename, model in self.models.items():
+            if filename in self.base_digests:
+                digests[filename] = self.base_digests[filename]
+            else:
+                digests[filename] = hashlib.blake2b(model.dump().encode(), digest_size=16).digest()
+        return digests
 
     def random_model(self, klass):
         tmp = [model for model in self.models.values() if isinstance(model, klass)]
@@ -35,7 +85,7 @@ class Variant:
         klass = self.random_model(klass).__class__
         return [self.random_model(klass).random_target(tag) for tag in args]
 
-    def _init_model(self, software, target_file):
+    def _init_model(self, software, target_file, snapshots=None):
         for (pattern, klass) in software.model_rules:
             if any([target_file == pattern,
                     pattern == '*',
@@ -53,14 +103,53 @@ class Variant:
             ]):
                 model.setup(software.config, section_name)
                 break
+        # with "[software] model_cache", initialised models are reused across executions
+        if snapshots:
+            path = snapshots / f'{self._model_key(model)}.pickle'
+            with contextlib.suppress(Exception), path.open('rb') as snapshot: # missing or unreadable snapshot
+                return pickle.load(snapshot)
         model.init_contents()
         if model.indirect_locations:
             model.locations_names = {key: list(range(len(value))) for key, value in model.locations.items()}
         else:
             model.locations_names = model.locations
+        model.init_weights()
         model.cached_dump = model.dump()
+        if snapshots:
+            snapshots.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+            with tmp.open('wb') as snapshot:
+                pickle.dump(model, snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+            tmp.replace(path) # atomic (several Magpie processes may share cache_dir)
         return model
 
+    @staticmethod
+    def _model_key(model):
+        # identifies a model before init_contents: source code of its class, configuration, and file contents
+        # (including profiles, see AbstractModel.init_weights)
+        h = hashlib.blake2b(digest_size=16)
+        h.update(sys.version.encode())
+        for klass in type(model).__mro__:
+            if filename := getattr(sys.modules[klass.__module__], '__file__', None):
+                h.update(klass.__qualname__.encode())
+                h.update(pathlib.Path(filename).read_bytes())
+        h.update(Variant._canonical(vars(model)).encode())
+        h.update(pathlib.Path(model.filename).read_bytes())
+        for path in model.profile:
+            h.update(pathlib.Path(path).read_bytes())
+        return h.hexdigest()
+
+    @staticmethod
+    def _canonical(value):
+        # repr independent of the iteration order of sets and dicts
+        if isinstance(value, dict):
+            return '{' + ', '.join(sorted(f'{Variant._canonical(k)}: {Variant._canonical(v)}' for k, v in value.items())) + '}'
+        if isinstance(value, (set, frozenset)):
+            return '{' + ', '.join(sorted(Variant._canonical(v) for v in value)) + '}'
+        if isinstance(value, (list, tuple)):
+            return '[' + ', '.join(Variant._canonical(v) for v in value) + ']'
+        return repr(value)
+
     def _diff(self, other, method='unified'):
         if method == 'unified':
             diff_method = difflib.unified_diff
@@ -71,10 +160,41 @@ class Variant:
             raise ValueError(msg)
         diffs = []
         for filename in self.models:
+            if self.models[filename] is other.models[filename]:
+                continue # unmodified
             renamed = other.models[filename].renamed_filename
             fromfile = f'before: {renamed}'
             tofile = f'after: {renamed}'
             s1 = other.models[filename].dump().splitlines(keepends=True)
             s2 = self.models[filename].dump().splitlines(keepends=True)
-            diffs += diff_method(s1, s2, fromfile=fromfile, tofile=tofile)
+            diffs += self._diff_lines(diff_method, s1, s2, fromfile, tofile)
         return ''.join(diffs)
+
+    @staticmethod
+    def _diff_lines(diff_method, s1, s2, fromfile, tofile, n=3):
+        # same as diff_method, but only compares lines between the common prefix and suffix
+        # (except for n lines of context); line numbers in hunk headers are then shifted back
+        start = 0
+        end = min(len(s1), len(s2))
+        while start < end and s1[start] == s2[start]:
+            start += 1
+        suffix = 0
+        while suffix < end - start and s1[-1-suffix] == s2[-1-suffix]:
+            suffix += 1
+        offset = max(start - n, 0)
+        suffix = max(suffix - n, 0)
+        diff = diff_method(s1[offset:len(s1)-suffix], s2[offset:len(s2)-suffix], fromfile=fromfile, tofile=tofile, n=n)
+        if offset == 0:
+            yield from diff
+            return
+        def shift(match):
+            return str(int(match.group()) + offset)
+        # headers depend on the diff format (e.g., removed lines of unified diffs may look like context diff headers)
+        context = diff_method is difflib.context_diff
+        for line in diff:
+            if context:
+                if re.match(r'^(\*\*\* [\d,]+ \*\*\*\*|--- [\d,]+ ----)$', line):
+                    line = re.sub(r'\d+', shift, line)
+            elif m := re.match(r'^@@ -(\d+)(,\d+)? \+(\d+)(,\d+)? @@$', line):
+                line = f'@@ -{int(m[1])+offset}{m[2] or ""} +{int(m[3])+offset}{m[4] or ""} @@\n'
+            yield line
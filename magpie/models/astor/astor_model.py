@@ -1,4 +1,5 @@
 import ast
+import bisect
 import copy
 import pathlib
 
@@ -8,24 +9,139 @@ from magpie.models.abstract_rid_model import AbstractRIDModel
 
 
 class AstorModel(AbstractRIDModel):
+    def __init__(self, filename):
+        super().__init__(filename)
+        self.owned = None # nodes and blocks (by id) that can be modified in place (None: all of them)
+
     def init_contents(self):
         with pathlib.Path(self.filename).open('r') as target_file:
             self.contents = ast.parse(target_file.read()+'\n')
 
+        # locations are keys of interned paths: steps[key] = (parent key, attr, original index)
+        # statement i and insertion point i of a block share the same key
+        self.steps = []
+        self.keys = {}
+        self.offsets = {} # (parent key, attr) -> sorted original indices of insertions in that block
+        self.cleared = set() # keys of replaced/deleted statements (their former descendants are detached)
         self.locations = {'stmt': [], '_inter_block': []}
-        def visit_node(parent_pos, node):
+        def visit_node(parent_key, node):
             for attr in ['body', 'orelse', 'finalbody']:
                 if hasattr(node, attr):
-                    self.locations['_inter_block'].append(parent_pos[:] + [(attr, 0)])
+                    self.locations['_inter_block'].append(self._intern(parent_key, attr, 0))
                     for i in range(len(node.__dict__[attr])):
-                        self.locations['_inter_block'].append(parent_pos[:] + [(attr, i+1)])
-                        current_pos = parent_pos[:] + [(attr, i)]
-                        self.locations['stmt'].append(current_pos)
-                        visit_node(current_pos, node.__dict__[attr][i])
-        visit_node([], self.contents)
+                        self.locations['_inter_block'].append(self._intern(parent_key, attr, i+1))
+                        current_key = self._intern(parent_key, attr, i)
+                        self.locations['stmt'].append(current_key)
+                        visit_node(current_key, node.__dict__[attr][i])
+        visit_node(None, self.contents)
+
+        # memoised structural hashes of statements and unparsed top-level statements
+        # (shared with forks, which only read them)
+        self.hashes = {}
+        self.hashes_seed = hash(self.filename) # (see __setstate__)
+        self.unparsed = {}
+        self.structural_hash(self.contents)
+
+    def location_lines(self, target_type):
+        # lines of original statements (same traversal as init_contents)
+        # insertion points take the first line of the next statement (or the last line of the block)
+        spans = {}
+        points = {}
+        def visit_node(parent_key, node):
+            for attr in ['body', 'orelse', 'finalbody']:
+                if hasattr(node, attr):
+                    block = node.__dict__[attr]
+                    last = block[-1].end_lineno if block else getattr(node, 'end_lineno', 0)
+                    points[self.keys[(parent_key, attr, len(block))]] = (last, last)
+                    for i, stmt in enumerate(block):
+                        current_key = self.keys[(parent_key, attr, i)]
+                        spans[current_key] = (stmt.lineno, stmt.end_lineno)
+                        points[current_key] = (stmt.lineno, stmt.lineno)
+                        visit_node(current_key, stmt)
+        visit_node(None, self.contents)
+        if target_type == 'stmt':
+            return [spans[key] for key in self.locations[target_type]]
+        if target_type == '_inter_block':
+            return [points[key] for key in self.locations[target_type]]
+        return None
+
+    def __setstate__(self, state):
+        # structural hashes depend on string hashes, which differ across processes (e.g., for pickled models)
+        self.__dict__.update(state)
+        if 'hashes' in state and self.hashes_seed != hash(self.filename):
+            self.hashes = {}
+            self.hashes_seed = hash(self.filename)
+
+    def _intern(self, parent_key, attr, index):
+        step = (parent_key, attr, index)
+        if step not in self.keys:
+            self.keys[step] = len(self.steps)
+            self.steps.append(step)
+        return self.keys[step]
+
+    def _resolve(self, key):
+        # current path (list of (attr, index)) of a location, or None if it was detached
+        pos = []
+        while key is not None:
+            parent_key, attr, index = self.steps[key]
+            if parent_key in self.cleared:
+                return None
+            if points := self.offsets.get((parent_key, attr)):
+                index += bisect.bisect_right(points, index)
+            pos.append((attr, index))
+            key = parent_key
+        pos.reverse()
+        return pos
+
+    def structural_hash(self, node):
+        """
+        :param node: an AST node
+        :type node: :py:class:`ast.AST`
+        :return: a hash such that nodes with identical ast.dump have identical hashes
+        :rtype: int
+        """
+        try:
+            return self.hashes[node]
+        except KeyError:
+            pass
+        fields = (self._field_hash(getattr(node, field, None)) for field in node._fields)
+        value = hash((type(node).__name__, *fields))
+        if self.owned is None and isinstance(node, ast.stmt):
+            self.hashes[node] = value
+        return value
+
+    def _field_hash(self, value):
+        if isinstance(value, ast.AST):
+            return self.structural_hash(value)
+        if isinstance(value, list):
+            return hash(tuple(self._field_hash(v) for v in value))
+        return hash((type(value), value))
 
-    def dump(self):
-        return ast.unparse(self.contents)
+    def serialize(self):
+        # same as ast.unparse(self.contents), but only unparses top-level statements not seen before
+        pieces = []
+        for i, stmt in enumerate(self.contents.body):
+            if i == 0 and isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Constant) and isinstance(stmt.value.value, str):
+                # module docstring
+                pieces.append(ast.unparse(ast.Module([stmt], [])))
+                continue
+            if i > 0 and isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                pieces.append('')
+            try:
+                pieces.append(self.unparsed[stmt])
+            except KeyError:
+                pieces.append(ast.unparse(stmt))
+                if self.owned is None:
+                    self.unparsed[stmt] = pieces[-1]
+        return '\n'.join(pieces)
+
+    def fork(self):
+        # nodes, blocks, and locations are shared until modified (see _writable_block)
+        clone = copy.copy(self)
+        clone.offsets = self.offsets.copy()
+        clone.cleared = self.cleared.copy()
+        clone.owned = {}
+        return clone
 
     def do_replace(self, ref_model, target_dest, target_orig):
         d_f, d_t, d_i = target_dest # file name, tag, path index
@@ -34,17 +150,21 @@ class AstorModel(AbstractRIDModel):
             o_f != ref_model.filename):
             raise ValueError
         dst_root = self.contents
-        dst_pos = self.locations[d_t][d_i]
+        dst_key = self.locations[d_t][d_i]
+        dst_pos = self._resolve(dst_key)
         ingr_root = ref_model.contents
-        ingr_pos = ref_model.locations[o_t][o_i]
-        try:
-            dst_block, dst_index = self._pos_2_block_n_index(dst_root, dst_pos)
-            src_block, src_index = self._pos_2_block_n_index(ingr_root, ingr_pos)
-        except IndexError:
+        ingr_pos = ref_model._resolve(ref_model.locations[o_t][o_i])
+        if dst_pos is None or ingr_pos is None:
             return False
-        if ast.dump(dst_block[dst_index]) == ast.dump(src_block[src_index]):
+        dst_block, dst_index = self._pos_2_block_n_index(dst_root, dst_pos)
+        src_block, src_index = self._pos_2_block_n_index(ingr_root, ingr_pos)
+        dst_node, src_node = dst_block[dst_index], src_block[src_index]
+        if (self.structural_hash(dst_node) == ref_model.structural_hash(src_node) and
+            ast.dump(dst_node) == ast.dump(src_node)):
             return False
-        dst_block[dst_index] = copy.deepcopy(src_block[src_index])
+        dst_block, dst_index = self._writable_block(dst_pos)
+        dst_block[dst_index] = copy.deepcopy(src_node)
+        self.cleared.add(dst_key)
         return True
 
     def do_insert(self, ref_model, target_dest, target_orig):
@@ -53,27 +173,20 @@ class AstorModel(AbstractRIDModel):
         if (d_f != self.filename or
             o_f != ref_model.filename):
             raise ValueError
-        dst_root = self.contents
-        dst_pos = self.locations[d_t][d_i]
+        dst_key = self.locations[d_t][d_i]
+        dst_pos = self._resolve(dst_key)
         ingr_root = ref_model.contents
-        ingr_pos = ref_model.locations[o_t][o_i]
-        try:
-            dst_block, dst_index = self._pos_2_block_n_index(dst_root, dst_pos)
-            src_block, src_index = self._pos_2_block_n_index(ingr_root, ingr_pos)
-        except IndexError:
+        ingr_pos = ref_model._resolve(ref_model.locations[o_t][o_i])
+        if dst_pos is None or ingr_pos is None:
             return False
+        src_block, src_index = self._pos_2_block_n_index(ingr_root, ingr_pos)
+        dst_block, dst_index = self._writable_block(dst_pos)
         dst_block.insert(dst_index, copy.deepcopy(src_block[src_index]))
-        depth = len(dst_pos)
-        parent = dst_pos[:depth-1]
-        index = dst_pos[depth - 1][1]
-        for pos in self.locations[o_t]:
-            if pos[:depth-1] == parent and len(pos) >= depth and index <= pos[depth-1][1]:
-                a, i = pos[depth-1]
-                pos[depth-1] = (a, i + 1)
-        for pos in self.locations[d_t]:
-            if pos[:depth-1] == parent and len(pos) >= depth and index <= pos[depth-1][1]:
-                a, i = pos[depth-1]
-                pos[depth-1] = (a, i + 1)
+        # later statements and insertion points of the block are shifted through its offsets
+        parent_key, attr, index = self.steps[dst_key]
+        points = self.offsets.get((parent_key, attr), ())
+        k = bisect.bisect_right(points, index)
+        self.offsets[(parent_key, attr)] = (*points[:k], index, *points[k:])
         return True
 
     def do_delete(self, target):
@@ -81,14 +194,16 @@ class AstorModel(AbstractRIDModel):
         if d_f != self.filename:
             raise ValueError
         dst_root = self.contents
-        dst_pos = self.locations[d_t][d_i]
-        try:
-            dst_block, dst_index = self._pos_2_block_n_index(dst_root, dst_pos)
-        except IndexError:
+        dst_key = self.locations[d_t][d_i]
+        dst_pos = self._resolve(dst_key)
+        if dst_pos is None:
             return False
+        dst_block, dst_index = self._pos_2_block_n_index(dst_root, dst_pos)
         if isinstance(dst_block[dst_index], ast.Pass):
             return False
+        dst_block, dst_index = self._writable_block(dst_pos)
         dst_block[dst_index] = ast.Pass()
+        self.cleared.add(dst_key)
         return True
 
     def _pos_2_block_n_index(self, root, pos):
@@ -106,4 +221,29 @@ class AstorModel(AbstractRIDModel):
             node = node.__dict__[block][index]
         return (node.__dict__[pos[-1][0]], pos[-1][1])
 
+    def _writable_block(self, pos):
+        # same as _pos_2_block_n_index, but first (shallowly) copies shared nodes and blocks on the path
+        self.dirty = True
+        if self.owned is None:
+            # modified in place: memoised hashes and unparsed statements along the path are stale
+            node = self.contents
+            for attr, index in pos[:-1]:
+                node = node.__dict__[attr][index]
+                self.hashes.pop(node, None)
+                self.unparsed.pop(node, None)
+            return self._pos_2_block_n_index(self.contents, pos)
+        node = self.contents = self._own(self.contents)
+        for i, (attr, index) in enumerate(pos):
+            block = node.__dict__[attr] = self._own(node.__dict__[attr])
+            if i == len(pos) - 1:
+                return (block, index)
+            node = block[index] = self._own(block[index])
+        raise ValueError
+
+    def _own(self, obj):
+        if id(obj) not in self.owned:
+            obj = copy.copy(obj)
+            self.owned[id(obj)] = obj # also keeps obj alive, hence its id
+        return obj
+
 magpie.utils.known_models.append(AstorModel)
@@ -1,3 +1,4 @@
+import copy
 import pathlib
 
 import magpie.utils
@@ -11,14 +12,55 @@ class LineModel(AbstractRIDModel):
             lines = list(map(str.rstrip, target_file.readlines()))
 
         n = len(lines)
-        self.contents = lines
+        self.contents = lines # original lines (shared by forks, see fork)
+        self.segments = [s + '\n' for s in lines] # serialised original lines
+        self.changed = {} # line index -> current line (None when deleted)
+        self.inserted = {} # insertion point index -> lines inserted there, in order
+        # locations are original indices (insertion point i is before line i), hence never updated
         self.locations = {
             'line': list(range(n)),
             '_inter_line': list(range(n+1)),
         }
 
-    def dump(self):
-        return ''.join(s + '\n' for s in self.contents if s is not None)
+    def location_lines(self, target_type):
+        if target_type == 'line':
+            return [(i+1, i+1) for i in self.locations[target_type]]
+        if target_type == '_inter_line':
+            # insertion points take the weight of the next line (or of the last line)
+            n = len(self.contents)
+            return [(min(i+1, n), min(i+1, n)) for i in self.locations[target_type]]
+        return None
+
+    def line(self, index):
+        # current line at original index (None when deleted)
+        try:
+            return self.changed[index]
+        except KeyError:
+            return self.contents[index]
+
+    def serialize(self):
+        if not self.changed and not self.inserted:
+            return ''.join(self.segments)
+        # unmodified original lines are copied by slices between edited indices
+        pieces = []
+        start = 0
+        for i in sorted({*self.changed, *self.inserted}):
+            pieces.extend(self.segments[start:i])
+            pieces.extend(s + '\n' for s in self.inserted.get(i, ()) if s is not None)
+            start = i
+            if i in self.changed:
+                if (s := self.changed[i]) is not None:
+                    pieces.append(s + '\n')
+                start = i + 1
+        pieces.extend(self.segments[start:])
+        return ''.join(pieces)
+
+    def fork(self):
+        # original lines and locations are shared, edits are stored in (small) overlays
+        clone = copy.copy(self)
+        clone.changed = dict(self.changed)
+        clone.inserted = dict(self.inserted) # (tuples)
+        return clone
 
     def show_location(self, target_type, target_loc):
         tag_start = ''
@@ -27,11 +69,11 @@ class LineModel(AbstractRIDModel):
             tag_start = f'\033[36m{tag_start}'
             tag_end = f'{tag_end}\033[0m'
         if target_type == 'line':
-            return f'{tag_start}{target_loc}:{tag_end}{self.contents[self.locations[target_type][target_loc]]}'
+            return f'{tag_start}{target_loc}:{tag_end}{self.line(self.locations[target_type][target_loc])}'
         if target_type == '_inter_line':
             if target_loc == 0:
                 return f'{tag_start}0=before initial line{tag_end}'
-            return f'{tag_start}{target_loc}=after:{tag_end}{self.contents[self.locations[target_type][target_loc-1]]}'
+            return f'{tag_start}{target_loc}=after:{tag_end}{self.line(self.locations[target_type][target_loc-1])}'
         raise ValueError
 
     def do_replace(self, ref_model, target_dest, target_orig):
@@ -42,12 +84,13 @@ class LineModel(AbstractRIDModel):
             d_t != 'line' or
             o_t != 'line'):
             raise ValueError
-        old_line = self.contents[self.locations[d_t][d_i]]
-        new_line = ref_model.contents[ref_model.locations[o_t][o_i]]
+        old_line = self.line(self.locations[d_t][d_i])
+        new_line = ref_model.line(ref_model.locations[o_t][o_i])
         if (new_line is None or
             new_line == old_line):
             return False
-        self.contents[self.locations[d_t][d_i]] = new_line
+        self.changed[self.locations[d_t][d_i]] = new_line
+        self.dirty = True
         return True
 
     def do_insert(self, ref_model, target_dest, target_orig):
@@ -58,13 +101,10 @@ class LineModel(AbstractRIDModel):
             d_t != '_inter_line' or
             o_t != 'line'):
             raise ValueError
-        new_line = ref_model.contents[ref_model.locations[o_t][o_i]]
-        self.contents.insert(self.locations[d_t][d_i], new_line)
-        # fix locations
-        for i in range(d_i, len(self.locations['line'])):
-            self.locations['line'][i] += 1
-        for i in range(d_i, len(self.locations['_inter_line'])):
-            self.locations['_inter_line'][i] += 1
+        new_line = ref_model.line(ref_model.locations[o_t][o_i])
+        point = self.locations[d_t][d_i]
+        self.inserted[point] = (*self.inserted.get(point, ()), new_line) # after previous insertions
+        self.dirty = True
         return True
 
     def do_delete(self, target):
@@ -72,10 +112,10 @@ class LineModel(AbstractRIDModel):
         if (d_f != self.filename or
             d_t != 'line'):
             raise ValueError
-        old_line = self.contents[self.locations[d_t][d_i]]
-        if old_line is None:
+        if self.line(self.locations[d_t][d_i]) is None:
             return False
-        self.contents[self.locations[d_t][d_i]] = None
+        self.changed[self.locations[d_t][d_i]] = None
+        self.dirty = True
         return True
 
 magpie.utils.known_models.append(LineModel)
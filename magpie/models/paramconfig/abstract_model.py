@@ -1,3 +1,5 @@
+import copy
+
 import magpie.core
 
 from .realms import Realm
@@ -41,9 +43,16 @@ class AbstractConfigModel(magpie.core.AbstractModel):
                 if k in config_section:
                     self.config[k] = config_section[k]
 
-    def dump(self):
+    def serialize(self):
         return ''.join([f'{k} := {v!r}\n' for k,v in self.contents['current'].items() if not self.would_be_ignored(k, v)])
 
+    def fork(self):
+        # only current values are modified by edits
+        clone = copy.copy(self)
+        clone.contents = dict(self.contents)
+        clone.contents['current'] = dict(self.contents['current'])
+        return clone
+
     def show_location(self, target_type, target_loc):
         if target_type != 'param':
             raise ValueError
@@ -117,4 +126,5 @@ class AbstractConfigModel(magpie.core.AbstractModel):
         used = self.would_be_valid(key, value) and not self.would_be_ignored(key, value)
         if used:
             self.contents['current'][key] = value
+            self.dirty = True
         return used
@@ -1,9 +1,12 @@
+import itertools
 import re
 
 import magpie.utils
 
 from .xml_model import XmlModel
 
+SPACING_REGEX = re.compile(r'\n(\s*)')
+
 
 class SrcmlModel(XmlModel):
     def __init__(self, filename):
@@ -53,34 +56,90 @@ class SrcmlModel(XmlModel):
                 self.config['tag_focus'] = set(config_section['focus'].split())
 
     def process_tree(self, tree):
-        if self.config['process_pseudo_blocks']:
-            self.process_pseudo_blocks(tree)
-        if self.config['process_literals']:
-            self.process_literals(tree)
-        if self.config['process_operators']:
-            self.process_operators(tree)
-        for tag in self.config['tag_rename']:
-            self.rewrite_tags(tree, self.config['tag_rename'][tag], tag)
-        if len(self.config['tag_focus']) > 0:
-            self.focus_tags(tree, self.config['tag_focus'])
+        # transforms are applied node by node while building locations (see process_node)
+        self._tags = {} # original tag -> processed tag (see rewrite_tags)
+        self._spacings = {tree: self._process_element(tree, ('', 0))} # element -> spacing contexts of its children
         return tree
 
+    def process_node(self, element):
+        # same as process_pseudo_blocks, process_literals, process_operators, rewrite_tags, and focus_tags,
+        # fused into a single traversal: children are processed (and discarded if unfocused) before being visited
+        spacings = self._spacings.pop(element) or itertools.repeat(None)
+        focus = self.config['tag_focus']
+        if not focus:
+            for child, spacing in zip(element, spacings):
+                self._spacings[child] = self._process_element(child, spacing)
+            return
+        children = []
+        last = None
+        discarded = False
+        def append(text):
+            if last is not None:
+                last.tail = (last.tail or '') + text
+            else:
+                element.text = (element.text or '') + text
+        def aux(child, spacing):
+            nonlocal last, discarded
+            spacings = self._process_element(child, spacing)
+            if child.tag in focus:
+                self._spacings[child] = spacings
+                children.append(child)
+                last = child
+                return
+            discarded = True
+            if child.text:
+                append(child.text)
+            for sub_child, sub_spacing in zip(child, spacings or itertools.repeat(None)):
+                aux(sub_child, sub_spacing)
+            if child.tail:
+                append(child.tail)
+        for child, spacing in zip(element, spacings):
+            aux(child, spacing)
+        if discarded:
+            element[:] = children
+
+    def _process_element(self, element, spacing):
+        # every transform of the element itself, returns the spacing contexts of its children
+        spacings = None
+        if self.config['process_pseudo_blocks']:
+            spacings = self._pseudo_block(element, *spacing)
+        if element.tag == 'literal' and self.config['process_literals']:
+            self._literal(element)
+        elif element.tag == 'operator' and self.config['process_operators']:
+            self._operator(element)
+        try:
+            element.tag = self._tags[element.tag]
+        except KeyError:
+            tag = element.tag
+            for new_tag, tags in self.config['tag_rename'].items():
+                if tag in tags:
+                    tag = new_tag
+            element.tag = self._tags[element.tag] = tag
+        return spacings
+
     @staticmethod
     def guess_spacing(text):
-        if text is None:
+        if not text or '\n' not in text:
             return ''
-        m = ['', *re.findall(r'\n(\s*)', text, re.MULTILINE)]
-        return m[-1]
+        return SPACING_REGEX.findall(text)[-1]
 
     @staticmethod
     def process_pseudo_blocks(element, sp_parent='', step_parent=0):
+        for child, (sp, step) in zip(element, SrcmlModel._pseudo_block(element, sp_parent, step_parent)):
+            SrcmlModel.process_pseudo_blocks(child, sp, step)
+
+    @staticmethod
+    def _pseudo_block(element, sp_parent, step_parent):
+        # (only reads original texts and tails) returns the spacing context of every child
+        spacings = []
         sp = max(sp_parent, SrcmlModel.guess_spacing(element.text))
         for child in element:
             step = len(sp) - len(sp_parent)
             if step == 0:
                 step = step_parent
-            SrcmlModel.process_pseudo_blocks(child, sp, step)
-            sp = max(sp, SrcmlModel.guess_spacing(child.tail))
+            spacings.append((sp, step))
+            if child.tail and '\n' in child.tail:
+                sp = max(sp, SrcmlModel.guess_spacing(child.tail))
         if element.tag == 'block' and element.attrib.get('type') == 'pseudo':
             del element.attrib['type']
             if len(element) > 0:
@@ -88,11 +147,16 @@ class SrcmlModel(XmlModel):
                 child.tail = (child.tail or '') + '\n' + sp_parent + '}/*auto*/'
             else:
                 element.text = '/*auto*/{\n' + sp_parent + (element.text or '') + '\n' + sp_parent + '}/*auto*/'
+        return spacings
 
     @staticmethod
     def process_literals(element):
         for child in element:
             SrcmlModel.process_literals(child)
+        SrcmlModel._literal(element)
+
+    @staticmethod
+    def _literal(element):
         if element.tag == 'literal':
             tmp = element.attrib.get('type')
             element.tag = f'literal_{tmp}'
@@ -102,6 +166,10 @@ class SrcmlModel(XmlModel):
     def process_operators(element):
         for child in element:
             SrcmlModel.process_operators(child)
+        SrcmlModel._operator(element)
+
+    @staticmethod
+    def _operator(element):
         if element.tag == 'operator':
             # TODO
             if element.text in ['==', '!=', '<', '<=', '>', '>=']:
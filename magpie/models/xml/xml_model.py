@@ -14,8 +14,10 @@ class XmlModel(AbstractRIDModel):
         self.config = {
             'internodes': [],
         }
+        self.owned = None # elements that can be modified in place (None: all of them)
 
     def setup(self, config, section_name):
+        super().setup(config, section_name)
         config_section = config[section_name]
         if (k := 'internodes') in config_section:
             self.config[k] = set(config_section[k].split())
@@ -23,38 +25,175 @@ class XmlModel(AbstractRIDModel):
     def init_contents(self):
         with pathlib.Path(self.filename).open('r') as target_file:
             tree = self.string_to_tree(target_file.read())
+        lines = self._element_lines(tree) if self.profile else {} # before processing (see location_lines)
         self.contents = self.process_tree(tree)
 
-        def aux(accu, prefix, root):
+        # nodes are identified by their index in pre-order (shared by forks, see fork)
+        # locations are node ids, and (parent id, next child id or None) for insertion points
+        self.nodes = [] # node id -> original element
+        self.node_ids = {} # original element -> node id
+        self.parents = [] # node id -> parent node id (None for the root)
+        self.ends = [] # node id -> id of its last descendant
+        self.moved = {} # node id -> element copied since init_contents (see writable)
+        self.moved_ids = {} # copied element -> node id
+        self.cleared = [] # ids of nodes whose original children were removed (see is_detached)
+        self.indents = [] # node id -> leading indentation (see find_indent)
+        self.moved_indents = {} # node id -> indentation updated since init_contents (see _reindent)
+        def aux(accu, root, parent, indent):
+            self.process_node(root)
+            nid = len(self.nodes)
+            self.nodes.append(root)
+            self.node_ids[root] = nid
+            self.parents.append(parent)
+            self.ends.append(nid)
+            self.indents.append(indent)
+            inter = None
             if not self.config['internodes'] or root.tag in self.config['internodes']:
                 if len(root) > 0: # can't deal with <block>{}</block>
-                    for i in range(len(root)+1):
-                        s = f'{prefix}><{i}' # "><" is safe because illegal
-                        try:
-                            accu[f'_inter_{root.tag}'].append(s)
-                        except KeyError:
-                            accu[f'_inter_{root.tag}'] = [s]
-            tags = {}
-            for child in root:
-                if child.tag in tags:
-                    tags[child.tag] += 1
-                else:
-                    tags[child.tag] = 1
-                s = f'{prefix}/{child.tag}[{tags[child.tag]}]'
-                try:
-                    accu[child.tag].append(s)
-                except KeyError:
-                    accu[child.tag] = [s]
-                accu = aux(accu, s, child)
+                    inter = accu.setdefault(f'_inter_{root.tag}', [])
+                    k = len(inter)
+                    inter.extend([None] * (len(root)+1)) # filled below, once children ids are known
+            children = []
+            for child, lead in self._leads(root):
+                children.append(len(self.nodes))
+                accu.setdefault(child.tag, []).append(len(self.nodes))
+                aux(accu, child, nid, '' if parent is None else self._indent(indent, lead))
+            if inter is not None:
+                inter[k:k+len(children)+1] = [(nid, cid) for cid in children] + [(nid, None)]
+            self.ends[nid] = len(self.nodes) - 1
             return accu
-        self.locations = aux({}, '.', tree)
+        self.locations = aux({}, self.contents, None, '')
+        self.node_lines = {self.node_ids[e]: span for e, span in lines.items() if e in self.node_ids} # node id -> (first, last)
 
     def process_tree(self, tree):
         return tree
 
-    def dump(self):
+    def process_node(self, element):
+        # called on every node (in pre-order) while building locations, before its children are visited
+        pass
+
+    def serialize(self):
         return self.strip_xml_from_tree(self.contents)
 
+    def location_lines(self, target_type):
+        # lines of original nodes in the original file (nodes added by processing span their descendants)
+        # insertion points take the first line of the next child (or the last line of the parent)
+        def span(nid):
+            try:
+                return self.node_lines[nid]
+            except KeyError:
+                tmp = [self.node_lines[i] for i in range(nid+1, self.ends[nid]+1) if i in self.node_lines]
+                return (min(a for a, _ in tmp), max(b for _, b in tmp)) if tmp else (0, 0)
+        out = []
+        for loc in self.locations[target_type]:
+            if isinstance(loc, tuple):
+                parent, child = loc
+                line = span(parent)[1] if child is None else span(child)[0]
+                out.append((line, line))
+            else:
+                out.append(span(loc))
+        return out
+
+    @staticmethod
+    def _element_lines(tree):
+        # element -> (first, last) lines, from the newlines of the text before and inside it
+        lines = {}
+        line = 1
+        def aux(element):
+            nonlocal line
+            first = line
+            line += (element.text or '').count('\n')
+            for child in element:
+                aux(child)
+                line += (child.tail or '').count('\n')
+            lines[element] = (first, line)
+        aux(tree)
+        return lines
+
+    def fork(self):
+        # elements are shared until modified (see writable), locations are never modified
+        clone = copy.copy(self)
+        clone.moved = dict(self.moved)
+        clone.moved_ids = dict(self.moved_ids)
+        clone.cleared = self.cleared[:]
+        clone.moved_indents = dict(self.moved_indents)
+        clone.owned = set()
+        return clone
+
+    def node(self, nid):
+        # current element of node nid
+        try:
+            return self.moved[nid]
+        except KeyError:
+            return self.nodes[nid]
+
+    def node_id(self, element):
+        # node id of element (None for elements inserted by edits)
+        return self.moved_ids.get(element, self.node_ids.get(element))
+
+    def is_detached(self, nid):
+        # whether node nid was removed from the tree (i.e., an ancestor was deleted or replaced)
+        return any(c < nid <= self.ends[c] for c in self.cleared)
+
+    @staticmethod
+    def position(parent, child):
+        for i, tmp in enumerate(parent):
+            if tmp is child:
+                return i
+        return None
+
+    def insertion_index(self, parent_id, next_id):
+        # index of the insertion point before node next_id (None: after every child) in its parent
+        parent = self.node(parent_id)
+        if next_id is None:
+            return len(parent)
+        return self.position(parent, self.node(next_id))
+
+    def writable(self, nid):
+        # returns the element of node nid, first (shallowly) copying every shared element on its path
+        self.dirty = True
+        if self.owned is None:
+            return self.node(nid)
+        path = []
+        while nid is not None:
+            path.append(nid)
+            nid = self.parents[nid]
+        if self.contents not in self.owned:
+            self.contents = copy.copy(self.contents)
+            self.owned.add(self.contents)
+            self.moved[0] = self.contents
+            self.moved_ids[self.contents] = 0
+        node = self.contents
+        for nid in reversed(path[:-1]):
+            node = self.writable_child(node, self.position(node, self.node(nid)))
+        return node
+
+    def writable_child(self, parent, index):
+        # parent must be writable
+        child = parent[index]
+        if self.owned is not None and child not in self.owned:
+            nid = self.node_id(child)
+            child = copy.copy(child)
+            self.owned.add(child)
+            parent[index] = child
+            if nid is not None: # (inserted elements are only reached through their parent)
+                self.moved[nid] = child
+                self.moved_ids[child] = nid
+        return child
+
+    def xpath(self, nid):
+        pid = self.parents[nid]
+        if pid is None:
+            return '.'
+        node = self.node(nid)
+        k = 1
+        for child in self.node(pid):
+            if child is node:
+                break
+            if child.tag == node.tag:
+                k += 1
+        return f'{self.xpath(pid)}/{node.tag}[{k}]'
+
     def show_location(self, target_type, target_loc):
         insert = '(INSERTION POINT)'
         tag_start = '# '
@@ -66,30 +205,25 @@ class XmlModel(AbstractRIDModel):
             tag_middle = f'{tag_middle}\033[34m'
             tag_end = f'{tag_end}\033[0m'
         if target_type[:7] == '_inter_':
-            fakepath = self.locations[target_type][target_loc]
-            parent_xpath, insert_index = fakepath.split('><')
-            insert_index = int(insert_index)
-            parent = copy.deepcopy(self.contents.find(parent_xpath))
-            sp = self.find_indent(parent_xpath)
+            parent_id, next_id = self.locations[target_type][target_loc]
+            insert_index = self.insertion_index(parent_id, next_id)
+            fakepath = f'{self.xpath(parent_id)}><{insert_index}'
+            parent = copy.deepcopy(self.node(parent_id))
+            sp = self.find_indent(parent_id)
             if insert_index == 0:
                 parent.text = f'{parent.text or ""}\n{insert}\n{sp}'
             else:
-                child = None
-                tmp = {child.tag: 0 for child in parent}
-                for i, child in enumerate(parent):
-                    tmp[child.tag] += 1
-                    if i == insert_index-1:
-                        child_xpath = f'{parent_xpath}/{child.tag}[{tmp[child.tag]}]'
-                        spc = self.find_indent(child_xpath)
-                        child.tail = f'\n{spc}{insert}{child.tail or ""}'
-                        break
+                child = parent[insert_index-1]
+                child_id = self.node_id(self.node(parent_id)[insert_index-1])
+                spc = sp if child_id is None else self.find_indent(child_id)
+                child.tail = f'\n{spc}{insert}{child.tail or ""}'
             tmp = self.tree_to_string(parent)
             return f'{tag_start}{target_loc}{tag_middle}{fakepath}{tag_end}{sp}{tmp}'
         # default: non '_inter_' tag
-        xpath = self.locations[target_type][target_loc]
-        sp = self.find_indent(xpath)
-        tmp = self.tree_to_string(self.contents.find(xpath), keep_tail=False)
-        return f'{tag_start}{target_loc}{tag_middle}{xpath}{tag_end}{sp}{tmp}'
+        nid = self.locations[target_type][target_loc]
+        sp = self.find_indent(nid)
+        tmp = self.tree_to_string(self.node(nid), keep_tail=False)
+        return f'{tag_start}{target_loc}{tag_middle}{self.xpath(nid)}{tag_end}{sp}{tmp}'
 
     @staticmethod
     def string_to_tree(xml_str):
@@ -110,43 +244,28 @@ class XmlModel(AbstractRIDModel):
     def strip_xml_from_tree(tree):
         return ''.join(tree.itertext())
 
-    @staticmethod
-    def split_xpath(xpath, prefix=None):
-        if xpath == '.':
-            raise ValueError
-        if prefix is None:
-            pattern = re.compile(r'^(.*)/([^\[]+)(?:\[([^\]]+)\])?$')
-            match = re.match(pattern, xpath)
-            if match is None:
-                raise LookupError
-            return (match.group(1), match.group(2), int(match.group(3)), None)
-        if xpath[:len(prefix)+1] == prefix+'/':
-            pattern = re.compile(r'^/([^\[]+)(?:\[([^\]]+)\])?(?:/(.*))?$')
-            match = re.match(pattern, xpath[len(prefix):])
-            if match is None:
-                raise LookupError
-            return (prefix, match.group(1), int(match.group(2)), match.group(3))
-        return (None, None, None, None)
-
     def do_replace(self, ref_model, target_dest, target_orig):
         # get elements
-        d_f, d_t, d_i = target_dest # file name, tag, xpath index
-        o_f, o_t, o_i = target_orig # file name, tag, xpath index
+        d_f, d_t, d_i = target_dest # file name, tag, node index
+        o_f, o_t, o_i = target_orig # file name, tag, node index
         if (d_f != self.filename or
             o_f != ref_model.filename):
             raise ValueError
-        target = self.contents.find(self.locations[d_t][d_i])
-        ingredient = ref_model.contents.find(ref_model.locations[o_t][o_i])
-        if target is None or ingredient is None:
+        target_id = self.locations[d_t][d_i]
+        ingredient_id = ref_model.locations[o_t][o_i]
+        if self.is_detached(target_id) or ref_model.is_detached(ingredient_id):
             return False
+        target = self.node(target_id)
+        ingredient = ref_model.node(ingredient_id)
         if self.tree_to_string(target, keep_tail=False) == self.tree_to_string(ingredient, keep_tail=False):
             return False
 
         # lookup indentations
-        ind_t = self.find_indent(self.locations[d_t][d_i])
-        ind_i = ref_model.find_indent(ref_model.locations[o_t][o_i])
+        ind_t = self.find_indent(target_id)
+        ind_i = ref_model.find_indent(ingredient_id)
 
         # mutate
+        target = self.writable(target_id)
         old_tag = target.tag
         old_tail = target.tail
         target.clear() # to remove children
@@ -157,171 +276,139 @@ class XmlModel(AbstractRIDModel):
         for child in ingredient:
             target.append(copy.deepcopy(child))
         self.replace_indent(target, ind_t, ind_i)
-
-        # update modification points
-        if old_tag != ingredient.tag:
-            head, tag, pos, _ = self.split_xpath(self.locations[d_t][d_i])
-            itag = 1
-            for i, xpath in enumerate(self.locations[d_t]):
-                h, t, p, s = self.split_xpath(xpath, head)
-                if i < d_i:
-                    if h != head:
-                        continue
-                    if t == ingredient.tag:
-                        itag += 1
-                elif i == d_i:
-                    self.locations[d_t][i] = f'{h}/{ingredient.tag}[{itag}]'
-                elif h != head:
-                    break
-                elif t == tag:
-                    if p == pos:
-                        new_pos = 'deleted'
-                    elif s:
-                        new_pos = f'{h}/{t}[{p-1}]/{s}'
-                    else:
-                        new_pos = f'{h}/{t}[{p-1}]'
-                    self.locations[d_t][i] = new_pos
-                elif t == ingredient.tag:
-                    if s:
-                        new_pos = f'{h}/{t}[{p+1}]/{s}'
-                    else:
-                        new_pos = f'{h}/{t}[{p+1}]'
-                    self.locations[o_t][i] = new_pos
-        xpath = self.locations[d_t][d_i]
-        for i, xpath_inter in enumerate(self.locations[d_t]):
-            if xpath_inter > xpath and xpath_inter[:len(xpath)] == xpath:
-                self.locations[d_t][i] = 'deleted'
+        self.cleared.append(target_id)
+        if target.tag != old_tag and self.parents[target_id] is not None:
+            self._reindent(self.parents[target_id])
         return True
 
     def do_insert(self, ref_model, target_dest, target_orig):
         # get elements
-        d_f, d_t, d_i = target_dest # file name, tag, xpath index
-        o_f, o_t, o_i = target_orig # file name, tag, xpath index
+        d_f, d_t, d_i = target_dest # file name, tag, insertion point index
+        o_f, o_t, o_i = target_orig # file name, tag, node index
         if (d_f != self.filename or
             o_f != ref_model.filename):
             raise ValueError
-        parent_xpath, insert_index = self.locations[d_t][d_i].split('><')
-        insert_index = int(insert_index)
-        parent = self.contents.find(parent_xpath)
-        ingredient = ref_model.contents.find(ref_model.locations[o_t][o_i])
-        if parent is None or ingredient is None:
+        parent_id, next_id = self.locations[d_t][d_i]
+        ingredient_id = ref_model.locations[o_t][o_i]
+        if self.is_detached(parent_id) or ref_model.is_detached(ingredient_id):
             return False
+        insert_index = self.insertion_index(parent_id, next_id)
+        if insert_index is None: # next child removed with the other children of parent
+            return False
+        parent = self.node(parent_id)
+        ingredient = ref_model.node(ingredient_id)
 
         # lookup indentations
-        for child in parent:
-            ind_t = self.find_indent(f'{parent_xpath}/{child.tag}[1]')
-            break
-        else:
+        if len(parent) == 0:
             ind_t = '  ' # no idea?!
-        ind_i = ref_model.find_indent(ref_model.locations[o_t][o_i])
+        elif self.parents[parent_id] is None:
+            ind_t = ''
+        else:
+            ind_t = self._indent(self.find_indent(parent_id), parent.text)
+        ind_i = ref_model.find_indent(ingredient_id)
 
         # mutate
+        parent = self.writable(parent_id)
         tmp = copy.deepcopy(ingredient)
         if insert_index == 0:
             tmp.tail = f'\n{ind_t}'
-            parent.insert(insert_index, tmp)
         else:
-            child = None
-            for i, child in enumerate(parent):
-                if i == insert_index-1:
-                    tmp.tail = child.tail
-                    child.tail = f'\n{ind_t}'
-                    parent.insert(insert_index, tmp)
-                    break
-            else:
-                tmp.tail = child.tail
-                child.tail = f'\n{ind_t}'
-                parent.insert(i+1, tmp)
+            tmp.tail = parent[insert_index-1].tail
+            self.writable_child(parent, insert_index-1).tail = f'\n{ind_t}'
+        parent.insert(insert_index, tmp)
+        if self.owned is not None:
+            self.owned.add(tmp)
         self.replace_indent(tmp, ind_t, ind_i)
-
-        # update modification points
-        for i, xpath in enumerate(self.locations[o_t]):
-            if xpath == 'deleted':
-                continue
-            h, t, p, s = self.split_xpath(xpath, parent_xpath)
-            if h != parent_xpath or t != ingredient.tag or p < insert_index:
-                continue
-            if s:
-                new_pos = f'{h}/{t}[{p+1}]/{s}'
-            else:
-                new_pos = f'{h}/{t}[{p+1}]'
-            self.locations[o_t][i] = new_pos
-        for i, xpath_inter in enumerate(self.locations[d_t]):
-            xpath, index = xpath_inter.split('><')
-            index = int(index)
-            if xpath != parent_xpath or index < insert_index:
-                continue
-            self.locations[d_t][i] = f'{xpath}><{index+1}'
+        self._reindent(parent_id)
         return True
 
     def do_delete(self, target):
         # get elements
-        d_f, d_t, d_i = target # file name, tag, xpath index
+        d_f, d_t, d_i = target # file name, tag, node index
         if d_f != self.filename:
             raise ValueError
-        target = self.contents.find(self.locations[d_t][d_i])
-        if target is None:
+        target_id = self.locations[d_t][d_i]
+        if self.is_detached(target_id):
             return False
+        target = self.node(target_id)
         if len(target) == 0 and target.text is None: # (probably) already deleted
             return False
 
         # mutate
+        target = self.writable(target_id)
         old_tag = target.tag
         old_tail = target.tail
         target.clear() # to remove children
         target.tag = old_tag
         target.tail = old_tail
+        self.cleared.append(target_id)
         return True
 
     def do_set_text(self, target, value):
-        d_f, d_t, d_i = target # file name, tag, xpath index
+        d_f, d_t, d_i = target # file name, tag, node index
         if d_f != self.filename:
             raise ValueError
-        target = self.contents.find(self.locations[d_t][d_i])
-        if target is None or target.text == value:
+        target_id = self.locations[d_t][d_i]
+        if self.is_detached(target_id) or self.node(target_id).text == value:
             return False
+        target = self.writable(target_id)
         target.text = value
+        self._reindent(target_id)
         return True
 
     def do_wrap_text(self, target, prefix, suffix):
-        d_f, d_t, d_i = target # file name, tag, xpath index
+        d_f, d_t, d_i = target # file name, tag, node index
         if d_f != self.filename:
             raise ValueError
-        target = self.contents.find(self.locations[d_t][d_i])
-        if target is None:
+        target_id = self.locations[d_t][d_i]
+        if self.is_detached(target_id):
             return False
+        target = self.writable(target_id)
         target.text = prefix + (target.text or '') + suffix
+        self._reindent(target_id)
         return True
 
-    def find_indent(self, xpath):
-        if xpath == '.':
-            return ''
-
-        def aux(root, xpath):
-            m = re.match(r'^(.*)\/[^\[]+\[(\d+)\]$', xpath)
-            target = root.find(xpath)
-            parent = root.find(m.groups()[0])
-            if target is None:
-                raise AssertionError
-            if parent is root:
-                return ''
-            index = int(m.groups()[1])
-            if index == 1:
-                parent_lead = parent.text
+    def find_indent(self, nid):
+        try:
+            return self.moved_indents[nid]
+        except KeyError:
+            return self.indents[nid]
+
+    @staticmethod
+    def _leads(parent):
+        # leading text of each child: from the parent for the first child of its tag, from the previous child otherwise
+        tags = set()
+        previous = None
+        for child in parent:
+            if child.tag in tags:
+                yield child, previous.tail
             else:
-                for child in parent:
-                    if child is target:
-                        break
-                    parent_lead = child.tail
-                else:
-                    raise RuntimeError
-            if parent_lead and '\n' in parent_lead:
-                lead = parent_lead.split('\n')[-1]
-                return re.match(r'^(\s*)', lead).groups()[0]
-            lead = self.find_indent(m.groups()[0]) + (parent_lead or '')
-            return re.match(r'^(\s*)', lead).groups()[0]
-
-        return aux(self.contents, xpath)
+                tags.add(child.tag)
+                yield child, parent.text
+            previous = child
+
+    @staticmethod
+    def _indent(parent_indent, lead):
+        # indentation after lead, a text within a node indented by parent_indent
+        if lead and '\n' in lead:
+            lead = lead.split('\n')[-1]
+        else:
+            lead = parent_indent + (lead or '')
+        return lead[:len(lead)-len(lead.lstrip())]
+
+    def _reindent(self, pid):
+        # updates the indentation of the children of node pid after a modification (recursively, when changed)
+        if self.parents[pid] is None: # children of the root are not indented
+            return
+        indent = self.find_indent(pid)
+        for child, lead in self._leads(self.node(pid)):
+            cid = self.node_id(child)
+            if cid is None: # inserted by an edit
+                continue
+            tmp = self._indent(indent, lead)
+            if tmp != self.find_indent(cid):
+                self.moved_indents[cid] = tmp
+                self._reindent(cid)
 
     def replace_indent(self, target, ind_t, ind_i, _first=True):
         if target.text:
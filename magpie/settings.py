@@ -6,6 +6,8 @@ magpie_root = pathlib.Path(__file__).parent.parent
 
 log_dir = '_magpie_logs'
 work_dir = '_magpie_work'
+cache_dir = '_magpie_cache'
+workspace_strategy = 'copy' # copy / hardlink / reflink
 local_original_copy = False
 local_original_name = '__original__'
 output_encoding = 'ascii'
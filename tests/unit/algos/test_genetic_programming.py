@@ -0,0 +1,58 @@
+import pytest
+
+from magpie.algos import (
+    GeneticProgrammingSteadyState1Point,
+    GeneticProgrammingSteadyState2Point,
+    GeneticProgrammingSteadyStateUniformConcat,
+    GeneticProgrammingSteadyStateUniformInter,
+)
+
+from .util import SleepySoftware, make_algo, make_config
+
+
+@pytest.fixture
+def config():
+    return make_config()
+
+@pytest.mark.parametrize('klass', [
+    GeneticProgrammingSteadyState1Point,
+    GeneticProgrammingSteadyState2Point,
+    GeneticProgrammingSteadyStateUniformConcat,
+    GeneticProgrammingSteadyStateUniformInter,
+])
+@pytest.mark.parametrize('workers', [1, 4])
+def test_steady_state(klass, workers, config):
+    """Every worker should be kept busy until the step budget is exhausted"""
+    config['search']['parallel_workers'] = str(workers)
+    software = SleepySoftware()
+    algo = make_algo(klass, software, config)
+    algo.run()
+    software.shutdown_workers()
+    assert algo.report['stop'] == 'step budget'
+    assert algo.stats['steps'] == 40
+    assert algo.stats['gen'] == 4
+    assert software.peak == workers
+    assert software.resets == 1 # single instance, never resampled
+    assert algo.report['best_fitness'] <= algo.report['reference_fitness']
+
+def test_straggler(config):
+    """A slow evaluation should not delay the others"""
+    config['search']['parallel_workers'] = '4'
+    software = SleepySoftware(lambda k: 0.5 if k == 1 else 0.005) # first offspring (after warmup)
+    algo = make_algo(GeneticProgrammingSteadyState1Point, software, config)
+    algo.run()
+    software.shutdown_workers()
+    assert algo.stats['steps'] == 40
+    assert software.completed[-1] == 1
+
+def test_batch_reset(config):
+    """Generations evaluated on different instances should not overlap"""
+    config['search']['parallel_workers'] = '4'
+    config['search']['batch_instances'] = 'a\nb\nc'
+    config['search']['batch_sample_size'] = '1'
+    software = SleepySoftware()
+    algo = make_algo(GeneticProgrammingSteadyState1Point, software, config)
+    algo.run()
+    software.shutdown_workers()
+    assert algo.stats['steps'] == 40
+    assert software.resets == 4 # warmup, then every new generation
@@ -0,0 +1,70 @@
+import configparser
+import queue
+
+import pytest
+
+import magpie
+from magpie.algos import GeneticProgrammingIslands
+from magpie.algos.islands import Island
+from magpie.core import BasicSoftware, Patch, ScenarioError, default_scenario
+
+
+@pytest.fixture
+def config(tmp_path):
+    (tmp_path / 'prog').mkdir()
+    (tmp_path / 'prog' / 'prog.py').write_text(''.join(f'x{i} = {i}\n' for i in range(30)))
+    config = configparser.ConfigParser()
+    config.read_dict(default_scenario)
+    config['magpie']['seed'] = '0'
+    config['magpie']['log_dir'] = str(tmp_path / 'logs')
+    config['magpie']['work_dir'] = str(tmp_path / 'work')
+    config['software']['path'] = str(tmp_path / 'prog')
+    config['software']['target_files'] = 'prog.py'
+    config['software']['fitness'] = 'bloat_lines'
+    config['software']['test_cmd'] = 'true'
+    config['search']['max_steps'] = '20'
+    config['search']['possible_edits'] = 'LineDeletion'
+    config['search.gp']['pop_size'] = '5'
+    config['search.islands']['islands'] = '2'
+    config['search.islands']['migration_interval'] = '1'
+    yield config
+    config = configparser.ConfigParser()
+    config.read_dict(default_scenario)
+    magpie.core.pre_setup(config)
+    magpie.core.setup(config)
+
+def test_islands(config, tmp_path):
+    magpie.core.setup(config)
+    algo = GeneticProgrammingIslands()
+    algo.software = BasicSoftware(config)
+    algo.setup(config)
+    algo.run()
+    algo.software.clean_work_dir()
+    assert algo.report['stop'] == 'step budget'
+    assert algo.stats['steps'] == 40 # 20 per island
+    assert algo.stats['immigrants'] > 0
+    assert algo.report['best_fitness'] < algo.report['reference_fitness']
+    assert len(list((tmp_path / 'logs').glob('*.log'))) == 3 # one per island
+
+@pytest.mark.parametrize('key, value', [
+    ('islands', '0'),
+    ('algorithm', 'FirstImprovement'),
+    ('algorithm', 'GeneticProgrammingIslands'),
+    ('migration_interval', '0'),
+    ('migration_size', '-1'),
+])
+def test_setup(config, key, value):
+    config['search.islands'][key] = value
+    with pytest.raises(ScenarioError):
+        GeneticProgrammingIslands().setup(config)
+
+def test_exchange():
+    inbox, outbox = queue.Queue(), queue.Queue()
+    island = Island(0, inbox, outbox, 1, 2)
+    patches = [Patch.from_string(f"LineDeletion(('prog.py', 'line', {i}))") for i in range(3)]
+    assert island.exchange(patches) == []
+    assert outbox.get_nowait() == [str(patches[0]), str(patches[1])]
+    inbox.put([str(patches[2])])
+    inbox.put([str(patches[1])])
+    assert island.exchange(patches[:1]) == [patches[2], patches[1]]
+    assert island.received == 2
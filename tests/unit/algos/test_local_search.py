@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from magpie.algos import BestImprovement, FirstImprovement
+
+from .util import SleepySoftware, make_algo, make_config
+
+
+@pytest.fixture
+def config():
+    config = make_config()
+    config['search']['parallel_workers'] = '3'
+    return config
+
+def recording(klass):
+    class Recording(klass):
+        def reset(self):
+            super().reset()
+            self.records = []
+            self.batches = []
+
+        def evaluate_variants(self, variants, force=False):
+            self.batches.append(len(variants))
+            return super().evaluate_variants(variants, force)
+
+        def hook_evaluation(self, variant, run, accept=False, best=False):
+            self.records.append((self.aux_log_counter(), str(variant.patch), accept))
+            super().hook_evaluation(variant, run, accept, best)
+    return Recording
+
+def run_algo(klass, config, seed):
+    # evaluations complete in random order
+    rng = random.Random(seed)
+    software = SleepySoftware(lambda k: rng.random()*0.01)
+    random.seed(0)
+    algo = make_algo(recording(klass), software, config)
+    algo.run()
+    software.shutdown_workers()
+    assert software.peak == 3
+    return algo
+
+def test_first_improvement(config):
+    """Speculative neighbours should not depend on completion order, and be counted as steps"""
+    algo = run_algo(FirstImprovement, config, 0)
+    assert algo.report['stop'] == 'step budget'
+    assert algo.stats['steps'] == 40
+    assert [counter for counter, _, _ in algo.records] == [str(k) for k in range(1, 41)]
+    assert set(algo.batches) == {3, 1} # last one capped by the step budget
+    assert any(accept for _, _, accept in algo.records)
+    # at most one accepted neighbour per batch
+    k = 0
+    for size in algo.batches:
+        assert sum(accept for _, _, accept in algo.records[k:k+size]) <= 1
+        k += size
+    assert run_algo(FirstImprovement, config, 1).records == algo.records
+
+def test_best_improvement(config):
+    """Neighbourhoods should be generated as a batch, and accepted after their last evaluation"""
+    config['search.ls']['max_neighbours'] = '6'
+    algo = run_algo(BestImprovement, config, 0)
+    assert algo.stats['steps'] == 40
+    assert max(algo.batches) == 3
+    assert algo.records[5][2]
+    assert not any(accept for _, _, accept in algo.records[:5])
+    assert run_algo(BestImprovement, config, 1).records == algo.records
+
+def test_best_improvement_default(config):
+    config['search']['parallel_workers'] = '1'
+    algo = make_algo(BestImprovement, SleepySoftware(0), config)
+    assert algo.config['max_neighbours'] == 20
+    algo.run()
+    assert algo.stats['steps'] == 40
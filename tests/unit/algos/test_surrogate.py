@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+from magpie.algos import BestImprovement, FirstImprovement, GeneticProgrammingSteadyStateUniformConcat, GeneticProgrammingUniformConcat, ValidMinify
+
+from .util import SleepySoftware, make_algo, make_config
+
+
+def fails(patch):
+    # every edit touching a line multiple of 3 breaks the software
+    return any(loc[2] % 3 == 0 for edit in patch.edits for loc in [edit.target, *edit.data] if loc[1] == 'line')
+
+class FragileSoftware(SleepySoftware):
+    def evaluate_variant(self, variant, cached_run=None, worker=0):
+        run = super().evaluate_variant(variant, cached_run, worker)
+        if fails(variant.patch):
+            run.status = 'TEST_ERROR'
+            run.fitness = None
+        return run
+
+@pytest.fixture
+def config():
+    config = make_config()
+    config['search']['max_steps'] = '400'
+    config['search']['parallel_workers'] = '2'
+    config['search.surrogate']['enabled'] = 'true'
+    config['search.surrogate']['min_samples'] = '20'
+    return config
+
+@pytest.mark.parametrize('klass', [FirstImprovement, BestImprovement, GeneticProgrammingUniformConcat, GeneticProgrammingSteadyStateUniformConcat])
+def test_screening(config, klass):
+    class Recording(klass):
+        def reset(self):
+            super().reset()
+            self.skipped = []
+
+        def hook_evaluation(self, variant, run, accept=False, best=False):
+            if run.status == 'SURROGATE_SKIP':
+                self.skipped.append(variant.patch)
+            super().hook_evaluation(variant, run, accept, best)
+
+    software = FragileSoftware(0)
+    random.seed(0)
+    algo = make_algo(Recording, software, config)
+    algo.run()
+    software.shutdown_workers()
+    stats = algo.stats
+    assert stats['steps'] == 400
+    assert stats['surrogate_skipped'] == len(algo.skipped) > 0
+    assert sum(fails(patch) for patch in algo.skipped) > 0.75 * len(algo.skipped)
+    assert stats['surrogate_correct'] > 0.6 * stats['surrogate_predictions'] > 0
+
+def test_exploration(config):
+    config['search.surrogate']['exploration_rate'] = '0.25'
+    software = FragileSoftware(0)
+    random.seed(0)
+    algo = make_algo(FirstImprovement, software, config)
+    algo.surrogate.probability = lambda patch: 0.0
+    algo.run()
+    software.shutdown_workers()
+    # every prediction is a failure, only explored variants are evaluated
+    assert algo.stats['surrogate_predictions'] > 0
+    assert 0.15 < algo.stats['surrogate_predictions'] / (algo.stats['surrogate_predictions'] + algo.stats['surrogate_skipped']) < 0.35
+
+def test_validation(config):
+    assert make_algo(FirstImprovement, SleepySoftware(0), config).surrogate is not None
+    assert make_algo(ValidMinify, SleepySoftware(0), config).surrogate is None
+    config['search.surrogate']['enabled'] = 'false'
+    assert make_algo(FirstImprovement, SleepySoftware(0), config).surrogate is None
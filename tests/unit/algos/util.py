@@ -0,0 +1,66 @@
+import configparser
+import logging
+import threading
+import time
+import types
+
+from magpie.core import AbstractSoftware, RunResult, Variant, default_scenario
+
+
+class SleepySoftware(AbstractSoftware):
+    def __init__(self, duration=0.005):
+        super().__init__('tests/examples', reset=False)
+        self.target_files = ['triangle.py']
+        self.model_rules = [('*', 'LineModel')]
+        self.model_config = []
+        self.config = {}
+        self.fitness = [types.SimpleNamespace(maximize=False)]
+        self.logger = logging.getLogger('magpie.tests')
+        self.resets = 0
+        self._batch = [['']]
+        self.noop_variant = Variant(self)
+        self.duration = duration
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.started = 0
+        self.completed = []
+
+    @property
+    def batch(self):
+        return self._batch
+
+    @batch.setter
+    def batch(self, batch):
+        assert self.running == 0
+        self.resets += 1
+        self._batch = batch
+
+    def evaluate_variant(self, variant, cached_run=None, worker=0):
+        with self.lock:
+            k = self.started
+            self.started += 1
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.duration(k) if callable(self.duration) else self.duration)
+        with self.lock:
+            self.running -= 1
+            self.completed.append(k)
+        run = RunResult(variant, 'SUCCESS')
+        run.fitness = len(variant.models['triangle.py'].dump())
+        run.updated = True
+        return run
+
+def make_config():
+    config = configparser.ConfigParser()
+    config.read_dict(default_scenario)
+    config['search']['possible_edits'] = 'LineDeletion LineReplacement LineInsertion'
+    config['search']['warmup'] = '1'
+    config['search']['max_steps'] = '40'
+    return config
+
+def make_algo(klass, software, config):
+    algo = klass()
+    algo.software = software
+    algo.setup(config)
+    return algo
@@ -0,0 +1,122 @@
+import hashlib
+import multiprocessing
+
+import pytest
+
+import magpie.settings
+from magpie.core import BasicAlgorithm, PersistentCache, RunResult
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return tmp_path / 'cache' / 'evaluations.sqlite'
+
+def make_run(status, fitness, cache):
+    run = RunResult(None, status)
+    run.fitness = fitness
+    run.cache = cache
+    return run
+
+def test_roundtrip(cache_path):
+    cache = PersistentCache(cache_path, 'fingerprint')
+    assert cache.get('diff') is None
+    cache.set('diff', make_run('SUCCESS', [3.5], {'a': ('SUCCESS', [1.5]), 'b': ('SUCCESS', [2])}))
+    cache.set('failed', make_run('COMPILE_CODE_ERROR', None, {}))
+    cache.close()
+
+    cache = PersistentCache(cache_path, 'fingerprint')
+    run = cache.get('diff', 'variant')
+    assert run.variant == 'variant'
+    assert run.status == 'SUCCESS'
+    assert run.fitness == [3.5]
+    assert run.cache == {'a': ('SUCCESS', [1.5]), 'b': ('SUCCESS', [2])}
+    run = cache.get('failed')
+    assert run.status == 'COMPILE_CODE_ERROR'
+    assert run.fitness is None
+    assert run.cache == {}
+
+def test_fingerprint(cache_path):
+    """Entries should not leak across scenarios"""
+    PersistentCache(cache_path, 'foo').set('diff', make_run('SUCCESS', [1], {'': ('SUCCESS', [1])}))
+    assert PersistentCache(cache_path, 'bar').get('diff') is None
+    assert PersistentCache(cache_path, 'foo').get('diff') is not None
+
+def test_partial_update(cache_path):
+    """Newly evaluated instances should be added to previous ones"""
+    cache = PersistentCache(cache_path, 'fingerprint')
+    cache.set('diff', make_run('SUCCESS', [1], {'a': ('SUCCESS', [1])}))
+    cache.set('diff', make_run('RUN_TIMEOUT', None, {'a': ('SUCCESS', [1]), 'b': ('TIMEOUT', [None])}))
+    run = cache.get('diff')
+    assert run.status == 'RUN_TIMEOUT'
+    assert run.cache == {'a': ('SUCCESS', [1]), 'b': ('TIMEOUT', [None])}
+
+def write_entries(cache_path, k):
+    cache = PersistentCache(cache_path, 'fingerprint')
+    for i in range(50):
+        cache.set(f'diff{k}_{i}', make_run('SUCCESS', [i], {'': ('SUCCESS', [i])}))
+
+def test_multiprocess(cache_path):
+    PersistentCache(cache_path, 'fingerprint')
+    processes = [multiprocessing.Process(target=write_entries, args=(cache_path, k)) for k in range(4)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+        assert p.exitcode == 0
+    cache = PersistentCache(cache_path, 'fingerprint')
+    for k in range(4):
+        for i in range(50):
+            assert cache.get(f'diff{k}_{i}').fitness == [i]
+
+class StubSoftware:
+    noop_variant = None
+
+    def fingerprint(self):
+        return hashlib.blake2b(b'stub')
+
+class StubAlgorithm(BasicAlgorithm):
+    def __init__(self):
+        super().__init__()
+        self.software = StubSoftware()
+        self.config['persistent_cache'] = True
+
+    def run(self):
+        pass
+
+def test_algorithm_fallback(tmp_path, monkeypatch):
+    """In-memory cache misses should be retrieved from a previous execution"""
+    monkeypatch.setattr(magpie.settings, 'cache_dir', str(tmp_path))
+    algo = StubAlgorithm()
+    run = make_run('SUCCESS', [1], {'': ('SUCCESS', [1])})
+    run.updated = True
+    algo.cache_set('diff', run)
+
+    algo = StubAlgorithm()
+    assert algo.cache_get('other') is None
+    run = algo.cache_get('diff', 'variant')
+    assert run.variant == 'variant'
+    assert run.fitness == [1]
+    assert run.cached
+    assert algo.stats['persistent_cache_hits'] == 1
+    assert algo.cache_get('diff') is run
+
+def test_close(cache_path):
+    """Closing should remove the WAL files, and the cache should reopen on demand"""
+    cache = PersistentCache(cache_path, 'fingerprint')
+    cache.set('diff', make_run('SUCCESS', [1], {'': ('SUCCESS', [1])}))
+    cache.close()
+    assert sorted(p.name for p in cache_path.parent.iterdir()) == ['evaluations.sqlite']
+    assert cache.get('diff').fitness == [1]
+    cache.close()
+    cache.close()
+
+def test_algorithm_close(tmp_path, monkeypatch):
+    monkeypatch.setattr(magpie.settings, 'cache_dir', str(tmp_path))
+    algo = StubAlgorithm()
+    algo.persistent_cache_close()
+    run = make_run('SUCCESS', [1], {'': ('SUCCESS', [1])})
+    run.updated = True
+    algo.cache_set('diff', run)
+    assert (tmp_path / 'evaluations.sqlite-wal').exists()
+    algo.persistent_cache_close()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['evaluations.sqlite']
@@ -0,0 +1,88 @@
+import cProfile
+import importlib.util
+import json
+import random
+
+import pytest
+
+from magpie.core import ScenarioError
+from magpie.core.profile import match_file, profile_format, read_profile
+from magpie.models.line import LineModel
+
+
+def test_gcov():
+    profile = read_profile('tests/examples/triangle.c.gcov')
+    assert list(profile) == ['triangle.c']
+    lines = profile['triangle.c']
+    assert lines[3] == 19 # function
+    assert lines[15] == 0 # never executed
+    assert 9 not in lines # declaration
+
+def test_trace():
+    profile = read_profile('tests/examples/triangle.cover')
+    assert list(profile) == ['triangle.py']
+    lines = profile['triangle.py']
+    assert lines[10] == 19
+    assert lines[19] == 0
+    assert 39 not in lines # else
+
+def test_lcov(tmp_path):
+    path = tmp_path / 'coverage.info'
+    path.write_text('TN:\nSF:/home/foo/src/bar.c\nDA:1,5\nDA:2,0\nend_of_record\nSF:/home/foo/src/baz.c\nDA:1,3\nend_of_record\n')
+    assert read_profile(path) == {'/home/foo/src/bar.c': {1: 5, 2: 0}, '/home/foo/src/baz.c': {1: 3}}
+
+def test_perf(tmp_path):
+    path = tmp_path / 'report.txt'
+    path.write_text('# Overhead  Source:Line\n    45.50%  bar.c:12\n    10.00%  [.] main  bar.c:12\n     4.50%  baz.c:3\n')
+    assert read_profile(path, 'perf') == {'bar.c': {12: 55.5}, 'baz.c': {3: 4.5}}
+
+def test_coverage(tmp_path):
+    path = tmp_path / 'coverage.json'
+    path.write_text(json.dumps({'files': {'src/bar.py': {'executed_lines': [1, 2], 'missing_lines': [4]}}}))
+    assert read_profile(path) == {'src/bar.py': {1: 1, 2: 1, 4: 0}}
+
+def test_cprofile(tmp_path):
+    source = tmp_path / 'prog.py'
+    source.write_text('def f(n):\n    for i in range(n):\n        g(i)\n\ndef g(i):\n    return i*i\n')
+    spec = importlib.util.spec_from_file_location('prog', source)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    profiler = cProfile.Profile()
+    profiler.runcall(module.f, 1000)
+    profiler.dump_stats(tmp_path / 'prog.prof')
+    lines = read_profile(tmp_path / 'prog.prof')[str(source)]
+    assert lines[1] == lines[2] == lines[3] > 0 # spread over the function
+    assert lines[5] == lines[6] > 0
+    assert 4 not in lines
+
+def test_format():
+    assert profile_format('foo.c.gcov') == 'gcov'
+    assert profile_format('foo.txt', 'perf') == 'perf'
+    with pytest.raises(ScenarioError):
+        profile_format('foo.txt')
+    with pytest.raises(ScenarioError):
+        profile_format('foo.gcov', 'gprof')
+
+def test_match_file():
+    profile = {'/home/foo/src/bar.c': {1: 1}, '/home/foo/lib/bar.c': {1: 2}, 'src/baz.c': {1: 4}}
+    assert match_file(profile, 'src/bar.c') == {1: 1}
+    assert match_file(profile, 'bar.c') == {1: 3} # ambiguous
+    assert match_file(profile, 'baz.c') == {1: 4}
+    assert match_file(profile, 'qux.c') == {}
+
+def test_random_target():
+    """Weighted sampling should be identical to a linear scan"""
+    model = LineModel('foo.txt')
+    model.locations = {'line': list(range(5))}
+    model.weights = {'line': [0, 1, 0.5, 0, 3]}
+    random.seed(0)
+    targets = [model.random_target('line') for _ in range(1000)]
+    random.seed(0)
+    for target in targets:
+        r = random.uniform(0, 4.5)
+        for loc, w in enumerate(model.weights['line']):
+            if r < w:
+                break
+            r -= w
+        assert target == ('foo.txt', 'line', loc)
+    assert {loc for _, _, loc in targets} == {1, 2, 4}
@@ -0,0 +1,99 @@
+import random
+
+import pytest
+
+from magpie.core.run_cache import ARCRunCache, HitsRunCache, LFURunCache, LRURunCache, cache_policies
+
+
+@pytest.mark.parametrize('policy', cache_policies.values())
+def test_bounded(policy):
+    """Random workloads should never exceed the maximum size nor return stale values"""
+    rng = random.Random(0)
+    cache = policy(50)
+    values = {}
+    for i in range(5000):
+        key = str(int(rng.paretovariate(1)))
+        if rng.random() < 0.5:
+            cache.set(key, i)
+            values[key] = i
+        else:
+            assert cache.get(key) in [None, values.get(key)]
+        # the historical policy only evicts on the next insertion
+        assert len(cache) <= 50 + (policy is HitsRunCache)
+    assert cache.hits > 0
+    assert cache.evictions > 0
+
+@pytest.mark.parametrize('policy', cache_policies.values())
+def test_pinned(policy):
+    """The reference entry should never be evicted"""
+    cache = policy(10, [''])
+    cache.set('', 'reference')
+    for i in range(100):
+        cache.set(str(i), i)
+    assert cache.get('') == 'reference'
+    assert len(cache) <= 12
+
+@pytest.mark.parametrize('policy', cache_policies.values())
+def test_pin(policy):
+    """Entries can be pinned after insertion"""
+    cache = policy(10)
+    cache.set('ref', 'reference')
+    cache.get('ref')
+    cache.pin('ref')
+    for i in range(100):
+        cache.set(str(i), i)
+    assert cache.get('ref') == 'reference'
+    assert len(cache) <= 12
+
+@pytest.mark.parametrize('policy', cache_policies.values())
+def test_disabled(policy):
+    cache = policy(0, [''])
+    cache.set('foo', 'foo')
+    cache.set('', 'reference')
+    assert cache.get('foo') is None
+    assert cache.get('') == 'reference'
+
+def test_lru():
+    cache = LRURunCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    assert cache.set('c', 3) == 1
+    assert 'a' in cache
+    assert 'b' not in cache
+
+def test_lfu():
+    cache = LFURunCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.get('a')
+    cache.get('b')
+    assert cache.set('c', 3) == 1
+    assert 'a' in cache
+    assert 'b' not in cache
+    # frequency history is kept across evictions
+    assert cache.set('d', 4) == 1
+    assert 'a' in cache
+    assert 'c' not in cache
+
+def test_arc_scan_resistance():
+    """Frequently used entries should survive a scan of single-use entries"""
+    cache = ARCRunCache(10)
+    for _ in range(2):
+        for i in range(5):
+            if cache.get(f'hot{i}') is None:
+                cache.set(f'hot{i}', i)
+    for i in range(100):
+        cache.set(f'cold{i}', i)
+    assert all(f'hot{i}' in cache for i in range(5))
+
+def test_hits():
+    """Historical behaviour: drops the least hit entries at once"""
+    cache = HitsRunCache(4, keep=0.5)
+    for key in 'abcde':
+        cache.set(key, key)
+    cache.get('a')
+    cache.get('b')
+    assert cache.set('f', 'f') == 2
+    assert set('abef') == {key for key in 'abcdef' if key in cache}
@@ -0,0 +1,415 @@
+import asyncio
+import os
+import pathlib
+import shutil
+import sys
+import threading
+import time
+
+import pytest
+
+import magpie.settings
+
+from magpie.core import AbstractSoftware, AsyncSoftware, BasicSoftware, ExecResult, ScenarioError, default_scenario
+
+
+class DummySoftware(AbstractSoftware):
+    def __init__(self):
+        super().__init__('.', reset=False)
+        self.lock = threading.Lock()
+        self.busy = set()
+
+    def evaluate_variant(self, variant, cached_run=None, worker=0):
+        with self.lock:
+            assert worker not in self.busy
+            self.busy.add(worker)
+        time.sleep(0.02)
+        with self.lock:
+            self.busy.remove(worker)
+        return (variant, cached_run, worker)
+
+class DummyAsyncSoftware(AsyncSoftware):
+    def __init__(self):
+        config = {k: dict(v) for k, v in default_scenario.items()}
+        config['software'].update({
+            'path': 'foo',
+            'target_files': 'foo/bar',
+            'possible_edits': 'LineDeletion',
+            'fitness': 'time',
+        })
+        super().__init__(config)
+        self.timestamp = '0'
+
+    def reset_workdir(self):
+        pass
+
+    def reset_contents(self):
+        self.contents = {}
+        self.locations = {}
+
+    def evaluation_steps(self, variant, cached_run=None, worker=0):
+        # echo the variant twice, then returns both outputs
+        first = yield {'cmd': [sys.executable, '-c', f'import time; time.sleep(0.2); print({variant!r})']}
+        second = yield {'cmd': [sys.executable, '-c', f'print({variant!r})']}
+        return (first.stdout + second.stdout, worker)
+
+class SlowWriteAsyncSoftware(DummyAsyncSoftware):
+    def __init__(self):
+        super().__init__()
+        self.setup.performed = True
+
+    def write_variant(self, variant, worker=0):
+        if variant == 'slow':
+            time.sleep(1)
+
+    def evaluation_steps(self, variant, cached_run=None, worker=0):
+        self.write_variant(variant, worker)
+        result = yield {'cmd': [sys.executable, '-c', f'import time; time.sleep(0.2); print({variant!r})']}
+        return (result.stdout, time.time())
+
+class BusyAsyncSoftware(DummyAsyncSoftware):
+    def __init__(self):
+        super().__init__()
+        self.setup.performed = True
+        self.lock = threading.Lock()
+        self.busy = set()
+        self.shared = False
+
+    def evaluation_steps(self, variant, cached_run=None, worker=0):
+        with self.lock:
+            self.shared |= worker in self.busy
+            self.busy.add(worker)
+        yield {'cmd': [sys.executable, '-c', 'import time; time.sleep(0.2)']}
+        with self.lock:
+            self.busy.discard(worker)
+        return worker
+
+class BatchSoftware(BasicSoftware):
+    def __init__(self, run_parallelism):
+        config = {k: dict(v) for k, v in default_scenario.items()}
+        config['software'].update({
+            'path': 'foo',
+            'target_files': 'foo/bar',
+            'possible_edits': 'LineDeletion',
+            'fitness': 'time',
+            'run_cmd': 'run {INST}',
+            'run_parallelism': run_parallelism,
+        })
+        super().__init__(config)
+        self.target_files = []
+        self.work_dir = pathlib.Path('work')
+        self.setup.performed = True
+        self.batch = [['a', 'b', 'c'], ['d', 'e']]
+        self.executed = []
+
+    def reset_workdir(self):
+        pass
+
+    def reset_contents(self):
+        self.contents = {}
+        self.locations = {}
+
+    def write_variant(self, variant, worker=0):
+        pass
+
+    def exec_cmd(self, cmd, timeout=15, env=None, shell=False, lengthout=1e6, cwd=None):
+        # earlier instances complete last
+        inst = cmd[-1]
+        time.sleep(0.01*(ord('e')-ord(inst)))
+        self.executed.append(inst)
+        status = 'TIMEOUT' if inst == self.failing else 'SUCCESS'
+        runtime = float(ord(inst)-ord('a')+1)
+        return ExecResult(cmd, status, 0, b'', b'', runtime, 10, cwd)
+
+@pytest.fixture
+def my_software():
+    software = DummySoftware()
+    yield software
+    software.shutdown_workers()
+
+@pytest.fixture
+def my_async_software():
+    software = DummyAsyncSoftware()
+    yield software
+    software.shutdown_workers()
+
+def test_evaluate_variants_sequential(my_software):
+    """A single worker should evaluate everything in worker 0"""
+    runs = my_software.evaluate_variants(['a', 'b', 'c'])
+    assert runs == [('a', None, 0), ('b', None, 0), ('c', None, 0)]
+
+@pytest.mark.parametrize('workers', [2, 4])
+def test_evaluate_variants_parallel(my_software, workers):
+    """Run results should be returned in order, each worker being used by a single variant at a time"""
+    variants = [str(i) for i in range(12)]
+    cached = [f'cached{i}' for i in range(12)]
+    runs = my_software.evaluate_variants(variants, cached, workers)
+    assert [run[0] for run in runs] == variants
+    assert [run[1] for run in runs] == cached
+    assert {run[2] for run in runs} <= set(range(workers))
+    assert len({run[2] for run in runs}) > 1
+
+def test_work_path(my_software):
+    """Worker 0 should keep the historical work path"""
+    my_software.work_dir = my_software.path / 'work'
+    assert my_software.work_path() == my_software.path / 'work' / my_software.basename
+    assert my_software.work_path(0) != my_software.work_path(1)
+    assert my_software.work_path(1).name == my_software.basename
+
+EXEC_CASES = [
+    ('print("foo"); print("bar", file=sys.stderr)', 'SUCCESS', b'foo\n', b'bar\n'),
+    ('sys.stdout.write("x"*300000); sys.stderr.write("y"*300000)', 'SUCCESS', b'x'*300000, b'y'*300000),
+    ('sys.stdout.write("x"*2000000)', 'LENGTHOUT', None, None),
+    ('import time; print("foo", flush=True); time.sleep(10)', 'TIMEOUT', b'foo\n', b''),
+]
+EXEC_IDS = ['small', 'large', 'lengthout', 'timeout']
+
+@pytest.mark.parametrize(('code', 'status', 'stdout', 'stderr'), EXEC_CASES, ids=EXEC_IDS)
+def test_exec_cmd(my_software, code, status, stdout, stderr):
+    my_software.timestamp = '0'
+    cmd = [sys.executable, '-c', f'import sys; {code}']
+    result = my_software.exec_cmd(cmd, timeout=2, lengthout=1e6)
+    check_exec_result(result, status, stdout, stderr)
+
+@pytest.mark.parametrize(('code', 'status', 'stdout', 'stderr'), EXEC_CASES, ids=EXEC_IDS)
+def test_exec_cmd_async(my_async_software, code, status, stdout, stderr):
+    cmd = [sys.executable, '-c', f'import sys; {code}']
+    result = asyncio.run(my_async_software.exec_cmd_async(cmd, timeout=2, lengthout=1e6))
+    check_exec_result(result, status, stdout, stderr)
+
+def check_exec_result(result, status, stdout, stderr):
+    assert result.status == status
+    assert result.output_length == len(result.stdout) + len(result.stderr)
+    if stdout is not None:
+        assert result.stdout == stdout
+        assert result.stderr == stderr
+    if status == 'LENGTHOUT':
+        assert result.output_length == 1e6
+
+def test_exec_cmd_cli_error(my_software):
+    my_software.timestamp = '0'
+    result = my_software.exec_cmd(['magpie_this_command_does_not_exist'])
+    assert result.status == 'CLI_ERROR'
+
+def test_exec_cmd_async_cli_error(my_async_software):
+    result = asyncio.run(my_async_software.exec_cmd_async(['magpie_this_command_does_not_exist']))
+    assert result.status == 'CLI_ERROR'
+
+def test_exec_cmd_async_grandchild(my_async_software):
+    """Grandchildren keeping the pipes open should be killed on timeout"""
+    code = "import subprocess, sys; subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(8)']); print('hi')"
+    start = time.time()
+    result = asyncio.run(my_async_software.exec_cmd_async([sys.executable, '-c', code], timeout=1))
+    assert result.status == 'TIMEOUT'
+    assert result.stdout == b'hi\n'
+    assert time.time() - start < 3
+
+def test_evaluate_variant_async(my_async_software):
+    """The coroutine should drive every step of the pipeline"""
+    run = asyncio.run(my_async_software.evaluate_variant_async('foo', worker=3))
+    assert run == (b'foo\nfoo\n', 3)
+
+def test_evaluate_variants_async(my_async_software):
+    """Concurrent evaluations should run on the same event loop and be returned in order"""
+    variants = [str(i) for i in range(8)]
+    start = time.time()
+    runs = my_async_software.evaluate_variants(variants, workers=8)
+    assert time.time() - start < 8*0.2
+    assert [run[0] for run in runs] == [f'{v}\n{v}\n'.encode() for v in variants]
+    assert {run[1] for run in runs} <= set(range(8))
+
+def test_evaluate_variants_async_slow_write():
+    """Writing a variant should not block the subprocesses of other evaluations"""
+    software = SlowWriteAsyncSoftware()
+    try:
+        start = time.time()
+        runs = software.evaluate_variants(['slow', *(str(i) for i in range(4))], workers=5)
+    finally:
+        software.shutdown_workers()
+    assert [run[0] for run in runs] == [b'slow\n', *(f'{i}\n'.encode() for i in range(4))]
+    assert all(run[1] - start < 1 for run in runs[1:])
+    assert runs[0][1] - start >= 1
+
+def test_submit_variant_async_resize():
+    """Changing the number of workers should not reuse the workers of evaluations in flight"""
+    software = BusyAsyncSoftware()
+    try:
+        futures = [software.submit_variant(str(i), workers=4) for i in range(4)]
+        futures += [software.submit_variant(str(i), workers=2) for i in range(4)]
+        futures += [software.submit_variant(str(i), workers=6) for i in range(6)]
+        workers = [future.result() for future in futures]
+    finally:
+        software.shutdown_workers()
+    assert not software.shared
+    assert set(workers) <= set(range(6))
+
+@pytest.mark.parametrize('run_parallelism', [1, 2, 5])
+def test_run_parallelism(run_parallelism):
+    """Concurrently executed instances should be aggregated in batch order"""
+    software = BatchSoftware(run_parallelism)
+    software.failing = None
+    run = software.evaluate_variant(None)
+    assert run.status == 'SUCCESS'
+    assert list(run.cache) == ['a', 'b', 'c', 'd', 'e']
+    assert [fit for _, fit in run.cache.values()] == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+    reference = BatchSoftware(1)
+    reference.failing = None
+    assert run.fitness == reference.evaluate_variant(None).fitness
+    if run_parallelism > 1:
+        assert software.executed[:2] != ['a', 'b']
+
+@pytest.mark.parametrize('run_parallelism', [1, 2, 5])
+def test_run_parallelism_failure(run_parallelism):
+    """Results after the first failing instance should be discarded"""
+    software = BatchSoftware(run_parallelism)
+    software.failing = 'c'
+    run = software.evaluate_variant(None)
+    assert run.status == 'RUN_TIMEOUT'
+    assert list(run.cache) == ['a', 'b', 'c']
+    assert run.fitness is None
+
+@pytest.mark.parametrize('run_parallelism', [1, 2, 5])
+def test_run_parallelism_batch_budget(run_parallelism):
+    """batch_timeout should be shared by all instances, in batch order"""
+    software = BatchSoftware(run_parallelism)
+    software.failing = None
+    software.batch_timeout = 5.5 # a (1) + b (2) + c (3) > 5.5
+    run = software.evaluate_variant(None)
+    assert run.status == 'BATCH_TIMEOUT'
+    assert list(run.cache) == ['a', 'b', 'c']
+    assert run.fitness is None
+
+def test_run_parallelism_invalid():
+    with pytest.raises(ScenarioError):
+        BatchSoftware(0)
+
+def test_artifacts(tmp_path):
+    """Variants with identical artifacts should reuse previous run results"""
+    software = BatchSoftware(1)
+    software.failing = None
+    software.work_dir = tmp_path
+    software.artifacts = ['bin']
+    artifact = software.work_path() / 'bin' / 'exe'
+    artifact.parent.mkdir(parents=True)
+    artifact.write_text('foo')
+    first = software.evaluate_variant(None)
+    assert not first.artifact_cached
+    assert len(software.executed) == 5
+    run = software.evaluate_variant(None)
+    assert run.artifact_cached
+    assert run.status == 'SUCCESS'
+    assert run.cache == first.cache
+    assert run.fitness == first.fitness
+    assert len(software.executed) == 5
+    artifact.write_text('bar')
+    run = software.evaluate_variant(None)
+    assert not run.artifact_cached
+    assert len(software.executed) == 10
+
+def test_artifacts_failure(tmp_path):
+    software = BatchSoftware(1)
+    software.failing = 'b'
+    software.work_dir = tmp_path
+    software.artifacts = ['missing']
+    software.evaluate_variant(None)
+    run = software.evaluate_variant(None)
+    assert run.artifact_cached
+    assert run.status == 'RUN_TIMEOUT'
+    assert run.fitness is None
+    assert software.executed == ['a', 'b']
+
+def test_artifacts_bounded(tmp_path):
+    """Reusable results should be bounded like the run results cache"""
+    software = BatchSoftware(1)
+    software.failing = None
+    software.work_dir = tmp_path
+    software.artifacts = ['bin']
+    software.config['search'].update({'cache_maxsize': '2', 'cache_policy': 'lru'})
+    software.artifact_reset()
+    artifact = software.work_path() / 'bin' / 'exe'
+    artifact.parent.mkdir(parents=True)
+    for content in ['foo', 'bar', 'baz', 'foo']:
+        artifact.write_text(content)
+        run = software.evaluate_variant(None)
+    assert not run.artifact_cached
+    assert len(software.artifact_runs) == 2
+
+@pytest.mark.parametrize('fitness', ['bloat_lines', 'bloat_chars'])
+def test_artifacts_invalid(fitness):
+    config = {k: dict(v) for k, v in default_scenario.items()}
+    config['software'].update({
+        'path': 'foo',
+        'target_files': 'foo/bar',
+        'possible_edits': 'LineDeletion',
+        'fitness': f'time {fitness}',
+        'artifacts': 'bin',
+    })
+    with pytest.raises(ScenarioError):
+        BasicSoftware(config)
+
+@pytest.mark.parametrize('strategy', ['copy', 'hardlink', 'reflink'])
+def test_sync_folder(my_software, tmp_path, monkeypatch, strategy):
+    """All workspace strategies should produce an identical copy of the original software"""
+    monkeypatch.setattr(magpie.settings, 'workspace_strategy', strategy)
+    original = tmp_path / 'original'
+    (original / 'src').mkdir(parents=True)
+    (original / 'src' / 'foo.c').write_text('foo')
+    (original / 'bar.c').write_text('bar')
+    work = tmp_path / 'work'
+    my_software.sync_folder(work, original)
+    assert (work / 'src' / 'foo.c').read_text() == 'foo'
+    assert (work / 'bar.c').read_text() == 'bar'
+    if strategy == 'hardlink':
+        assert (work / 'bar.c').stat().st_ino == (original / 'bar.c').stat().st_ino
+
+    # simulate a variant writing a target file and compiling
+    my_software.break_link(work / 'bar.c')
+    (work / 'bar.c').write_text('modified')
+    (work / 'src' / 'foo.o').write_text('obj')
+    (work / 'src' / 'foo.c').unlink()
+    assert (original / 'bar.c').read_text() == 'bar'
+    time.sleep(0.01)
+    os.utime(work / 'bar.c')
+    my_software.sync_folder(work, original)
+    assert (work / 'bar.c').read_text() == 'bar'
+    assert (work / 'src' / 'foo.c').read_text() == 'foo'
+    assert not (work / 'src' / 'foo.o').exists()
+
+@pytest.mark.parametrize('strategy', ['copy', 'hardlink'])
+def test_restore_folder(my_software, tmp_path, monkeypatch, strategy):
+    """Incremental restorations should only copy created, modified, or deleted files"""
+    monkeypatch.setattr(magpie.settings, 'workspace_strategy', strategy)
+    original = tmp_path / 'original'
+    (original / 'src' / 'sub').mkdir(parents=True)
+    (original / 'src' / 'sub' / 'foo.c').write_text('foo')
+    (original / 'src' / 'bar.c').write_text('bar')
+    (original / 'baz.c').write_text('baz')
+    (original / 'qux').write_text('qux')
+    my_software.path = original
+    work = tmp_path / 'work'
+    my_software.restore_folder(work)
+    copied = []
+    def copy_file(original, target):
+        copied.append(pathlib.Path(target).relative_to(work))
+        return AbstractSoftware.copy_file(my_software, original, target)
+    monkeypatch.setattr(my_software, 'copy_file', copy_file)
+
+    # simulate a variant writing a target file and compiling
+    my_software.break_link(work / 'baz.c')
+    (work / 'baz.c').write_text('modified')
+    (work / 'src' / 'bar.o').write_text('obj')
+    (work / 'build').mkdir()
+    (work / 'build' / 'out').write_text('out')
+    shutil.rmtree(work / 'src' / 'sub')
+    (work / 'qux').unlink()
+    (work / 'qux').mkdir()
+    my_software.restore_folder(work)
+    assert sorted(copied) == sorted(pathlib.Path(p) for p in ['baz.c', 'qux', 'src/sub/foo.c'])
+    assert my_software.scan_manifest(work).keys() == my_software.scan_manifest(original).keys()
+    for filename in ['baz.c', 'qux', 'src/bar.c', 'src/sub/foo.c']:
+        assert (work / filename).read_text() == (original / filename).read_text()
+
+    # nothing to do
+    copied.clear()
+    my_software.restore_folder(work)
+    assert copied == []
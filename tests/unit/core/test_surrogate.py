@@ -0,0 +1,48 @@
+from magpie.core import Patch
+from magpie.core.surrogate import Surrogate
+
+
+def make_patch(*edits):
+    return Patch.from_string(' | '.join(edits))
+
+def test_probability():
+    # line 3 cannot be moved nor deleted (e.g., a return statement)
+    surrogate = Surrogate(min_samples=10)
+    assert surrogate.probability(make_patch("LineDeletion(('foo.py', 'line', 3))")) is None
+    for i in range(9):
+        surrogate.learn(make_patch(f"LineDeletion(('foo.py', 'line', {i}))"), i != 3)
+    assert surrogate.probability(make_patch("LineDeletion(('foo.py', 'line', 3))")) is None # not enough samples yet
+    for i in range(10):
+        surrogate.learn(make_patch(f"LineInsertion(('foo.py', '_inter_line', {i}), ('foo.py', 'line', 3))"), False)
+        surrogate.learn(make_patch(f"LineInsertion(('foo.py', '_inter_line', {i}), ('foo.py', 'line', 6))"), True)
+        surrogate.learn(make_patch(f"LineReplacement(('foo.py', 'line', {i}), ('foo.py', 'line', 5))"), i != 3)
+    assert surrogate.probability(make_patch("LineInsertion(('foo.py', '_inter_line', 12), ('foo.py', 'line', 3))")) < 0.1
+    assert surrogate.probability(make_patch("LineInsertion(('foo.py', '_inter_line', 12), ('foo.py', 'line', 6))")) > 0.5
+    assert surrogate.probability(make_patch("LineReplacement(('foo.py', 'line', 12), ('foo.py', 'line', 5))")) > 0.5
+    assert surrogate.probability(make_patch("LineDeletion(('foo.py', 'line', 3))")) < surrogate.probability(make_patch("LineDeletion(('foo.py', 'line', 5))"))
+    # a single failing edit is enough
+    patch = make_patch("LineReplacement(('foo.py', 'line', 12), ('foo.py', 'line', 5))", "LineInsertion(('foo.py', '_inter_line', 12), ('foo.py', 'line', 3))")
+    assert surrogate.probability(patch) < 0.1
+    # edits of successful patches are harmless
+    assert surrogate.probability(make_patch("LineDeletion(('foo.py', 'line', 5))", "LineInsertion(('foo.py', '_inter_line', 2), ('foo.py', 'line', 6))")) == 1
+
+def test_blame():
+    surrogate = Surrogate(min_samples=0)
+    surrogate.learn(make_patch("LineDeletion(('foo.py', 'line', 1))"), True)
+    surrogate.learn(make_patch("LineDeletion(('foo.py', 'line', 1))", "LineDeletion(('foo.py', 'line', 2))"), False)
+    assert surrogate.samples == {True: 1, False: 1}
+    assert surrogate.counts[False][('target', 'foo.py', 'line', 2)] == 1
+    assert surrogate.counts[False][('target', 'foo.py', 'line', 1)] == 0
+    surrogate.learn(make_patch("LineDeletion(('foo.py', 'line', 3))", "LineDeletion(('foo.py', 'line', 4))"), False)
+    assert surrogate.counts[False][('target', 'foo.py', 'line', 3)] == 0.5
+    assert surrogate.probability(make_patch("LineDeletion(('foo.py', 'line', 2))")) < surrogate.probability(make_patch("LineDeletion(('foo.py', 'line', 3))"))
+
+def test_features():
+    edit, param = make_patch("LineReplacement(('foo.py', 'line', 3), ('bar.py', 'line', 5))", "ParamSetting(('foo.params', 'x'), 2)").edits
+    features = Surrogate.features(edit)
+    assert ('edit', 'LineReplacementEdit') in features
+    assert ('target', 'LineReplacementEdit', 'line') in features
+    assert ('target', 'foo.py', 'line', 3) in features
+    assert ('ingredient', 'bar.py', 'line', 5) in features
+    assert ('ingredient', 'LineReplacementEdit', 'bar.py', 'line', 5) in features
+    assert Surrogate.features(param) == {('edit', 'ParamSettingEdit')}
@@ -0,0 +1,173 @@
+import difflib
+import random
+import shutil
+import types
+
+import pytest
+
+import magpie.settings
+from magpie.core import BasicAlgorithm, Patch, Variant
+from magpie.models.astor import AstorModel
+from magpie.models.line import LineDeletionEdit, LineInsertionEdit, LineReplacementEdit
+from magpie.models.xml import SrcmlModel
+
+
+@pytest.fixture
+def software():
+    software = types.SimpleNamespace(
+        path='tests/examples',
+        target_files=['triangle.py', 'triangle.c'],
+        model_rules=[('*', 'LineModel')],
+        model_config=[],
+        config={},
+        model_cache=False,
+        noop_variant=None,
+    )
+    software.noop_variant = Variant(software)
+    return software
+
+def random_patch(software, rng, n):
+    patch = Patch()
+    for _ in range(n):
+        klass = rng.choice([LineDeletionEdit, LineInsertionEdit, LineReplacementEdit])
+        patch.edits.append(klass.auto_create(software.noop_variant))
+    return patch
+
+class StubAlgorithm(BasicAlgorithm):
+    def run(self):
+        pass
+
+
+def make_lines(rng, k):
+    return [f'line {rng.randrange(1000)}\n' for _ in range(k)]
+
+@pytest.mark.parametrize('diff_method', [difflib.unified_diff, difflib.context_diff])
+@pytest.mark.parametrize('seed', range(20))
+def test_diff_lines(diff_method, seed):
+    """Trimmed diffs should be identical to full diffs"""
+    rng = random.Random(seed)
+    s1 = make_lines(rng, 150)
+    s2 = s1[:]
+    for _ in range(rng.randrange(1, 4)):
+        i = rng.randrange(len(s2))
+        op = rng.randrange(3)
+        if op == 0:
+            del s2[i]
+        elif op == 1:
+            s2[i] = 'changed\n'
+        else:
+            s2.insert(i, 'inserted\n')
+    expected = list(diff_method(s1, s2, fromfile='before', tofile='after'))
+    assert list(Variant._diff_lines(diff_method, s1, s2, 'before', 'after')) == expected
+
+@pytest.mark.parametrize('diff_method', [difflib.unified_diff, difflib.context_diff])
+def test_diff_lines_edges(diff_method):
+    s1 = ['a\n', 'b\n', 'c\n']
+    for s2 in [s1, [], ['z\n', *s1], [*s1, 'z\n'], s1[1:], s1[:-1]]:
+        expected = list(diff_method(s1, s2, fromfile='before', tofile='after'))
+        assert list(Variant._diff_lines(diff_method, s1, s2, 'before', 'after')) == expected
+
+@pytest.mark.parametrize('diff_method', [difflib.unified_diff, difflib.context_diff])
+def test_diff_lines_header_like(diff_method):
+    """Lines looking like hunk headers should never be renumbered"""
+    s1 = [f'line {i}\n' for i in range(10)]
+    for text in ['-- 2 ----\n', '** 2 ****\n', '@ -2 +2 @@\n']:
+        s2 = s1[:5] + [text] + s1[5:]
+        for a, b in [(s1, s2), (s2, s1)]:
+            expected = list(diff_method(a, b, fromfile='before', tofile='after'))
+            assert list(Variant._diff_lines(diff_method, a, b, 'before', 'after')) == expected
+
+def test_parent(software):
+    """Derived variants should be identical to variants built from scratch"""
+    random.seed(0)
+    for _ in range(20):
+        patch = random_patch(software, random, 6)
+        parent = Variant(software, Patch(patch.edits[:3]))
+        variant = Variant(software, patch, parent)
+        expected = Variant(software, patch)
+        assert variant.digest == expected.digest
+        assert variant.diff == expected.diff
+        assert parent.diff == Variant(software, Patch(patch.edits[:3])).diff
+    with pytest.raises(ValueError):
+        Variant(software, Patch(patch.edits[1:]), parent)
+
+def test_make_variant(software):
+    random.seed(0)
+    algo = StubAlgorithm()
+    algo.software = software
+    patch = random_patch(software, random, 4)
+    for k in range(1, 5):
+        variant = algo.make_variant(Patch(patch.edits[:k]))
+    assert variant.digest == Variant(software, patch).digest
+    assert algo.make_variant(Patch(patch.edits)) is variant
+    # deletion: derived from the longest memoised prefix
+    tmp = Patch(patch.edits[:2] + patch.edits[3:])
+    assert algo.make_variant(tmp).digest == Variant(software, tmp).digest
+
+def test_make_variant_memo_size(software):
+    """Memoised variants should be bounded independently of the run results cache"""
+    random.seed(0)
+    algo = StubAlgorithm()
+    algo.software = software
+    algo.config['cache_maxsize'] = 100
+    algo.config['variant_memo_size'] = 2
+    algo.cache_reset()
+    patch = random_patch(software, random, 5)
+    for k in range(1, 6):
+        algo.make_variant(Patch(patch.edits[:k]))
+    assert len(algo.variant_memo) == 2
+    assert algo.cache.maxsize == 100
+
+def test_model_cache(software, tmp_path, monkeypatch):
+    """Initialised models should be reused across executions, unless files or settings change"""
+    monkeypatch.setattr(magpie.settings, 'cache_dir', str(tmp_path / 'cache'))
+    for filename in ['triangle.py', 'triangle.c.xml']:
+        shutil.copy(f'tests/examples/{filename}', tmp_path)
+    software.path = tmp_path
+    software.target_files = ['triangle.py', 'triangle.c.xml']
+    software.model_rules = [('*.py', 'AstorModel'), ('*.xml', 'SrcmlModel')]
+    software.model_cache = True
+    software.noop_variant = None
+    expected = Variant(software)
+    assert len(list((tmp_path / 'cache' / 'models').iterdir())) == 2
+
+    def fail(self):
+        raise AssertionError
+    monkeypatch.setattr(AstorModel, 'init_contents', fail)
+    monkeypatch.setattr(SrcmlModel, 'init_contents', fail)
+    variant = Variant(software)
+    for filename, model in variant.models.items():
+        assert model.dump() == expected.models[filename].dump()
+        assert model.locations == expected.models[filename].locations
+
+    # different settings
+    software.config = {'srcml': {'process_pseudo_blocks': 'false', 'process_literals': 'true', 'process_operators': 'true'}}
+    software.model_config = [('*.xml', 'srcml')]
+    with pytest.raises(AssertionError):
+        Variant(software)
+    # different file contents
+    with (tmp_path / 'triangle.py').open('a') as tmp_file:
+        tmp_file.write('pass\n')
+    software.model_config = []
+    with pytest.raises(AssertionError):
+        Variant(software)
+
+def test_profile(software, tmp_path, monkeypatch):
+    """Profiles should weight locations, and invalidate cached models when updated"""
+    monkeypatch.setattr(magpie.settings, 'cache_dir', str(tmp_path / 'cache'))
+    for filename in ['triangle.py', 'triangle.cover']:
+        shutil.copy(f'tests/examples/{filename}', tmp_path)
+    software.path = tmp_path
+    software.target_files = ['triangle.py']
+    software.model_rules = [('*.py', 'AstorModel')]
+    software.model_config = [('*.py', 'astor')]
+    software.config = {'astor': {'profile': 'triangle.cover'}}
+    software.model_cache = True
+    software.noop_variant = None
+    weights = Variant(software).models['triangle.py'].weights
+    assert weights['stmt']
+    assert Variant(software).models['triangle.py'].weights == weights
+    # different profile
+    profile = tmp_path / 'triangle.cover'
+    profile.write_text(profile.read_text().replace('   17:', '  170:'))
+    assert Variant(software).models['triangle.py'].weights != weights
@@ -1,13 +1,17 @@
+import ast
+import configparser
 import contextlib
 import copy
 import pathlib
+import pickle
+import random
 import re
 
 import pytest
 
 from magpie.models.astor import AstorModel
 
-from .util import assert_diff
+from .util import assert_diff, assert_fork, outcome, random_edits
 
 
 @pytest.fixture
@@ -180,3 +184,74 @@ def test_insertion3(astor_model):
          a = c
 """
     assert_diff(astor_model.dump(), variant.dump(), expected)
+
+def test_insertion_blocks(astor_model):
+    """Insertions in an orelse block should not shift the body block"""
+    variant = astor_model.fork()
+    target1 = ('triangle.py', '_inter_block', 33)
+    target2 = ('triangle.py', 'stmt', 5)
+    target3 = ('triangle.py', 'stmt', 21)
+    assert variant.do_insert(astor_model, target1, target2)
+    assert variant.do_delete(target3)
+    assert 'TriangleType.INVALID' not in variant.dump()
+
+def test_detached(astor_model):
+    """Statements within replaced statements should not be edited"""
+    variant = astor_model.fork()
+    target1 = ('triangle.py', 'stmt', 8)
+    target2 = ('triangle.py', 'stmt', 5)
+    assert variant.do_replace(astor_model, target1, target2)
+    assert not variant.do_delete(('triangle.py', 'stmt', 9))
+    assert not variant.do_insert(astor_model, ('triangle.py', '_inter_block', 14), target2)
+    assert not variant.do_replace(astor_model, ('triangle.py', 'stmt', 10), target2)
+
+def test_serialize(astor_model):
+    """Memoised hashes and unparsed statements should never be stale"""
+    rng = random.Random(0)
+    fresh = AstorModel('triangle.py')
+    fresh.hashes, fresh.owned = {}, {} # no memoisation
+    for _ in range(20):
+        edits = random_edits(astor_model, rng, 6)
+        variant = copy.deepcopy(astor_model)
+        fork = astor_model.fork()
+        for name, *args in edits:
+            assert outcome(variant, name, args) == outcome(fork, name, args)
+            assert variant.dump() == ast.unparse(variant.contents)
+            assert fork.dump() == ast.unparse(fork.contents)
+            for model in [variant, fork]:
+                for node in ast.walk(model.contents):
+                    if isinstance(node, ast.stmt):
+                        assert model.structural_hash(node) == fresh.structural_hash(node)
+
+def test_pickle(astor_model):
+    """Structural hashes should be dropped when loaded in another process (with other string hashes)"""
+    astor_model.hashes_seed += 1 # as if pickled in another process
+    model = pickle.loads(pickle.dumps(astor_model))
+    assert model.hashes == {}
+    target = ('triangle.py', 'stmt', 7)
+    assert not model.do_replace(astor_model, target, target)
+    assert model.hashes
+    assert pickle.loads(pickle.dumps(model)).hashes
+
+def test_fork(astor_model):
+    assert_fork(astor_model, random.Random(0))
+
+def test_profile_weights():
+    """Statements should be weighted by the execution count of their lines"""
+    config = configparser.ConfigParser()
+    config.read_dict({'astor': {'profile': 'triangle.cover'}})
+    model = AstorModel('triangle.py')
+    with contextlib.chdir(pathlib.Path('tests') / 'examples'):
+        model.setup(config, 'astor')
+        model.init_contents()
+        model.init_weights()
+    weights = dict(zip(model.location_lines('stmt'), model.weights['stmt']))
+    assert weights[(13, 40)] == 19 # function
+    assert weights[(24, 24)] == 17
+    assert weights[(19, 19)] == 0
+    assert weights[(34, 34)] == 1
+    points = dict(zip(model.location_lines('_inter_block'), model.weights['_inter_block']))
+    assert points[(24, 24)] == 17 # before line 24
+    random.seed(0)
+    targets = [model.random_target('stmt') for _ in range(100)]
+    assert all(model.weights['stmt'][loc] > 0 for _, _, loc in targets)
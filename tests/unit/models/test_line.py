@@ -1,12 +1,15 @@
+import configparser
 import contextlib
 import copy
 import pathlib
+import random
 
 import pytest
 
+from magpie.core import ScenarioError
 from magpie.models.line import LineModel
 
-from .util import assert_diff
+from .util import assert_diff, assert_fork, outcome, random_edits
 
 
 @pytest.fixture
@@ -161,3 +164,46 @@ def test_insertion3(line_model):
          tmp = a
 """
     assert_diff(line_model.dump(), variant.dump(), expected)
+
+def test_fork(line_model):
+    assert_fork(line_model, random.Random(0))
+
+def test_pieces(line_model):
+    """Dumps should follow edits (as with a list of current lines and shifted locations)"""
+    rng = random.Random(0)
+    for _ in range(20):
+        variant = line_model.fork()
+        lines = line_model.contents[:]
+        shifts = {'line': list(range(len(lines))), '_inter_line': list(range(len(lines)+1))}
+        for name, *args in random_edits(line_model, rng, 10):
+            if outcome(variant, name, args) is not True:
+                continue
+            _, tag, i = args[0] if name == 'do_delete' else args[1]
+            if name == 'do_delete':
+                lines[shifts[tag][i]] = None
+            elif name == 'do_replace':
+                lines[shifts[tag][i]] = line_model.contents[args[-1][2]]
+            else:
+                lines.insert(shifts[tag][i], line_model.contents[args[-1][2]])
+                for k in shifts:
+                    shifts[k][i:] = [j + 1 for j in shifts[k][i:]]
+            assert variant.dump() == ''.join(s + '\n' for s in lines if s is not None)
+
+def test_profile_weights():
+    """Lines should be weighted by their execution count"""
+    config = configparser.ConfigParser()
+    config.read_dict({'line': {'profile': 'triangle.c.gcov', 'profile_floor': '0.1'}})
+    model = LineModel('triangle.c')
+    with contextlib.chdir(pathlib.Path('tests') / 'examples'):
+        model.setup(config, 'line')
+        model.init_contents()
+        model.init_weights()
+    assert model.weights['line'][2] == 19 # line 3
+    assert model.weights['line'][20] == 17
+    assert model.weights['line'][14] == pytest.approx(1.9) # never executed
+    assert model.weights['line'][0] == pytest.approx(1.9) # not executable
+    assert model.weights['_inter_line'][2] == 19 # before line 3
+    assert model.weights['_inter_line'][-1] == pytest.approx(1.9) # after the last line
+    config['line']['profile'] = 'triangle.gcov'
+    with contextlib.chdir(pathlib.Path('tests') / 'examples'), pytest.raises(ScenarioError):
+        model.setup(config, 'line')
@@ -1,8 +1,10 @@
+import configparser
 import contextlib
 import pathlib
 
 import pytest
 
+from magpie.core import default_scenario
 from magpie.models.xml import SrcmlModel, XmlModel
 
 
@@ -105,3 +107,54 @@ def test_process_operators(xml_model):
     SrcmlModel.process_operators(tree)
     oracle = '<decl_stmt><decl><type><specifier>const</specifier> <name><name>struct</name> <name>timespec</name></name></type> <name>ms</name> <init>= <expr><block>{<expr><literal type="number">0</literal></expr>, <expr><literal type="number">0.001</literal><operator_arith>*</operator_arith><literal type="number">1e9</literal></expr>}</block></expr></init></decl>;</decl_stmt>'
     assert XmlModel.tree_to_string(tree).strip() == oracle
+
+@pytest.mark.parametrize('filename', ['triangle.c.xml', 'Triangle.java.xml'])
+@pytest.mark.parametrize('focus', [None, set(), {'block', 'stmt', 'name'}])
+@pytest.mark.parametrize('flag', [True, False])
+def test_process_node(tmp_path, filename, focus, flag):
+    """Fused preprocessing should be identical to applying every transform to the whole tree in turn"""
+    model = SrcmlModel(filename)
+    for k in ['process_pseudo_blocks', 'process_literals', 'process_operators']:
+        model.config[k] = flag
+    model.config['tag_rename']['foo'] = {'stmt', 'operator_comp'} # chained renaming
+    if focus is not None:
+        model.config['tag_focus'] = focus
+    with contextlib.chdir(pathlib.Path('tests') / 'examples'):
+        model.init_contents()
+        tree = model.string_to_tree(pathlib.Path(filename).read_text())
+    if flag:
+        SrcmlModel.process_pseudo_blocks(tree)
+        SrcmlModel.process_literals(tree)
+        SrcmlModel.process_operators(tree)
+    for tag, tags in model.config['tag_rename'].items():
+        SrcmlModel.rewrite_tags(tree, tags, tag)
+    if model.config['tag_focus']:
+        SrcmlModel.focus_tags(tree, model.config['tag_focus'])
+    assert XmlModel.tree_to_string(model.contents) == XmlModel.tree_to_string(tree)
+
+    # same locations as those of the processed tree
+    reference = XmlModel(filename)
+    reference.config['internodes'] = model.config['internodes']
+    (tmp_path / filename).write_text(XmlModel.tree_to_string(tree))
+    with contextlib.chdir(tmp_path):
+        reference.init_contents()
+    assert model.locations == reference.locations
+    assert model.indents == reference.indents
+
+def test_profile_weights():
+    """Nodes should be weighted by the execution count of their original lines"""
+    config = configparser.ConfigParser()
+    config.read_dict(default_scenario)
+    config['srcml']['profile'] = 'triangle.c.gcov'
+    model = SrcmlModel('triangle.c.xml')
+    with contextlib.chdir(pathlib.Path('tests') / 'examples'):
+        model.setup(config, 'srcml')
+        model.init_contents()
+        model.init_weights()
+    weights = dict(zip(model.location_lines('stmt'), model.weights['stmt']))
+    assert weights[(20, 24)] == 19 # if
+    assert weights[(21, 21)] == 17
+    assert weights[(15, 15)] == 0
+    assert weights[(33, 33)] == 1 # not shifted by pseudo blocks
+    assert weights[(37, 37)] == 18
+    assert dict(zip(model.location_lines('block'), model.weights['block']))[(33, 33)] == 1 # pseudo block
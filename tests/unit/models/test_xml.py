@@ -1,12 +1,13 @@
 import contextlib
 import copy
 import pathlib
+import random
 
 import pytest
 
 from magpie.models.xml import XmlModel
 
-from .util import assert_diff
+from .util import assert_diff, assert_fork, outcome, random_edits
 
 
 @pytest.fixture
@@ -244,3 +245,50 @@ void rotate(int& n1, int& n2, int& n3) {
 ])
 def test_build_and_strip(xml, output):
     assert XmlModel.strip_xml_from_tree(XmlModel.string_to_tree(xml)).strip() == output.strip()
+
+def test_fork(xml_model):
+    assert_fork(xml_model, random.Random(0))
+
+def test_stable_locations(xml_model):
+    """Locations should keep referring to the same nodes after insertions"""
+    insertion = (xml_model, ('Triangle.java.xml', '_inter_block', 10), ('Triangle.java.xml', 'if', 0))
+    for i in range(len(xml_model.locations['expr_stmt'])):
+        target = ('Triangle.java.xml', 'expr_stmt', i)
+        variant1 = copy.deepcopy(xml_model)
+        assert variant1.do_insert(*insertion)
+        assert variant1.do_delete(target)
+        variant2 = copy.deepcopy(xml_model)
+        assert variant2.do_delete(target)
+        assert variant2.do_insert(*insertion)
+        assert variant1.dump() == variant2.dump()
+
+def test_detached(xml_model):
+    """Edits within replaced nodes should not be applied"""
+    variant = copy.deepcopy(xml_model)
+    assert variant.do_replace(xml_model, ('Triangle.java.xml', 'if', 0), ('Triangle.java.xml', 'expr_stmt', 0))
+    dump = variant.dump()
+    assert not variant.do_delete(('Triangle.java.xml', 'expr_stmt', 1))
+    assert not variant.do_insert(xml_model, ('Triangle.java.xml', '_inter_block', 17), ('Triangle.java.xml', 'expr_stmt', 0))
+    assert variant.dump() == dump
+
+def test_indents(xml_model):
+    """Indentations should be maintained as if recomputed from scratch"""
+    def expected(model, element, indent, accu):
+        for child, lead in model._leads(element):
+            tmp = '' if element is model.contents else model._indent(indent, lead)
+            if (nid := model.node_id(child)) is not None:
+                accu[nid] = tmp
+            expected(model, child, tmp, accu)
+        return accu
+    rng = random.Random(0)
+    for _ in range(20):
+        variant = xml_model.fork()
+        edits = random_edits(xml_model, rng, 6)
+        # also changes tags and texts
+        edits.append(('do_replace', xml_model, ('Triangle.java.xml', 'decl_stmt', rng.randrange(3)), ('Triangle.java.xml', 'comment', 0)))
+        edits.append(('do_wrap_text', ('Triangle.java.xml', 'block', rng.randrange(13)), '', '  '))
+        rng.shuffle(edits)
+        for name, *args in edits:
+            outcome(variant, name, args)
+            for nid, indent in expected(variant, variant.contents, '', {}).items():
+                assert variant.find_indent(nid) == indent
@@ -1,3 +1,4 @@
+import copy
 import difflib
 
 
@@ -9,3 +10,43 @@ def assert_diff(str1, str2, expected):
         print(repr(line), end='')
         print(repr(oracle), end='')
         assert line == oracle
+
+def random_edits(model, rng, n):
+    # random deletions/replacements/insertions, as (method name, *args) tuples
+    tags = [t for t in model.locations if not t.startswith('_inter_')]
+    inters = [t for t in model.locations if t.startswith('_inter_')]
+    edits = []
+    for _ in range(n):
+        tag = rng.choice(tags)
+        target = (model.filename, tag, rng.randrange(len(model.locations[tag])))
+        ingredient = (model.filename, tag, rng.randrange(len(model.locations[tag])))
+        inter = rng.choice(inters)
+        op = rng.randrange(3)
+        if op == 0:
+            edits.append(('do_delete', target))
+        elif op == 1:
+            edits.append(('do_replace', model, target, ingredient))
+        else:
+            edits.append(('do_insert', model, (model.filename, inter, rng.randrange(len(model.locations[inter]))), ingredient))
+    return edits
+
+def outcome(model, name, args):
+    try:
+        return getattr(model, name)(*args)
+    except Exception as e: # e.g., locations within deleted nodes
+        return type(e)
+
+def assert_fork(model, rng):
+    """Forks should behave as deep copies without modifying the original model"""
+    original = model.dump()
+    for _ in range(20):
+        edits = random_edits(model, rng, 6)
+        variant = copy.deepcopy(model)
+        fork = model.fork()
+        for k, (name, *args) in enumerate(edits):
+            if k == 3:
+                fork = fork.fork() # forks of forks
+            assert outcome(variant, name, args) == outcome(fork, name, args)
+            assert variant.dump() == fork.dump()
+            assert fork.dump() == fork.serialize() # memoised dumps are never stale
+        assert model.dump() == original